@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+**lachesis.benchmarks** measures the speed and memory usage
+of the segmentation pipeline on synthetic documents
+"""
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Helpers for the command line interface of the benchmarks.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import io
+import json
+import sys
+
+import lachesis.globalfunctions as gf
+
+
+def option(name, usage, default=None):
+    """
+    Return the value of the given command line option, or the default,
+    calling ``usage(1)`` if the value is missing.
+    """
+    if name not in sys.argv:
+        return default
+    idx = sys.argv.index(name)
+    if idx + 1 >= len(sys.argv):
+        print(u"[ERRO] Missing value for option '%s'" % name)
+        usage(1)
+    return sys.argv[idx + 1]
+
+
+def check_integer(obj, minimum, usage):
+    """
+    Return the integer in the given string,
+    calling ``usage(1)`` if it is not an integer
+    greater than or equal to ``minimum``.
+    """
+    try:
+        value = int(obj)
+    except ValueError:
+        value = minimum - 1
+    if value < minimum:
+        print(u"[ERRO] Expected an integer greater than or equal to %d, not '%s'" % (minimum, obj))
+        usage(1)
+    return value
+
+
+def check_integers(obj, minimum, usage):
+    """
+    Return the list of the integers in the given comma-separated string,
+    calling ``usage(1)`` if they are not all integers
+    greater than or equal to ``minimum``.
+    """
+    try:
+        values = [int(v) for v in obj.split(u",")]
+    except ValueError:
+        values = []
+    if (len(values) < 1) or (min(values) < minimum):
+        print(u"[ERRO] Expected integers greater than or equal to %d, not '%s'" % (minimum, obj))
+        usage(1)
+    return values
+
+
+def write_report(report, output_file_path=None):
+    """
+    Write the given report as JSON to the given file,
+    or to the standard output if ``output_file_path`` is ``None``.
+    """
+    data = gf.to_unicode_string(json.dumps(report, indent=2, separators=(",", ": "), sort_keys=True))
+    if output_file_path is None:
+        print(data)
+    else:
+        with io.open(output_file_path, "w", encoding="utf-8") as output_file:
+            output_file.write(data + u"\n")
+        print(u"Report written to '%s'" % output_file_path, file=sys.stderr)
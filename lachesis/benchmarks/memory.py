@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the peak memory of a function
+by running it in a forked process.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+from lachesis.memory import max_rss
+from lachesis.memory import resource
+
+
+def peak_memory(function, *args):
+    """
+    Run ``function(*args)`` once in a forked process,
+    and return a ``(peak, error)`` tuple, where ``peak`` is
+    how much its maximum resident set size grew, in bytes,
+    or ``None`` if it cannot be measured on this platform,
+    and ``error`` is the error raised by ``function``, if any.
+
+    The forked process starts with the memory of this process,
+    hence ``function`` can use any object created beforehand
+    without it being accounted for.
+    """
+    if (resource is None) or (not hasattr(os, "fork")):
+        return (None, None)
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child process
+        os.close(read_fd)
+        try:
+            start = max_rss()
+            function(*args)
+            message = u"%d" % (max_rss() - start)
+        except Exception as exc:
+            message = u"!%s: %s" % (type(exc).__name__, exc)
+        os.write(write_fd, message.encode("utf-8"))
+        os.close(write_fd)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, "rb") as pipe:
+        message = pipe.read().decode("utf-8")
+    os.waitpid(pid, 0)
+    if message.startswith(u"!"):
+        return (None, message[1:])
+    if len(message) < 1:
+        return (None, u"The forked process did not report")
+    return (int(message), None)
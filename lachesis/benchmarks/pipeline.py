@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Time each stage of the segmentation pipeline
+on synthetic documents of increasing size.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import io
+import os
+import platform
+import sys
+import time
+
+from lachesis.benchmarks.cli import check_integer
+from lachesis.benchmarks.cli import check_integers
+from lachesis.benchmarks.cli import option
+from lachesis.benchmarks.cli import write_report
+from lachesis.benchmarks.memory import peak_memory
+from lachesis.benchmarks.synthetic import SyntheticCorpus
+from lachesis.benchmarks.synthetic import SyntheticWrapper
+from lachesis.downloaders import Downloader
+from lachesis.downloaders.youtube import YouTubeDownloader
+from lachesis.language import Language
+from lachesis.ml.crf import CRFTrainer
+from lachesis.ml.crf import tokens_to_features
+from lachesis.ml.features import columns_from_tokens
+from lachesis.ml.features import FeatureExtractor
+from lachesis.nlpwrappers import NLPEngine
+from lachesis.splitters import CRFSplitter
+from lachesis.splitters import GreedySplitter
+import lachesis
+import lachesis.globalfunctions as gf
+
+
+class PipelineBenchmark(object):
+    """
+    Run the segmentation pipeline on synthetic documents,
+    measuring each stage separately:
+
+    * ``parse``: ``Downloader.read_closed_captions()`` on a TTML file;
+    * ``analyze``: ``NLPEngine.analyze()`` with the given NLP wrapper
+      (by default, a ``SyntheticWrapper``, measuring the pipeline
+      without any NLP library);
+    * ``features``: ``tokens_to_features()`` on each sentence;
+    * ``greedy_split``: ``GreedySplitter.split()``;
+    * ``crf_split``: ``CRFSplitter.split()`` with the given model
+      (by default, a model trained on another synthetic corpus).
+
+    Each stage is timed ``repeat`` times, keeping the fastest run,
+    and its peak memory is measured as the growth
+    of the maximum resident set size of a forked process
+    running the stage once (``None`` where ``fork`` is not available).
+    If the NLP wrapper cannot be loaded, the ``analyze`` stage
+    reports the error, and the following stages
+    run on the output of the ``SyntheticWrapper``.
+    """
+
+    STAGES = [u"parse", u"analyze", u"features", u"greedy_split", u"crf_split"]
+    """ The stages of the pipeline, in order """
+
+    SIZES = [100, 300, 1000, 3000]
+    """ Default numbers of sentences of the document scaling curve """
+
+    SENTENCE_LENGTH = SyntheticCorpus.SENTENCE_LENGTH
+    """ Default number of tokens per sentence of the document scaling curve """
+
+    LENGTHS = [5, 10, 20, 40, 80]
+    """ Default numbers of tokens per sentence of the sentence scaling curve """
+
+    TOKENS = 20000
+    """ Default number of tokens per document of the sentence scaling curve """
+
+    REPEAT = 3
+    """ Default number of timed runs of each stage """
+
+    TRAINING_SENTENCES = 2000
+    """ Number of sentences for training the default CRF model """
+
+    def __init__(
+        self,
+        language=Language.ENGLISH,
+        seed=0,
+        wrapper=None,
+        model_file_path=None,
+        repeat=REPEAT,
+        max_chars_per_line=CRFSplitter.MAX_CHARS_PER_LINE,
+        max_num_lines=CRFSplitter.MAX_NUM_LINES
+    ):
+        self.language = Language.from_code(language)
+        self.seed = seed
+        self.corpus = SyntheticCorpus(seed=seed, language=self.language)
+        self.wrapper = SyntheticWrapper.CODE if wrapper is None else wrapper
+        self.model_file_path = model_file_path
+        self.repeat = repeat
+        self.max_chars_per_line = max_chars_per_line
+        self.max_num_lines = max_num_lines
+        # the synthetic wrapper is not known to NLPEngine,
+        # hence it is served from the cache of the engine
+        self.synthetic_wrapper = SyntheticWrapper(self.language, corpus=self.corpus)
+        self.nlpe = NLPEngine()
+        self.nlpe.cache[(self.language, SyntheticWrapper.CODE)] = self.synthetic_wrapper
+        self.wrapper_error = None
+        try:
+            self.nlpe.load_wrapper(self.language, self.wrapper, cache=True)
+        except Exception as exc:
+            self.wrapper_error = _error(exc)
+        self.trained_model_file_path = None
+        self.crf_splitter = None
+        self.crf_error = None
+
+    def _stage_parse(self, state):
+        state[u"document"] = Downloader.read_closed_captions(state[u"ttml_file_path"], {u"downloader": u"youtube"})
+
+    def _stage_analyze(self, state):
+        self.nlpe.analyze(state[u"document"], wrapper=self.wrapper)
+
+    def _stage_features(self, state):
+        for sentence in state[u"document"].sentences:
+            tokens = [t for t in sentence.elements if t.is_regular]
+            tokens_to_features(tokens, max_chars_per_line=self.max_chars_per_line)
+
+    def _stage_greedy_split(self, state):
+        splitter = GreedySplitter(self.language, max_chars_per_line=self.max_chars_per_line, max_num_lines=self.max_num_lines)
+        splitter.split(state[u"document"])
+
+    def _stage_crf_split(self, state):
+        self.crf_splitter.split(state[u"document"])
+
+    def _setup_crf_splitter(self):
+        """
+        Create the CRF splitter, training the model if not given,
+        and open the model and its lattice, so that none of them is measured.
+        """
+        self.crf_splitter = None
+        self.crf_error = None
+        try:
+            model_file_path = self.model_file_path
+            if model_file_path is None:
+                self.trained_model_file_path = self.train_model()
+                model_file_path = self.trained_model_file_path
+            self.crf_splitter = CRFSplitter(self.language, max_chars_per_line=self.max_chars_per_line, max_num_lines=self.max_num_lines, model_file_path=model_file_path)
+            self.crf_splitter.registry.get(model_file_path).lattice
+        except Exception as exc:
+            self.crf_error = _error(exc)
+
+    def train_model(self, num_sentences=TRAINING_SENTENCES):
+        """
+        Train a CRF model on the lines of the CCs
+        of another synthetic corpus, as ``CRFTrainer`` does,
+        and return the path of the (temporary) model file.
+        """
+        corpus = SyntheticCorpus(seed=self.seed + 1, language=self.language)
+        document = YouTubeDownloader.parse(corpus.ttml(num_sentences, max_chars_per_line=self.max_chars_per_line, max_num_lines=self.max_num_lines))
+        SyntheticWrapper(self.language, corpus=corpus).analyze(document)
+        examples = []
+        for sentence in document.sentences:
+            line = []
+            for token in sentence.elements:
+                if token.is_regular:
+                    line.append(token)
+                elif len(line) > 0:
+                    labels = [CRFTrainer.LABEL_NOT_LAST] * (len(line) - 1) + [CRFTrainer.LABEL_LAST]
+                    examples.append((columns_from_tokens(line), labels))
+                    line = []
+        trainer = CRFTrainer(language=self.language)
+        trainer.train_data = examples
+        handler, model_file_path = gf.tmp_file(suffix=u".crfsuite")
+        gf.close_file_handler(handler)
+        return trainer.train(model_file_path)
+
+    def clean(self):
+        """
+        Delete the CRF model trained by this benchmark, if any.
+        """
+        if self.trained_model_file_path is not None:
+            gf.delete_file(None, self.trained_model_file_path)
+            gf.delete_file(None, self.trained_model_file_path + FeatureExtractor.FINGERPRINT_EXTENSION)
+            self.trained_model_file_path = None
+        self.crf_splitter = None
+
+    def _measure(self, stage, state):
+        """
+        Run the given stage on ``state``, returning a dict
+        with its time and peak memory, or its error.
+        """
+        function = getattr(self, u"_stage_%s" % stage)
+        result = {u"seconds": None, u"peak_memory": None, u"error": None}
+        # the NLP wrapper or the CRF model could not be loaded
+        result[u"error"] = {u"analyze": self.wrapper_error, u"crf_split": self.crf_error}.get(stage)
+        if result[u"error"] is not None:
+            return result
+        try:
+            result[u"peak_memory"], result[u"error"] = peak_memory(function, state)
+            if result[u"error"] is not None:
+                return result
+            best = None
+            for i in range(self.repeat):
+                start = time.time()
+                function(state)
+                elapsed = time.time() - start
+                best = elapsed if (best is None) else min(best, elapsed)
+            result[u"seconds"] = best
+        except Exception as exc:
+            result[u"error"] = _error(exc)
+        return result
+
+    def run_document(self, num_sentences, sentence_length=SENTENCE_LENGTH):
+        """
+        Run all the stages on a new synthetic document
+        of ``num_sentences`` sentences of ``sentence_length`` tokens,
+        returning a dict with the size of the document
+        and the measures of each stage, including
+        the throughput in (regular) tokens per second.
+        """
+        handler, ttml_file_path = gf.tmp_file(suffix=u".ttml")
+        gf.close_file_handler(handler)
+        try:
+            with io.open(ttml_file_path, "w", encoding="utf-8") as ttml_file:
+                ttml_file.write(self.corpus.ttml(num_sentences, sentence_length, max_chars_per_line=self.max_chars_per_line, max_num_lines=self.max_num_lines))
+            state = {u"ttml_file_path": ttml_file_path}
+            stages = {}
+            for stage in self.STAGES:
+                stages[stage] = self._measure(stage, state)
+                if (stage == u"parse") and (stages[stage][u"error"] is not None):
+                    break
+                if (stage == u"analyze") and (stages[stage][u"error"] is not None):
+                    # go on with the synthetic analysis
+                    self.synthetic_wrapper.analyze(state[u"document"])
+            document = state.get(u"document")
+            tokens = len([t for t in document.tokens if t.is_regular]) if document is not None else 0
+            for result in stages.values():
+                if (result[u"seconds"] is not None) and (result[u"seconds"] > 0):
+                    result[u"tokens_per_second"] = tokens / result[u"seconds"]
+                else:
+                    result[u"tokens_per_second"] = None
+            return {
+                u"sentences": num_sentences,
+                u"sentence_length": sentence_length,
+                u"tokens": tokens,
+                u"ttml_bytes": os.path.getsize(ttml_file_path),
+                u"stages": stages,
+            }
+        finally:
+            gf.delete_file(None, ttml_file_path)
+
+    def run(self, sizes=SIZES, lengths=LENGTHS, sentence_length=SENTENCE_LENGTH, tokens=TOKENS, progress=None):
+        """
+        Run the document scaling curve
+        (documents of ``sizes`` sentences of ``sentence_length`` tokens)
+        and the sentence scaling curve
+        (documents of ``tokens`` tokens in sentences of ``lengths`` tokens),
+        and return the report as a dict, serializable to JSON.
+
+        If ``progress`` is not ``None``, it is called
+        with a message before each document is run.
+        """
+        report = {
+            u"environment": {
+                u"lachesis": lachesis.__version__,
+                u"python": platform.python_version(),
+                u"implementation": platform.python_implementation(),
+                u"platform": platform.platform(),
+            },
+            u"parameters": {
+                u"language": self.language.codes[-1],
+                u"seed": self.seed,
+                u"wrapper": self.wrapper,
+                u"model_file_path": self.model_file_path,
+                u"repeat": self.repeat,
+                u"max_chars_per_line": self.max_chars_per_line,
+                u"max_num_lines": self.max_num_lines,
+            },
+            u"stages": self.STAGES,
+            u"document_curve": [],
+            u"sentence_curve": [],
+        }
+        try:
+            self._setup_crf_splitter()
+            for num_sentences in sizes:
+                if progress is not None:
+                    progress(u"Document curve: %d sentences of %d tokens" % (num_sentences, sentence_length))
+                report[u"document_curve"].append(self.run_document(num_sentences, sentence_length))
+            for length in lengths:
+                num_sentences = max(1, tokens // length)
+                if progress is not None:
+                    progress(u"Sentence curve: %d sentences of %d tokens" % (num_sentences, length))
+                report[u"sentence_curve"].append(self.run_document(num_sentences, length))
+        finally:
+            self.clean()
+        return report
+
+
+def _error(exc):
+    return u"%s: %s" % (type(exc).__name__, exc)
+
+
+def usage(exit_code):
+    """ Print usage and exit. """
+    print(u"")
+    print(u"Usage:")
+    print(u"  $ python -m lachesis.benchmarks.pipeline [--output FILE] [--language L] [--seed S] [--repeat R] [--wrapper CODE] [--model FILE] [--sizes N,N,...] [--lengths N,N,...] [--tokens N]")
+    print(u"")
+    print(u"Options:")
+    print(u"  --language L     : language of the documents (default: en)")
+    print(u"  --lengths N,...  : tokens per sentence of the sentence scaling curve (default: %s)" % u",".join([u"%d" % n for n in PipelineBenchmark.LENGTHS]))
+    print(u"  --model FILE     : CRF model for the crf_split stage (default: train one on synthetic data)")
+    print(u"  --output FILE    : write the JSON report to FILE instead of the standard output")
+    print(u"  --repeat R       : time each stage R times, keeping the fastest run (default: %d)" % PipelineBenchmark.REPEAT)
+    print(u"  --seed S         : seed of the synthetic corpus (default: 0)")
+    print(u"  --sizes N,...    : sentences per document of the document scaling curve (default: %s)" % u",".join([u"%d" % n for n in PipelineBenchmark.SIZES]))
+    print(u"  --tokens N       : tokens per document of the sentence scaling curve (default: %d)" % PipelineBenchmark.TOKENS)
+    print(u"  --wrapper CODE   : NLP wrapper for the analyze stage (default: synthetic, no NLP library)")
+    print(u"")
+    sys.exit(exit_code)
+
+
+def main():
+    """ Entry point. """
+    if (u"-h" in sys.argv) or (u"--help" in sys.argv):
+        usage(0)
+
+    language = Language.from_code(option(u"--language", usage, u"en"))
+    if language is None:
+        print(u"[ERRO] Unknown language code '%s'" % option(u"--language", usage))
+        usage(1)
+    model_file_path = option(u"--model", usage)
+    if (model_file_path is not None) and (not os.path.isfile(model_file_path)):
+        print(u"[ERRO] File '%s' does not exist" % model_file_path)
+        usage(1)
+
+    benchmark = PipelineBenchmark(
+        language=language,
+        seed=check_integer(option(u"--seed", usage, u"0"), 0, usage),
+        wrapper=option(u"--wrapper", usage),
+        model_file_path=model_file_path,
+        repeat=check_integer(option(u"--repeat", usage, u"%d" % PipelineBenchmark.REPEAT), 1, usage),
+    )
+
+    def progress(message):
+        print(message, file=sys.stderr)
+
+    report = benchmark.run(
+        sizes=check_integers(option(u"--sizes", usage, u",".join([u"%d" % n for n in PipelineBenchmark.SIZES])), 1, usage),
+        lengths=check_integers(option(u"--lengths", usage, u",".join([u"%d" % n for n in PipelineBenchmark.LENGTHS])), 2, usage),
+        tokens=check_integer(option(u"--tokens", usage, u"%d" % PipelineBenchmark.TOKENS), 1, usage),
+        progress=progress,
+    )
+    write_report(report, option(u"--output", usage))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Synthetic transcripts, TTML files and analyzed documents
+of any size, for benchmarking.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import random
+import re
+
+from lachesis.elements import Document
+from lachesis.elements import EndOfLineToken
+from lachesis.language import Language
+from lachesis.nlpwrappers.base import BaseWrapper
+from lachesis.nlpwrappers.upostags import UniversalPOSTags
+
+
+class SyntheticCorpus(object):
+    """
+    A seeded generator of random sentences,
+    made of pseudo-words with a fixed POS tag each.
+
+    The POS tags are drawn from ``POS_DISTRIBUTION``,
+    and the words of each tag from a vocabulary
+    skewed towards its first words,
+    so that a few words are much more frequent than the others,
+    as in natural text.
+    The same seed always generates the same vocabulary and sentences.
+    """
+
+    POS_DISTRIBUTION = [
+        (UniversalPOSTags.NOUN, 0.22),
+        (UniversalPOSTags.VERB, 0.15),
+        (UniversalPOSTags.DET, 0.11),
+        (UniversalPOSTags.ADP, 0.11),
+        (UniversalPOSTags.PRON, 0.08),
+        (UniversalPOSTags.ADJ, 0.07),
+        (UniversalPOSTags.ADV, 0.06),
+        (UniversalPOSTags.AUX, 0.05),
+        (UniversalPOSTags.PROPN, 0.04),
+        (UniversalPOSTags.CCONJ, 0.04),
+        (UniversalPOSTags.PART, 0.03),
+        (UniversalPOSTags.SCONJ, 0.02),
+        (UniversalPOSTags.NUM, 0.02),
+    ]
+    """ Relative frequency of each POS tag """
+
+    CLOSED_CLASSES = [
+        UniversalPOSTags.ADP,
+        UniversalPOSTags.AUX,
+        UniversalPOSTags.CCONJ,
+        UniversalPOSTags.DET,
+        UniversalPOSTags.PART,
+        UniversalPOSTags.PRON,
+        UniversalPOSTags.SCONJ,
+    ]
+    """ POS tags with a few short words """
+
+    CLOSED_CLASS_SIZE = 12
+    """ Number of words of each closed class """
+
+    VOCABULARY_SIZE = 5000
+    """ Default number of words of the open classes """
+
+    SENTENCE_LENGTH = 15
+    """ Default number of tokens per sentence, including punctuation """
+
+    COMMA_PROBABILITY = 0.08
+    """ Probability of a comma after a word """
+
+    END_PUNCTUATION = [u".", u".", u".", u"?", u"!"]
+    """ Punctuation closing a sentence """
+
+    SYLLABLES = [c + v for c in u"bcdfghklmnprstvz" for v in u"aeiou"]
+    """ Syllables of the pseudo-words """
+
+    def __init__(self, seed=0, vocabulary_size=VOCABULARY_SIZE, language=Language.ENGLISH):
+        self.seed = seed
+        self.language = Language.from_code(language)
+        self.random = random.Random(seed)
+        self.tags = [tag for tag, frequency in self.POS_DISTRIBUTION]
+        self.cumulative = []
+        total = 0.0
+        for tag, frequency in self.POS_DISTRIBUTION:
+            total += frequency
+            self.cumulative.append(total)
+        self.vocabulary = self._create_vocabulary(vocabulary_size)
+        self.lexicon = dict([(w, tag) for tag, words in self.vocabulary.items() for w in words])
+
+    def _create_vocabulary(self, vocabulary_size):
+        open_classes = [tag for tag in self.tags if tag not in self.CLOSED_CLASSES]
+        seen = set()
+        vocabulary = {}
+        for tag in self.tags:
+            if tag in self.CLOSED_CLASSES:
+                size, syllables = self.CLOSED_CLASS_SIZE, (1, 2)
+            else:
+                size, syllables = max(1, vocabulary_size // len(open_classes)), (1, 4)
+            words = []
+            while len(words) < size:
+                if tag == UniversalPOSTags.NUM:
+                    word = u"%d" % self.random.randint(0, 10 ** self.random.randint(1, 4))
+                else:
+                    word = u"".join([self.random.choice(self.SYLLABLES) for i in range(self.random.randint(*syllables))])
+                if word not in seen:
+                    seen.add(word)
+                    words.append(word)
+            vocabulary[tag] = words
+        return vocabulary
+
+    def _word(self):
+        x = self.random.random() * self.cumulative[-1]
+        for tag, threshold in zip(self.tags, self.cumulative):
+            if x < threshold:
+                break
+        words = self.vocabulary[tag]
+        word = words[int(len(words) * (self.random.random() ** 3))]
+        if tag == UniversalPOSTags.PROPN:
+            word = word[0].upper() + word[1:]
+        return word, tag
+
+    def tagged_sentence(self, length=SENTENCE_LENGTH):
+        """
+        Return a new sentence with ``length`` tokens
+        (at least two: a word and the final punctuation),
+        as a list of ``(word, upos_tag)`` tuples.
+        """
+        tokens = []
+        while len(tokens) < max(length, 2) - 1:
+            tokens.append(self._word())
+            if (len(tokens) < length - 2) and (self.random.random() < self.COMMA_PROBABILITY):
+                tokens.append((u",", UniversalPOSTags.PUNCT))
+        tokens[0] = (tokens[0][0][0].upper() + tokens[0][0][1:], tokens[0][1])
+        tokens.append((self.random.choice(self.END_PUNCTUATION), UniversalPOSTags.PUNCT))
+        return tokens
+
+    def sentence(self, length=SENTENCE_LENGTH):
+        """
+        Return a new sentence with ``length`` tokens,
+        as a unicode string.
+        """
+        string = u""
+        for word, upos_tag in self.tagged_sentence(length):
+            if (len(string) > 0) and (upos_tag != UniversalPOSTags.PUNCT):
+                string += u" "
+            string += word
+        return string
+
+    def sentences(self, num_sentences, length=SENTENCE_LENGTH):
+        """
+        Return a list of ``num_sentences`` new sentences
+        with ``length`` tokens each, as unicode strings.
+        """
+        return [self.sentence(length) for i in range(num_sentences)]
+
+    def text(self, num_sentences, length=SENTENCE_LENGTH):
+        """
+        Return a transcript of ``num_sentences`` new sentences
+        with ``length`` tokens each, as a unicode string.
+        """
+        return u" ".join(self.sentences(num_sentences, length))
+
+    def ttml(self, num_sentences, length=SENTENCE_LENGTH, max_chars_per_line=42, max_num_lines=2, duration=2000):
+        """
+        Return a TTML file, as produced by YouTube,
+        with the CCs of a transcript of ``num_sentences`` new sentences
+        with ``length`` tokens each, as a unicode string.
+
+        The transcript is wrapped into lines
+        of at most ``max_chars_per_line`` characters,
+        regardless of the sentence boundaries,
+        and each CC has ``max_num_lines`` lines
+        and lasts ``duration`` milliseconds.
+        """
+        lines = []
+        line = u""
+        for word in self.text(num_sentences, length).split(u" "):
+            if (len(line) > 0) and (len(line) + 1 + len(word) > max_chars_per_line):
+                lines.append(line)
+                line = word
+            else:
+                line = (line + u" " + word) if len(line) > 0 else word
+        if len(line) > 0:
+            lines.append(line)
+
+        def _timestamp(milliseconds):
+            seconds, milliseconds = divmod(milliseconds, 1000)
+            minutes, seconds = divmod(seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            return u"%02d:%02d:%02d.%03d" % (hours, minutes, seconds, milliseconds)
+
+        ttml = [
+            u"<?xml version=\"1.0\" encoding=\"utf-8\" ?>",
+            u"<tt xml:lang=\"%s\" xmlns=\"http://www.w3.org/ns/ttml\"><body><div>" % self.language.codes[-1],
+        ]
+        for i in range(0, len(lines), max_num_lines):
+            ttml.append(u"<p begin=\"%s\" end=\"%s\">%s</p>" % (
+                _timestamp(i // max_num_lines * duration),
+                _timestamp((i // max_num_lines + 1) * duration),
+                u"<br />".join(lines[i:(i + max_num_lines)])
+            ))
+        ttml.append(u"</div></body></tt>")
+        return u"\n".join(ttml) + u"\n"
+
+    def document(self, num_sentences, length=SENTENCE_LENGTH):
+        """
+        Return a new Document with a transcript of ``num_sentences``
+        new sentences with ``length`` tokens each,
+        analyzed by a ``SyntheticWrapper`` over this corpus.
+        """
+        document = Document(raw=self.text(num_sentences, length), language=self.language)
+        SyntheticWrapper(self.language, corpus=self).analyze(document)
+        return document
+
+
+class SyntheticWrapper(BaseWrapper):
+    """
+    An NLP wrapper for the text generated by a ``SyntheticCorpus``,
+    splitting sentences at the final punctuation
+    and tagging each word with its tag in the vocabulary,
+    without any NLP library.
+    """
+
+    CODE = u"synthetic"
+
+    LANGUAGES = Language.ALL_LANGUAGES
+
+    UPOSTAG_MAP = dict([(tag, tag) for tag in UniversalPOSTags.UPOSTAG_MAP_V1_TO_V2.values()])
+
+    PATTERN_TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+    END_PUNCTUATION = set(SyntheticCorpus.END_PUNCTUATION)
+
+    def __init__(self, language, corpus=None):
+        super(SyntheticWrapper, self).__init__(language)
+        self.corpus = SyntheticCorpus(language=self.language) if corpus is None else corpus
+
+    def _analyze(self, doc_string):
+        lexicon = self.corpus.lexicon
+        sentences = []
+        sentence = []
+        for raw in self.PATTERN_TOKEN.findall(doc_string):
+            if raw == EndOfLineToken.RAW:
+                sentence.append(self._create_token(raw, None))
+                continue
+            upos_tag = lexicon.get(raw)
+            if upos_tag is None:
+                upos_tag = lexicon.get(raw[0].lower() + raw[1:], UniversalPOSTags.PUNCT if raw in u".,?!" else UniversalPOSTags.X)
+            sentence.append(self._create_token(raw, upos_tag))
+            if raw in self.END_PUNCTUATION:
+                sentences.append(sentence)
+                sentence = []
+        if len(sentence) > 0:
+            sentences.append(sentence)
+        return sentences
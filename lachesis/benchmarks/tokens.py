@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the memory used by the tokens of a Document,
+against the previous token representation.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import sys
+
+from lachesis.benchmarks.cli import check_integer
+from lachesis.benchmarks.cli import option
+from lachesis.benchmarks.cli import write_report
+from lachesis.benchmarks.synthetic import SyntheticCorpus
+from lachesis.benchmarks.synthetic import SyntheticWrapper
+from lachesis.downloaders.youtube import YouTubeDownloader
+from lachesis.elements import EndOfLineToken
+from lachesis.elements import EndOfSentenceToken
+from lachesis.elements import Token
+from lachesis.elements import TokenStore
+
+
+class DictToken(object):
+    """
+    The previous representation of a token,
+    with its attributes in a ``__dict__``
+    and a new object for each end of line or sentence.
+    """
+
+    def __init__(self, raw, upos_tag=None, trailing_whitespace=False, special=False):
+        self.raw = raw
+        self.upos_tag = upos_tag
+        self.chunk_tag = None
+        self.pnp_tag = None
+        self.lemma = None
+        self.trailing_whitespace = trailing_whitespace
+        self.special = special
+
+
+def _copy(string):
+    """
+    Return a new string object equal to the given one,
+    as a tag read from a file or a library would be.
+    """
+    return string[:1] + string[1:]
+
+
+def create_dict_tokens(specs, copy_tags):
+    """
+    Create the tokens of the given specs
+    with the previous representation.
+    """
+    tokens = []
+    for raw, upos_tag, trailing_whitespace, special in specs:
+        if copy_tags:
+            upos_tag = _copy(upos_tag)
+        tokens.append(DictToken(raw, upos_tag, trailing_whitespace, special is not None))
+    return tokens
+
+
+def create_tokens(specs, copy_tags):
+    """
+    Create the tokens of the given specs
+    with the current representation.
+    """
+    tokens = []
+    for raw, upos_tag, trailing_whitespace, special in specs:
+        if special is not None:
+            tokens.append(special())
+        else:
+            if copy_tags:
+                upos_tag = _copy(upos_tag)
+            tokens.append(Token(raw, upos_tag=upos_tag, trailing_whitespace=trailing_whitespace))
+    return tokens
+
+
+def create_store(specs, copy_tags):
+    """
+    Create the tokens of the given specs
+    in a columnar token store.
+    """
+    return TokenStore(create_tokens(specs, copy_tags))
+
+
+def store_memory_size(store):
+    """
+    Return a ``(objects, total)`` tuple with the bytes used
+    by the columns of the given token store,
+    and by the columns plus the text buffer and the tag strings.
+    """
+    objects = sum([
+        sys.getsizeof(column) for column in (
+            store.offsets, store.tag_codes, store.flags,
+            store.tags, store.tag_index,
+            store.lemmas, store.chunk_tags, store.pnp_tags,
+        )
+    ])
+    total = objects + sys.getsizeof(store.text) + sum([sys.getsizeof(tag) for tag in store.tags])
+    return objects, total
+
+
+def memory_size(tokens):
+    """
+    Return a ``(objects, total)`` tuple with the bytes used
+    by the distinct token objects in the given list
+    (including their ``__dict__``, if any),
+    and by those objects plus their distinct string attributes.
+    """
+    seen = set()
+    objects = 0
+    total = 0
+    if isinstance(tokens, TokenStore):
+        return store_memory_size(tokens)
+    for token in tokens:
+        if id(token) in seen:
+            continue
+        seen.add(id(token))
+        size = sys.getsizeof(token)
+        if hasattr(token, "__dict__"):
+            size += sys.getsizeof(token.__dict__)
+        objects += size
+        total += size
+        for value in (token.raw, token.upos_tag, token.chunk_tag, token.pnp_tag, token.lemma):
+            if (value is not None) and (id(value) not in seen):
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return objects, total
+
+
+class TokenMemoryBenchmark(object):
+    """
+    Compare the memory used by the tokens of a synthetic Document,
+    as created by the NLP analysis of a TTML file,
+    with the previous token representation (``DictToken``)
+    with the current one (slotted ``Token`` objects,
+    interned tags and shared special tokens),
+    and with the columnar ``TokenStore``
+    (as used by ``Document(columnar=True)``).
+
+    Each representation is measured twice:
+    with the tag strings shared by all the tokens,
+    as the NLP wrappers map them, and with a new tag string
+    per token (e.g., tokens read from a file),
+    which the current representation interns.
+
+    The sizes are computed with ``sys.getsizeof()``,
+    counting each distinct object once:
+    the resident set size would not tell the representations apart,
+    as the new tokens reuse the memory freed by the analysis.
+    """
+
+    SENTENCES = 20000
+    """ Default number of sentences of the document """
+
+    REPRESENTATIONS = [
+        (u"dict", create_dict_tokens),
+        (u"slots", create_tokens),
+        (u"columnar", create_store),
+    ]
+    """ The token representations, and the functions creating them """
+
+    def __init__(self, seed=0, num_sentences=SENTENCES, sentence_length=SyntheticCorpus.SENTENCE_LENGTH):
+        self.seed = seed
+        self.num_sentences = num_sentences
+        self.sentence_length = sentence_length
+
+    def specs(self):
+        """
+        Return the ``(raw, upos_tag, trailing_whitespace, special)`` tuple
+        of each token of a new synthetic document,
+        where ``special`` is the class of a special token, or ``None``.
+        """
+        corpus = SyntheticCorpus(seed=self.seed)
+        document = YouTubeDownloader.parse(corpus.ttml(self.num_sentences, self.sentence_length))
+        SyntheticWrapper(corpus.language, corpus=corpus).analyze(document)
+        specs = []
+        for token in document.tokens:
+            special = None
+            if isinstance(token, EndOfLineToken):
+                special = EndOfLineToken
+            elif isinstance(token, EndOfSentenceToken):
+                special = EndOfSentenceToken
+            specs.append((token.raw, token.upos_tag, token.trailing_whitespace, special))
+        return specs
+
+    def run(self):
+        """
+        Run the benchmark, and return the report as a dict,
+        serializable to JSON.
+        """
+        specs = self.specs()
+        count = len(specs)
+        report = {
+            u"sentences": self.num_sentences,
+            u"sentence_length": self.sentence_length,
+            u"tokens": count,
+            u"special_tokens": len([s for s in specs if s[3] is not None]),
+            u"representations": {},
+        }
+        for name, function in self.REPRESENTATIONS:
+            results = {}
+            for scenario, copy_tags in [(u"shared_tags", False), (u"copied_tags", True)]:
+                objects, total = memory_size(function(specs, copy_tags))
+                results[scenario] = {
+                    u"object_bytes_per_token": float(objects) / count,
+                    u"bytes_per_token": float(total) / count,
+                }
+            report[u"representations"][name] = results
+        return report
+
+
+def usage(exit_code):
+    """ Print usage and exit. """
+    print(u"")
+    print(u"Usage:")
+    print(u"  $ python -m lachesis.benchmarks.tokens [--sentences N] [--seed S] [--output FILE]")
+    print(u"")
+    print(u"Options:")
+    print(u"  --output FILE    : write the JSON report to FILE instead of the standard output")
+    print(u"  --seed S         : seed of the synthetic corpus (default: 0)")
+    print(u"  --sentences N    : sentences of the document (default: %d)" % TokenMemoryBenchmark.SENTENCES)
+    print(u"")
+    sys.exit(exit_code)
+
+
+def main():
+    """ Entry point. """
+    if (u"-h" in sys.argv) or (u"--help" in sys.argv):
+        usage(0)
+
+    benchmark = TokenMemoryBenchmark(
+        seed=check_integer(option(u"--seed", usage, u"0"), 0, usage),
+        num_sentences=check_integer(option(u"--sentences", usage, u"%d" % TokenMemoryBenchmark.SENTENCES), 1, usage),
+    )
+    write_report(benchmark.run(), option(u"--output", usage))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
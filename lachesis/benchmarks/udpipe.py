@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Measure the throughput of the UDPipe wrapper
+with and without the dependency parsing.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import io
+import os
+import sys
+import time
+
+from lachesis.benchmarks.cli import check_integer
+from lachesis.benchmarks.cli import option
+from lachesis.benchmarks.cli import write_report
+from lachesis.benchmarks.synthetic import SyntheticCorpus
+from lachesis.elements import Document
+from lachesis.language import Language
+from lachesis.nlpwrappers.udpipe import UDPipeWrapper
+
+
+class UDPipeStagesBenchmark(object):
+    """
+    Time the analysis of the same text by the UDPipe wrapper
+    with each of the ``PIPELINES``, for each of the given languages,
+    using the UD 1.2 models in ``model_directory``
+    (by default, where the UDPipe wrapper looks for them).
+
+    The text is read from ``text_file_path``, if given,
+    otherwise it is a synthetic transcript of ``num_sentences`` sentences.
+    Each analysis is timed ``repeat`` times, keeping the fastest run,
+    and the report contains the tokens per second of each pipeline
+    and the speedup of each pipeline over the first one
+    (i.e., the previous behavior of the wrapper).
+    """
+
+    PIPELINES = [
+        (u"tag_parse", UDPipeWrapper.ALL_STAGES),
+        (u"tag", UDPipeWrapper.REQUIRED_STAGES),
+    ]
+    """ The names and the stages of the compared pipelines """
+
+    SENTENCES = 1000
+    """ Default number of sentences of the synthetic text """
+
+    REPEAT = 3
+    """ Default number of timed runs of each analysis """
+
+    def __init__(
+        self,
+        languages=[Language.ENGLISH],
+        model_directory=UDPipeWrapper.MODEL_FILES_DIRECTORY_PATH,
+        text_file_path=None,
+        num_sentences=SENTENCES,
+        seed=0,
+        repeat=REPEAT
+    ):
+        self.languages = languages
+        self.model_directory = model_directory
+        self.text_file_path = text_file_path
+        self.num_sentences = num_sentences
+        self.seed = seed
+        self.repeat = repeat
+
+    def text(self, language):
+        """
+        Return the text analyzed for the given language.
+        """
+        if self.text_file_path is not None:
+            with io.open(self.text_file_path, "r", encoding="utf-8") as text_file:
+                return text_file.read()
+        return SyntheticCorpus(seed=self.seed, language=language).text(self.num_sentences)
+
+    def run_pipeline(self, language, stages, text):
+        """
+        Analyze the given text with the given stages,
+        returning a dict with the best time, the number of tokens
+        and the tokens per second, or the error.
+        """
+        result = {u"seconds": None, u"tokens": None, u"tokens_per_second": None, u"error": None}
+        try:
+            model_file_path = os.path.join(self.model_directory, UDPipeWrapper.LANGUAGE_TO_MODEL_FILE[language])
+            wrapper = UDPipeWrapper(language, model_file_path=model_file_path, stages=stages)
+            best = None
+            for i in range(self.repeat):
+                document = Document(raw=text, language=language)
+                start = time.time()
+                wrapper.analyze(document)
+                elapsed = time.time() - start
+                best = elapsed if (best is None) else min(best, elapsed)
+            result[u"seconds"] = best
+            result[u"tokens"] = len([t for t in document.tokens if t.is_regular])
+            if best > 0:
+                result[u"tokens_per_second"] = result[u"tokens"] / best
+        except Exception as exc:
+            result[u"error"] = u"%s: %s" % (type(exc).__name__, exc)
+        return result
+
+    def run(self, progress=None):
+        """
+        Run the benchmark, and return the report as a dict,
+        serializable to JSON.
+
+        If ``progress`` is not ``None``, it is called
+        with a message before each pipeline is run.
+        """
+        report = {
+            u"parameters": {
+                u"model_directory": self.model_directory,
+                u"text_file_path": self.text_file_path,
+                u"sentences": None if self.text_file_path is not None else self.num_sentences,
+                u"seed": self.seed,
+                u"repeat": self.repeat,
+            },
+            u"pipelines": dict([(name, stages) for name, stages in self.PIPELINES]),
+            u"languages": {},
+        }
+        for language in self.languages:
+            text = self.text(language)
+            results = {}
+            for name, stages in self.PIPELINES:
+                if progress is not None:
+                    progress(u"Language %s: %s" % (language.codes[-1], name))
+                results[name] = self.run_pipeline(language, stages, text)
+            baseline = results[self.PIPELINES[0][0]][u"seconds"]
+            for result in results.values():
+                if (baseline is not None) and (result[u"seconds"] is not None) and (result[u"seconds"] > 0):
+                    result[u"speedup"] = baseline / result[u"seconds"]
+                else:
+                    result[u"speedup"] = None
+            report[u"languages"][language.codes[-1]] = results
+        return report
+
+
+def usage(exit_code):
+    """ Print usage and exit. """
+    print(u"")
+    print(u"Usage:")
+    print(u"  $ python -m lachesis.benchmarks.udpipe [--languages L,L,...] [--models DIR] [--text FILE] [--sentences N] [--seed S] [--repeat R] [--output FILE]")
+    print(u"")
+    print(u"Options:")
+    print(u"  --languages L,...: languages of the UD 1.2 models (default: en)")
+    print(u"  --models DIR     : directory of the UD 1.2 models (default: %s)" % UDPipeWrapper.MODEL_FILES_DIRECTORY_PATH)
+    print(u"  --output FILE    : write the JSON report to FILE instead of the standard output")
+    print(u"  --repeat R       : time each analysis R times, keeping the fastest run (default: %d)" % UDPipeStagesBenchmark.REPEAT)
+    print(u"  --seed S         : seed of the synthetic text (default: 0)")
+    print(u"  --sentences N    : sentences of the synthetic text (default: %d)" % UDPipeStagesBenchmark.SENTENCES)
+    print(u"  --text FILE      : analyze the text in FILE (UTF-8) instead of a synthetic text")
+    print(u"")
+    sys.exit(exit_code)
+
+
+def main():
+    """ Entry point. """
+    if (u"-h" in sys.argv) or (u"--help" in sys.argv):
+        usage(0)
+
+    languages = []
+    for code in option(u"--languages", usage, u"en").split(u","):
+        language = Language.from_code(code)
+        if language not in UDPipeWrapper.LANGUAGE_TO_MODEL_FILE:
+            print(u"[ERRO] No UD 1.2 model for language code '%s'" % code)
+            usage(1)
+        languages.append(language)
+    text_file_path = option(u"--text", usage)
+    if (text_file_path is not None) and (not os.path.isfile(text_file_path)):
+        print(u"[ERRO] File '%s' does not exist" % text_file_path)
+        usage(1)
+
+    benchmark = UDPipeStagesBenchmark(
+        languages=languages,
+        model_directory=option(u"--models", usage, UDPipeWrapper.MODEL_FILES_DIRECTORY_PATH),
+        text_file_path=text_file_path,
+        num_sentences=check_integer(option(u"--sentences", usage, u"%d" % UDPipeStagesBenchmark.SENTENCES), 1, usage),
+        seed=check_integer(option(u"--seed", usage, u"0"), 0, usage),
+        repeat=check_integer(option(u"--repeat", usage, u"%d" % UDPipeStagesBenchmark.REPEAT), 1, usage),
+    )
+
+    def progress(message):
+        print(message, file=sys.stderr)
+
+    write_report(benchmark.run(progress=progress), option(u"--output", usage))
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,12 @@ from lachesis.elements.span import RawCCSpan
 from lachesis.elements.span import RawSentenceSpan
 from lachesis.elements.span import RawTextSpan
 from lachesis.elements.span import Span
+from lachesis.elements.span import SpanView
+from lachesis.elements.store import StoredToken
+from lachesis.elements.store import StoredTokens
+from lachesis.elements.store import TokenStore
 from lachesis.elements.token import EndOfLineToken
 from lachesis.elements.token import EndOfSentenceToken
+from lachesis.elements.token import SpecialToken
 from lachesis.elements.token import Token
+from lachesis.elements.vocabulary import Vocabulary
@@ -24,17 +24,34 @@ TBW
 
 from __future__ import absolute_import
 from __future__ import print_function
+import codecs
+import copy
+import io
 import re
 
+from lachesis.elements.persistence import read_document
+from lachesis.elements.persistence import write_document
+from lachesis.elements.sizing import document_memory_report
 from lachesis.elements.span import RawSentenceSpan
 from lachesis.elements.span import RawTextSpan
 from lachesis.elements.span import Span
+from lachesis.elements.store import TokenStore
 from lachesis.elements.token import EndOfLineToken
 from lachesis.elements.token import EndOfSentenceToken
 from lachesis.language import Language
 import lachesis.globalfunctions as gf
 
 
+FLAT_WHITESPACE = re.compile(u"[ \n]+")
+""" Runs of spaces and newlines, collapsed in the flat clean string """
+
+WHITESPACE = re.compile(u"\\s+", re.UNICODE)
+""" Runs of whitespace, collapsed in the blocks read from a stream """
+
+PARAGRAPH_BREAK = re.compile(u"\\n\\s*\\n", re.UNICODE)
+""" Blank lines, separating the blocks read from a stream """
+
+
 class Document(object):
     """
     A Document is an abstract representation of closed captions,
@@ -57,14 +74,25 @@ class Document(object):
 
     The document might have an associated language,
     represented by a ``LanguageObject`` object.
+
+    If ``columnar`` is ``True``, the tokens of the document
+    are kept in a ``TokenStore`` instead of a list,
+    and the sentences of the ``text_view`` are views over it,
+    taking several times less memory.
     """
 
-    def __init__(self, raw=None, language=None):
+    CHUNK_SIZE = 65536
+    """ Default number of characters read at a time by ``from_stream()`` """
+
+    def __init__(self, raw=None, language=None, columnar=False):
         self.raw = self._set_raw(raw)
         self.language = Language.from_code(language)
-        self.tokens = []
+        self.columnar = columnar
+        self.tokens = TokenStore() if columnar else []
         self.text_view = None
         self.ccs_view = None
+        # peak memory used by the analysis and the splitting, by stage
+        self.high_water_marks = {}
 
     def _set_raw(self, raw):
         """
@@ -82,11 +110,62 @@ class Document(object):
             )
         raise TypeError(u"Parameter raw must be a unicode string or a list of unicode strings or a Span object. Found: '%s'" % type(raw))
 
+    def fork(self):
+        """
+        Return a new document sharing the raw span, the language,
+        the tokens and the text view of this document,
+        but with its own CCs view, initially empty,
+        so that the fork can be split (e.g., with different parameters)
+        without affecting this document, and vice versa.
+
+        NOTE: the shared objects must not be changed in place.
+              Analyzing either document again replaces them
+              in that document only.
+        """
+        fork = copy.copy(self)
+        fork.ccs_view = None
+        fork.high_water_marks = dict(self.high_water_marks)
+        return fork
+
+    def memory_report(self):
+        """
+        Return a dict with the bytes used by the raw spans,
+        the tag strings, the tokens, the text view and the CCs view
+        of this document, and the high-water marks recorded
+        while analyzing and splitting it
+        (see ``lachesis.elements.sizing.document_memory_report()``).
+        """
+        return document_memory_report(self)
+
+    def save(self, file_path):
+        """
+        Save this document, including its tokens and views,
+        to the given file, in a compact binary format
+        (see ``lachesis.elements.persistence``).
+        """
+        write_document(self, file_path)
+
+    @classmethod
+    def load(cls, file_path, columnar=None, memory_map=False, validate=True):
+        """
+        Load a document saved by ``save()`` from the given file.
+
+        If ``columnar`` is ``None``, the tokens are stored
+        as they were in the saved document.
+        If ``memory_map`` is ``True``, the file is memory-mapped
+        instead of being read into memory, and the columns
+        of columnar tokens are decoded from it when first accessed.
+        If ``validate`` is ``True``, the checksum of the file is verified.
+
+        :raises: ValueError: if the file is not a valid document file
+        """
+        return read_document(cls(), file_path, columnar=columnar, memory_map=memory_map, validate=validate)
+
     def clear(self):
         """
         Remove all information about tokens and views.
         """
-        self.tokens = []
+        self.tokens = TokenStore() if self.columnar else []
         self.text_view = None
         self.ccs_view = None
 
@@ -99,6 +178,19 @@ class Document(object):
             return self.raw_flat_clean_string
         return None
 
+    def write(self, sink):
+        """
+        Write the string of this document, as returned by ``str()``,
+        to the given file-like object, one span at a time
+        (see ``Span.write()``).
+        """
+        if self.text_view is not None:
+            self.text_view.write(sink, flat=True, clean=True)
+        elif self.ccs_view is not None:
+            self.ccs_view.write(sink)
+        elif self.has_raw:
+            sink.write(self.raw_flat_clean_string)
+
     @property
     def raw_string(self):
         if self.has_raw:
@@ -108,12 +200,70 @@ class Document(object):
     @property
     def raw_flat_clean_string(self):
         if self.has_raw:
-            s = self.raw.string(raw=True, flat=True, clean=True)
-            s = re.sub(u"\n", u" ", s)
-            s = re.sub(r" [ ]*", u" ", s)
-            return s
+            return FLAT_WHITESPACE.sub(u" ", self.raw.string(raw=True, flat=True, clean=True))
         return None
 
+    @classmethod
+    def from_stream(cls, stream, language=None, chunk_size=CHUNK_SIZE, columnar=False):
+        """
+        Create a document from the text read from the given file-like object
+        (in text or UTF-8 binary mode), ``chunk_size`` characters at a time.
+
+        The text is divided into blocks at blank lines,
+        and a block longer than ``chunk_size`` characters
+        is further divided at a line break or space.
+        Each block becomes a ``RawSentenceSpan``,
+        with its runs of whitespace collapsed into single spaces.
+
+        To analyze a large document one chunk at a time,
+        see ``iter_raw_chunks()``.
+        """
+        raw = RawTextSpan()
+        for block in _read_blocks(stream, chunk_size):
+            block = WHITESPACE.sub(u" ", block).strip()
+            if len(block) > 0:
+                raw.append(RawSentenceSpan(raw=block))
+        return cls(raw=raw, language=language, columnar=columnar)
+
+    def iter_raw_chunks(self, chunk_size):
+        """
+        Yield the raw text of this document in chunks,
+        each made of consecutive spans of the raw span
+        (e.g., the blocks of ``from_stream()`` or the CCs of a TTML file)
+        and at least ``chunk_size`` characters long, except the last one.
+
+        Each chunk is a ``(flat_string, flat_clean_string)`` tuple,
+        where ``flat_string`` contains the end of line
+        and end of sentence placeholders, like ``raw.string(flat=True)``,
+        and ``flat_clean_string`` does not, like ``raw_flat_clean_string``.
+        Each chunk but the last ends with the joiner of the raw spans.
+
+        If the raw span has no children (e.g., it was created from a string),
+        the whole raw text is yielded as a single chunk.
+        """
+        if not self.has_raw:
+            return
+        if (self.raw.raw is not None) or (len(self.raw.elements) < 1):
+            yield (self.raw.string(flat=True), self.raw_flat_clean_string)
+            return
+
+        def _chunk(sink):
+            flat = sink.getvalue()
+            clean = flat.replace(EndOfLineToken.RAW, u"").replace(EndOfSentenceToken.RAW, u"")
+            return (flat, FLAT_WHITESPACE.sub(u" ", clean))
+
+        joiner = self.raw.FLAT_JOINER
+        sink = io.StringIO()
+        for i, span in enumerate(self.raw.elements):
+            if sink.tell() >= chunk_size:
+                sink.write(joiner)
+                yield _chunk(sink)
+                sink = io.StringIO()
+            elif i > 0:
+                sink.write(joiner)
+            span.write(sink, raw=True, flat=True)
+        yield _chunk(sink)
+
     @property
     def has_raw(self):
         """
@@ -132,3 +282,38 @@ class Document(object):
         if self.ccs_view is None:
             return []
         return self.ccs_view.elements
+
+
+def _read_blocks(stream, chunk_size):
+    """
+    Yield the blocks of the text read from the given stream,
+    separated by blank lines, and at most ``chunk_size`` characters long,
+    unless they contain a longer word.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = u""
+    while True:
+        data = stream.read(chunk_size)
+        eof = (len(data) == 0)
+        if not gf.is_unicode(data):
+            data = decoder.decode(data, eof)
+        blocks = PARAGRAPH_BREAK.split(buffer + data)
+        buffer = u"" if eof else blocks.pop()
+        for block in blocks:
+            yield block
+        while len(buffer) > chunk_size:
+            # a long block, divide it at a line break or space
+            cut = buffer.rfind(u"\n", 0, chunk_size)
+            if cut < 1:
+                cut = buffer.rfind(u" ", 0, chunk_size)
+            if cut < 1:
+                # no break before, divide it at the next whitespace
+                match = WHITESPACE.search(buffer, chunk_size)
+                if match is None:
+                    # read more data, to find the end of the word
+                    break
+                cut = match.start()
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+        if eof:
+            return
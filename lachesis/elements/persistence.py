@@ -0,0 +1,614 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A compact binary format for (analyzed) Documents,
+see ``Document.save()`` and ``Document.load()``.
+
+A document file consists of the ``MAGIC`` bytes (including the version),
+a header with the length and the CRC32 of the payload,
+and the payload, a sequence of records.
+Each record is an array of integers or bytes
+(a typecode byte, an item size byte, the number of items
+as a little endian unsigned 64 bit integer, and the items,
+little endian), and each list of strings is stored
+as the UTF-8 bytes of their concatenation
+plus the array of their offsets (in characters).
+
+The payload contains, in order:
+
+1. the strings of the document, except the strings of the tokens;
+2. the document information (language, columnar, which views exist);
+3. the raw span tree, in preorder
+   (span class, raw string, number of children, time interval);
+4. the strings of the tokens;
+5. the tags and, for each token, its tag and flags;
+6. the (sparse) lemmas, chunk and PNP tags;
+7. the tokens of each sentence of the text view;
+8. the lines of each CC and the tokens of each line of the CCs view.
+
+Strings are referred to by their index in the list of strings,
+with ``-1`` meaning ``None``,
+and tokens by their index in the tokens of the document.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from array import array
+import gc
+import io
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from lachesis.elements.span import RawCCLineSpan
+from lachesis.elements.span import RawCCListSpan
+from lachesis.elements.span import RawCCSpan
+from lachesis.elements.span import RawSentenceSpan
+from lachesis.elements.span import RawTextSpan
+from lachesis.elements.span import Span
+from lachesis.elements.store import StoredToken
+from lachesis.elements.store import StoredTokens
+from lachesis.elements.store import TokenStore
+from lachesis.elements.token import Token
+from lachesis.exacttiming import TimeInterval
+from lachesis.exacttiming import TimeValue
+from lachesis.language import Language
+
+
+MAGIC = b"LACHESIS-DOCUMENT 1\n"
+""" First bytes of a document file, including the version of the format """
+
+MAGIC_PREFIX = b"LACHESIS-DOCUMENT "
+""" First bytes of a document file, of any version """
+
+HEADER = struct.Struct("<QI")
+""" Length and CRC32 of the payload """
+
+RECORD = struct.Struct("<cBQ")
+""" Typecode, item size and number of items of a record """
+
+RAW_SPAN_CLASSES = [Span, RawTextSpan, RawSentenceSpan, RawCCListSpan, RawCCSpan, RawCCLineSpan]
+""" The classes of the spans of the raw span tree, by code """
+
+FLAG_TRAILING_WHITESPACE = TokenStore.FLAG_TRAILING_WHITESPACE
+""" Flag of a token with a trailing whitespace """
+
+FLAG_SPECIAL = TokenStore.FLAG_SPECIAL
+""" Flag of a special token """
+
+CHUNK_SIZE = 1 << 20
+""" Bytes read at a time to compute the CRC32 """
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    if hasattr(values, "tobytes"):
+        return values.tobytes()
+    return values.tostring()
+
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    if hasattr(values, "frombytes"):
+        values.frombytes(data)
+    else:
+        values.fromstring(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _crc32(data, begin, end):
+    crc = 0
+    for offset in range(begin, end, CHUNK_SIZE):
+        crc = zlib.crc32(data[offset:min(offset + CHUNK_SIZE, end)], crc)
+    return crc & 0xffffffff
+
+
+class _StringTable(object):
+    """
+    The distinct strings of a document, by index.
+    """
+
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, string):
+        if string is None:
+            return -1
+        idx = self.index.get(string)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(string)
+            self.index[string] = idx
+        return idx
+
+
+class _Writer(object):
+    """
+    Accumulate the records of a payload.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write_array(self, typecode, values):
+        values = array(typecode, values)
+        self.chunks.append(RECORD.pack(typecode.encode("ascii"), values.itemsize, len(values)))
+        self.chunks.append(_to_bytes(values))
+
+    def write_strings(self, strings):
+        offsets = array("i", [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+        self.write_text(u"".join(strings), offsets)
+
+    def write_text(self, text, offsets):
+        data = text.encode("utf-8")
+        self.chunks.append(RECORD.pack(b"B", 1, len(data)))
+        self.chunks.append(data)
+        self.write_array("i", offsets)
+
+    @property
+    def payload(self):
+        return b"".join(self.chunks)
+
+
+class _Reader(object):
+    """
+    Read the records of a payload from a bytes or mmap object.
+    """
+
+    def __init__(self, data, offset, end, validate=True):
+        self.data = data
+        self.offset = offset
+        self.end = end
+        self.validate = validate
+
+    def record(self, typecode, length=None):
+        """
+        Skip the next record, which must be an array
+        with the given typecode (and length, if given),
+        and return the begin and end of its items.
+        """
+        if self.offset + RECORD.size > self.end:
+            raise ValueError(u"Truncated document file")
+        code, itemsize, count = RECORD.unpack(self.data[self.offset:(self.offset + RECORD.size)])
+        size = array(typecode).itemsize
+        if (code != typecode.encode("ascii")) or (itemsize != size):
+            raise ValueError(u"Unexpected record in document file")
+        begin = self.offset + RECORD.size
+        end = begin + count * size
+        if end > self.end:
+            raise ValueError(u"Truncated document file")
+        if (length is not None) and (count != length):
+            raise ValueError(u"Record of unexpected length in document file")
+        self.offset = end
+        return begin, end
+
+    def decode_array(self, typecode, record):
+        begin, end = record
+        return _from_bytes(typecode, self.data[begin:end])
+
+    def decode_text(self, text_record, offsets_record):
+        begin, end = text_record
+        text = self.data[begin:end].decode("utf-8")
+        offsets = self.decode_array("i", offsets_record)
+        if (len(offsets) < 1) or (offsets[0] != 0) or (offsets[-1] != len(text)):
+            raise ValueError(u"Invalid string offsets in document file")
+        if self.validate and (min([e - b for b, e in zip(offsets, offsets[1:])] or [0]) < 0):
+            raise ValueError(u"Invalid string offsets in document file")
+        return text, offsets
+
+    def read_array(self, typecode, length=None):
+        return self.decode_array(typecode, self.record(typecode, length))
+
+    def read_text(self):
+        text_record = self.record("B")
+        return self.decode_text(text_record, self.record("i"))
+
+    def read_strings(self):
+        text, offsets = self.read_text()
+        return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def _check_range(values, minimum, maximum):
+    if (len(values) > 0) and ((min(values) < minimum) or (max(values) >= maximum)):
+        raise ValueError(u"Index out of range in document file")
+
+
+def _string(strings, idx):
+    if idx < 0:
+        return None
+    return strings[idx]
+
+
+class _TokenIndex(object):
+    """
+    Map the tokens of the views of a document
+    to their indices in the tokens of the document.
+
+    NOTE: the special tokens are shared,
+          hence a special token is mapped
+          to any token of the same class.
+    """
+
+    def __init__(self, tokens):
+        if isinstance(tokens, TokenStore):
+            self.store = tokens
+            special = [i for i, flag in enumerate(tokens.flags) if flag & FLAG_SPECIAL]
+            self.positions = dict([(id(tokens.token(i)), i) for i in special])
+        else:
+            self.store = None
+            self.positions = dict([(id(token), i) for i, token in enumerate(tokens)])
+
+    def indices(self, tokens):
+        if isinstance(tokens, StoredTokens) and (tokens.store is self.store):
+            return tokens.indices
+        positions = self.positions
+        try:
+            return [positions[id(token)] for token in tokens]
+        except KeyError:
+            return [self.index(token) for token in tokens]
+
+    def index(self, token):
+        if isinstance(token, StoredToken) and (token.store is self.store):
+            return token.index
+        idx = self.positions.get(id(token))
+        if idx is None:
+            raise ValueError(u"The views of the document contain a token which is not in its tokens")
+        return idx
+
+
+def _token_columns(tokens):
+    """
+    Return the text and the offsets of the strings of the given tokens,
+    the list of their tags and, for each token,
+    the index of its tag and its flags,
+    and the lists of the ``(index, value)`` pairs
+    of the lemmas, chunk and PNP tags.
+    """
+    if isinstance(tokens, TokenStore):
+        return (
+            tokens.text,
+            tokens.offsets,
+            tokens.tags,
+            tokens.tag_codes,
+            tokens.flags,
+            [sorted(values.items()) for values in (tokens.lemmas, tokens.chunk_tags, tokens.pnp_tags)],
+        )
+    tag_index = {}
+    tag_codes = [tag_index.setdefault(token.upos_tag, len(tag_index)) for token in tokens]
+    tags = [tag for tag, code in sorted(tag_index.items(), key=lambda x: x[1])]
+    flags = [
+        (FLAG_TRAILING_WHITESPACE if token.trailing_whitespace else 0) |
+        (FLAG_SPECIAL if token.is_special else 0)
+        for token in tokens
+    ]
+    raws = [token.raw for token in tokens]
+    offsets = array("i", [0])
+    for raw in raws:
+        offsets.append(offsets[-1] + len(raw))
+    return (
+        u"".join(raws),
+        offsets,
+        tags,
+        tag_codes,
+        flags,
+        [
+            [(i, token.lemma) for i, token in enumerate(tokens) if token.lemma is not None],
+            [(i, token.chunk_tag) for i, token in enumerate(tokens) if token.chunk_tag is not None],
+            [(i, token.pnp_tag) for i, token in enumerate(tokens) if token.pnp_tag is not None],
+        ]
+    )
+
+
+def write_document(document, file_path):
+    """
+    Write the given document to the given file.
+    """
+    strings = _StringTable()
+    writer = _Writer()
+
+    # raw span tree, in preorder
+    kinds, raws, sizes, begins, ends = [], [], [], [], []
+    stack = [] if document.raw is None else [document.raw]
+    while len(stack) > 0:
+        span = stack.pop()
+        if not isinstance(span, Span) or (type(span) not in RAW_SPAN_CLASSES):
+            raise ValueError(u"Unable to save a raw span of type '%s'" % type(span))
+        kinds.append(RAW_SPAN_CLASSES.index(type(span)))
+        raws.append(strings.add(span.raw))
+        sizes.append(len(span.elements))
+        interval = getattr(span, "time_interval", None)
+        begins.append(-1 if interval is None else strings.add(u"%s" % interval.begin))
+        ends.append(-1 if interval is None else strings.add(u"%s" % interval.end))
+        stack.extend(reversed(span.elements))
+
+    # tokens
+    tokens = document.tokens
+    text, offsets, tags, tag_codes, flags, sparse = _token_columns(tokens)
+
+    # views
+    index = _TokenIndex(tokens)
+    sentence_sizes, sentence_tokens = [], array("i")
+    if document.text_view is not None:
+        for sentence in document.text_view.elements:
+            sentence_sizes.append(len(sentence.elements))
+            sentence_tokens.extend(array("i", index.indices(sentence.elements)))
+    cc_sizes, line_sizes, line_tokens = [], [], array("i")
+    if document.ccs_view is not None:
+        for cc in document.ccs_view.elements:
+            cc_sizes.append(len(cc.elements))
+            for line in cc.elements:
+                elements = line.elements
+                line_sizes.append(len(elements))
+                line_tokens.extend(array("i", index.indices(elements)))
+
+    language = None if document.language is None else document.language.canonical_code()
+    info = [
+        strings.add(language),
+        1 if document.columnar else 0,
+        1 if document.text_view is not None else 0,
+        1 if document.ccs_view is not None else 0,
+    ]
+    tag_strings = [strings.add(tag) for tag in tags]
+    sparse = [([i for i, value in values], [strings.add(value) for i, value in values]) for values in sparse]
+
+    writer.write_strings(strings.strings)
+    writer.write_array("i", info)
+    for values in (kinds, raws, sizes, begins, ends):
+        writer.write_array("i", values)
+    writer.write_text(text, offsets)
+    writer.write_array("i", tag_strings)
+    writer.write_array("i", tag_codes)
+    writer.write_array("B", flags)
+    for indices, values in sparse:
+        writer.write_array("i", indices)
+        writer.write_array("i", values)
+    writer.write_array("i", sentence_sizes)
+    writer.write_array("i", sentence_tokens)
+    writer.write_array("i", cc_sizes)
+    writer.write_array("i", line_sizes)
+    writer.write_array("i", line_tokens)
+
+    payload = writer.payload
+    with io.open(file_path, "wb") as document_file:
+        document_file.write(MAGIC)
+        document_file.write(HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff))
+        document_file.write(payload)
+
+
+def read_document(document, file_path, columnar=None, memory_map=False, validate=True):
+    """
+    Read the document file with the given path
+    into the given (new) document.
+
+    If ``columnar`` is ``None``, the tokens are stored
+    as they were in the saved document.
+    If ``memory_map`` is ``True``, the file is memory-mapped
+    instead of being read into memory, and, if the tokens are columnar,
+    their columns (strings, tags and flags) are decoded
+    from the mapped file by the ``TokenStore``
+    when first accessed, with the store owning the map;
+    otherwise, the map is closed once the document is read.
+    If ``validate`` is ``True``, check the CRC32 of the payload
+    and the offsets of the strings (the other indices
+    are always checked).
+
+    :raises: ValueError: if the file is not a valid document file
+    """
+    with io.open(file_path, "rb") as document_file:
+        if memory_map:
+            if os.fstat(document_file.fileno()).st_size == 0:
+                raise ValueError(u"File '%s' is not a document file" % file_path)
+            data = mmap.mmap(document_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = document_file.read()
+    # NOTE: the objects created while loading are not garbage,
+    #       so do not let the cyclic garbage collector
+    #       traverse them over and over again
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    lazy = False
+    try:
+        lazy = _read_document(document, file_path, data, columnar, memory_map, validate)
+    finally:
+        if gc_enabled:
+            gc.enable()
+        if memory_map and (not lazy):
+            data.close()
+    return document
+
+
+def _check_special_tokens(tag_codes, flags, specials, file_path):
+    for code in set([code for code, flag in zip(tag_codes, flags) if flag & FLAG_SPECIAL]):
+        if code not in specials:
+            raise ValueError(u"Unknown special token in document file '%s'" % file_path)
+
+
+def _read_document(document, file_path, data, columnar, memory_map, validate):
+    """
+    Read the given data into the given document,
+    and return ``True`` if the columns of its tokens
+    are decoded lazily from the given (memory-mapped) data.
+    """
+    magic = data[0:len(MAGIC)]
+    if magic != MAGIC:
+        if magic.startswith(MAGIC_PREFIX):
+            raise ValueError(u"File '%s' has an unsupported document file version" % file_path)
+        raise ValueError(u"File '%s' is not a document file" % file_path)
+    begin = len(MAGIC) + HEADER.size
+    if len(data) < begin:
+        raise ValueError(u"Truncated document file '%s'" % file_path)
+    length, crc = HEADER.unpack(data[len(MAGIC):begin])
+    end = begin + length
+    if len(data) != end:
+        raise ValueError(u"Truncated document file '%s'" % file_path)
+    if validate and (_crc32(data, begin, end) != crc):
+        raise ValueError(u"Corrupted document file '%s'" % file_path)
+    reader = _Reader(data, begin, end, validate)
+
+    strings = reader.read_strings()
+    info = reader.read_array("i", 4)
+    language_idx, saved_columnar, has_text_view, has_ccs_view = info
+    _check_range([language_idx], -1, len(strings))
+    kinds = reader.read_array("i")
+    raws, sizes, begins, ends = [reader.read_array("i", len(kinds)) for i in range(4)]
+    _check_range(kinds, 0, len(RAW_SPAN_CLASSES))
+    for values in (raws, begins, ends):
+        _check_range(values, -1, len(strings))
+    if columnar is None:
+        columnar = (saved_columnar == 1)
+    lazy = memory_map and columnar
+    text_record = reader.record("B")
+    offsets_record = reader.record("i")
+    n = (offsets_record[1] - offsets_record[0]) // array("i").itemsize - 1
+    tag_strings = reader.read_array("i")
+    _check_range(tag_strings, -1, len(strings))
+    tag_codes_record = reader.record("i", n)
+    flags_record = reader.record("B", n)
+    sparse = []
+    for j in range(3):
+        indices = reader.read_array("i")
+        values = reader.read_array("i", len(indices))
+        _check_range(indices, 0, n)
+        _check_range(values, 0, len(strings))
+        sparse.append(dict([(i, strings[v]) for i, v in zip(indices, values)]))
+    sentence_sizes = reader.read_array("i")
+    sentence_tokens = reader.read_array("i", sum(sentence_sizes))
+    cc_sizes = reader.read_array("i")
+    line_sizes = reader.read_array("i", sum(cc_sizes))
+    line_tokens = reader.read_array("i", sum(line_sizes))
+    for values in (sentence_tokens, line_tokens):
+        _check_range(values, 0, n)
+    if reader.offset != end:
+        raise ValueError(u"Unexpected data at the end of document file '%s'" % file_path)
+
+    # raw span tree, built from the last span in preorder,
+    # so that the children of each span are on top of the stack
+    stack = []
+    times = {}
+
+    def _time(idx):
+        if idx not in times:
+            times[idx] = TimeValue(strings[idx])
+        return times[idx]
+
+    for i in range(len(kinds) - 1, -1, -1):
+        if sizes[i] > len(stack):
+            raise ValueError(u"Invalid raw span tree in document file '%s'" % file_path)
+        elements = [stack.pop() for j in range(sizes[i])]
+        span = RAW_SPAN_CLASSES[kinds[i]](raw=_string(strings, raws[i]), elements=elements)
+        if begins[i] >= 0:
+            span.time_interval = TimeInterval(_time(begins[i]), _time(ends[i]))
+        stack.append(span)
+    if len(stack) > 1:
+        raise ValueError(u"Invalid raw span tree in document file '%s'" % file_path)
+    raw = stack[0] if len(stack) > 0 else None
+
+    # tokens
+    tags = [_string(strings, idx) for idx in tag_strings]
+    specials = dict([(code, TokenStore.SPECIAL_TOKENS[tag]()) for code, tag in enumerate(tags) if tag in TokenStore.SPECIAL_TOKENS])
+    lemmas, chunk_tags, pnp_tags = sparse
+
+    def _columns():
+        # NOTE: if lazy, the reader keeps the mapped data open
+        #       until the columns are decoded by the store
+        text, offsets = reader.decode_text(text_record, offsets_record)
+        tag_codes = reader.decode_array("i", tag_codes_record)
+        _check_range(tag_codes, 0, len(tags))
+        flags = reader.decode_array("B", flags_record)
+        _check_special_tokens(tag_codes, flags, specials, file_path)
+        return {
+            "_text": text,
+            "offsets": offsets,
+            "tag_codes": array("B" if len(tags) <= 256 else "H", tag_codes),
+            "flags": flags,
+        }
+
+    if columnar:
+        tokens = TokenStore.lazy(_columns)
+        for tag in tags:
+            tokens._tag_code(tag)
+        if not lazy:
+            tokens._decode_columns()
+        tokens.lemmas = lemmas
+        tokens.chunk_tags = chunk_tags
+        tokens.pnp_tags = pnp_tags
+
+        def _elements(indices):
+            return StoredTokens(tokens, indices)
+    else:
+        columns = _columns()
+        text, offsets, tag_codes, flags = [columns[name] for name in ("_text", "offsets", "tag_codes", "flags")]
+        tokens = []
+        append = tokens.append
+        raws = [text[b:e] for b, e in zip(offsets, offsets[1:])]
+        for i, token_raw, code, flag in zip(range(n), raws, tag_codes, flags):
+            if flag & FLAG_SPECIAL:
+                append(specials[code])
+            else:
+                append(Token(
+                    token_raw,
+                    tags[code],
+                    chunk_tags.get(i),
+                    pnp_tags.get(i),
+                    lemmas.get(i),
+                    (flag & FLAG_TRAILING_WHITESPACE) > 0
+                ))
+
+        def _elements(indices):
+            return [tokens[i] for i in indices]
+
+    # views
+    text_view = None
+    if has_text_view:
+        text_view = Span()
+        begin = 0
+        for size in sentence_sizes:
+            text_view.append(Span(elements=_elements(sentence_tokens[begin:(begin + size)])))
+            begin += size
+    ccs_view = None
+    if has_ccs_view:
+        ccs_view = Span()
+        line = 0
+        begin = 0
+        for size in cc_sizes:
+            lines = []
+            for line_size in line_sizes[line:(line + size)]:
+                lines.append(Span(elements=_elements(line_tokens[begin:(begin + line_size)])))
+                begin += line_size
+            ccs_view.append(Span(elements=lines))
+            line += size
+
+    document.raw = raw
+    document.language = None if language_idx < 0 else Language.from_code(strings[language_idx])
+    document.columnar = columnar
+    document.tokens = tokens
+    document.text_view = text_view
+    document.ccs_view = ccs_view
+    return lazy
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the bytes used by the objects of a Document
+(see ``Document.memory_report()``).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from array import array
+import sys
+import types
+
+from lachesis.elements.store import TokenStore
+from lachesis.elements.token import Token
+
+# objects reachable from a document which are not part of it
+SKIPPED_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+)
+
+# objects not referring to other objects
+LEAF_TYPES = (
+    array,
+    bytes,
+    float,
+    int,
+    type(u""),
+)
+
+# the kinds of objects, as walked by memory_size()
+SKIPPED = 0
+LEAF = 1
+TOKEN = 2
+MAPPING = 3
+SEQUENCE = 4
+OBJECT = 5
+
+# the kind of each class, by class
+_KINDS = {}
+
+# the slot descriptors of each class, by class
+_SLOTS = {}
+
+
+def _kind(cls):
+    kind = _KINDS.get(cls)
+    if kind is None:
+        if (cls is type(None)) or issubclass(cls, SKIPPED_TYPES):
+            kind = SKIPPED
+        elif issubclass(cls, LEAF_TYPES):
+            kind = LEAF
+        elif cls is Token:
+            kind = TOKEN
+        elif issubclass(cls, dict):
+            kind = MAPPING
+        elif issubclass(cls, (list, tuple, set, frozenset)):
+            kind = SEQUENCE
+        else:
+            kind = OBJECT
+        _KINDS[cls] = kind
+    return kind
+
+
+def _slots(cls):
+    slots = _SLOTS.get(cls)
+    if slots is None:
+        slots = []
+        for klass in cls.__mro__:
+            names = klass.__dict__.get("__slots__", ())
+            if isinstance(names, (type(u""), str)):
+                names = (names,)
+            for name in names:
+                if not name.startswith("__"):
+                    slots.append(klass.__dict__[name])
+        _SLOTS[cls] = slots
+    return slots
+
+
+def memory_size(roots, seen):
+    """
+    Return the bytes used by the given objects
+    and by all the objects they refer to
+    (through their items, ``__dict__`` or slots),
+    skipping the objects whose ``id()`` is in ``seen``
+    and adding the ``id()`` of the visited objects to it,
+    so that each object is counted only once,
+    even if ``memory_size()`` is called several times.
+    """
+    getsizeof = sys.getsizeof
+    kinds = _KINDS
+    total = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        cls = type(obj)
+        kind = kinds.get(cls)
+        if kind is None:
+            kind = _kind(cls)
+        if kind == SKIPPED:
+            continue
+        seen.add(id(obj))
+        total += getsizeof(obj)
+        if kind == LEAF:
+            continue
+        if kind == TOKEN:
+            # the (many) regular tokens: their tags are counted
+            # by the caller, and their other attributes
+            # are strings or booleans
+            for value in (obj.raw, obj.lemma):
+                if (value is not None) and (id(value) not in seen):
+                    seen.add(id(value))
+                    total += getsizeof(value)
+        elif kind == SEQUENCE:
+            stack.extend(obj)
+        elif kind == MAPPING:
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        else:
+            state = getattr(obj, "__dict__", None)
+            if state is not None:
+                stack.append(state)
+            for slot in _slots(cls):
+                try:
+                    stack.append(slot.__get__(obj, cls))
+                except AttributeError:
+                    # slot not set
+                    pass
+    return total
+
+
+def _tags(tokens):
+    if isinstance(tokens, TokenStore):
+        return [
+            tokens.tags,
+            tokens.tag_index,
+            list(tokens.chunk_tags.values()),
+            list(tokens.pnp_tags.values()),
+        ]
+    tags = {}
+    for token in tokens:
+        for tag in (token.upos_tag, token.chunk_tag, token.pnp_tag):
+            if tag is not None:
+                tags[id(tag)] = tag
+    return list(tags.values())
+
+
+def document_memory_report(document):
+    """
+    Return a dict with the bytes used by the objects of the given document,
+    by part: ``raw`` (the raw spans), ``tags`` (the distinct tag strings),
+    ``tokens`` (the tokens, or their ``TokenStore``),
+    ``text_view`` and ``ccs_view`` (the spans of the views,
+    and the objects they do not share with the tokens),
+    and their ``total``.
+
+    Each object is counted once, in the first of the above parts
+    referring to it.
+    The dict also contains the number of tokens (``num_tokens``)
+    and the ``high_water_marks`` recorded by the analysis
+    and the splitting of the document.
+    """
+    seen = set()
+    report = {}
+    for key, roots in [
+        (u"tags", _tags(document.tokens)),
+        (u"tokens", [document.tokens]),
+        (u"raw", [document.raw]),
+        (u"text_view", [document.text_view]),
+        (u"ccs_view", [document.ccs_view]),
+    ]:
+        report[key] = memory_size(roots, seen)
+    report[u"total"] = sum(report.values())
+    report[u"num_tokens"] = len(document.tokens)
+    report[u"high_water_marks"] = dict(document.high_water_marks)
+    return report
@@ -25,30 +25,123 @@ TBW
 from __future__ import absolute_import
 from __future__ import print_function
 
+from lachesis.elements.store import StoredTokens
 from lachesis.elements.token import EndOfLineToken
 from lachesis.elements.token import EndOfSentenceToken
+from lachesis.elements.token import Token
 from lachesis.language import Language
 import lachesis.globalfunctions as gf
 
 
+_CACHE_STATISTICS = {u"hits": 0, u"misses": 0}
+
+
+def cache_statistics():
+    """
+    Return a dict with the number of calls to ``Span.string()``
+    served from the cache of the span (``hits``)
+    and of those rendering the span (``misses``),
+    since the last call to ``reset_cache_statistics()``.
+    """
+    return dict(_CACHE_STATISTICS)
+
+
+def reset_cache_statistics():
+    """
+    Reset the counters returned by ``cache_statistics()``.
+    """
+    _CACHE_STATISTICS[u"hits"] = 0
+    _CACHE_STATISTICS[u"misses"] = 0
+
+
 class Span(object):
     """
     A Span corresponds to an arbitrary sublist of Tokens of a Document.
     Its elements might be Token objects or other (nested) Span objects.
+
+    The strings returned by ``string()`` by a span of tokens
+    (e.g., a sentence or a line) are cached in the span,
+    one for each combination of its arguments,
+    and used as long as the span has the same ``raw`` and ``elements``
+    objects and it has not been extended (checked in constant time).
+    Spans of (nested) spans are not cached,
+    but they join the cached strings of their spans,
+    so changing a nested span changes the strings of the spans containing it.
+    If the list of elements is changed in place (not by ``append()``
+    or ``extend()``), or the attributes of a token are changed,
+    after rendering them, call ``invalidate()`` on the span of tokens
+    containing them.
     """
 
     JOINER = u""
     FLAT_JOINER = u""
 
+    _strings = None
+    """ The cached strings, by the arguments of ``string()`` """
+
+    _cached_source = None
+    """ The ``_source()`` the cached strings were rendered from """
+
     def __init__(self, raw=None, elements=None):
         self.raw = raw
         self.elements = [] if elements is None else elements
 
+    def __getstate__(self):
+        # do not pickle the cached strings
+        state = self.__dict__.copy()
+        state.pop("_strings", None)
+        state.pop("_cached_source", None)
+        return state
+
+    def _source(self):
+        """
+        Return the objects the strings of this span are rendered from,
+        compared by identity to validate the cached strings.
+        """
+        return (self.raw, self.elements)
+
+    def invalidate(self):
+        """
+        Clear the cached strings of this span.
+        """
+        self._strings = None
+        self._cached_source = None
+
+    def _cached_string(self, key):
+        """
+        Return the cached string for the given key,
+        or ``None`` if it is not cached or the source has changed.
+        """
+        if self._strings is None:
+            return None
+        raw, elements = self._source()
+        if (raw is not self._cached_source[0]) or (elements is not self._cached_source[1]):
+            self.invalidate()
+            return None
+        return self._strings.get(key)
+
+    def _cache_string(self, key, s):
+        """
+        Cache the given string for the given key,
+        if all the elements of this span are tokens.
+        """
+        if self._strings is None:
+            elements = self.elements
+            if not isinstance(elements, StoredTokens):
+                for e in elements:
+                    if not isinstance(e, Token):
+                        return
+            self._strings = {}
+            self._cached_source = self._source()
+        self._strings[key] = s
+
     def append(self, obj):
         self.elements.append(obj)
+        self.invalidate()
 
     def extend(self, lst):
         self.elements.extend(lst)
+        self.invalidate()
 
     def __str__(self):
         return self.string(flat=True, clean=True)
@@ -73,6 +166,12 @@ class Span(object):
         return s
 
     def string(self, raw=False, flat=False, tagged=False, clean=False, eol=None, eos=None):
+        key = (raw, flat, tagged, clean, eol, eos)
+        s = self._cached_string(key)
+        if s is not None:
+            _CACHE_STATISTICS[u"hits"] += 1
+            return s
+        _CACHE_STATISTICS[u"misses"] += 1
         if tagged:
             s = self._helper_string(self.JOINER, raw=False, tagged=True)
         elif flat:
@@ -84,7 +183,90 @@ class Span(object):
         if clean:
             eol = u""
             eos = u""
-        return self._clean_eol_eos(s, eol, eos)
+        s = self._clean_eol_eos(s, eol, eos)
+        self._cache_string(key, s)
+        return s
+
+    def write(self, sink, raw=False, flat=False, tagged=False, clean=False, eol=None, eos=None):
+        """
+        Write the string of this span to the given file-like object,
+        as ``sink.write(self.string(...))`` would do with the same arguments,
+        but without building the string of the whole span:
+        the string of each innermost span is written as soon as it is built,
+        and the end of line and end of sentence tokens
+        are replaced by ``eol`` and ``eos`` when they are met,
+        instead of by searching their placeholders in the result.
+        """
+        if clean:
+            eol = u""
+            eos = u""
+        self._write(sink, raw, flat, tagged, eol, eos)
+
+    def _write(self, sink, raw, flat, tagged, eol, eos):
+        s = self._cached_string((raw, flat, tagged, False, eol, eos))
+        if s is not None:
+            sink.write(s)
+            return
+        if tagged:
+            joiner, raw, flat = self.JOINER, False, False
+        elif flat:
+            joiner, raw = self.FLAT_JOINER, True
+        else:
+            joiner = self.JOINER
+        if raw and (self.raw is not None):
+            sink.write(self._clean_eol_eos(self.raw, eol, eos))
+            return
+        replacements = {EndOfLineToken: eol, EndOfSentenceToken: eos}
+        pieces = []
+        for i, e in enumerate(self.elements):
+            if (i > 0) and (len(joiner) > 0):
+                pieces.append(joiner)
+            if isinstance(e, Span):
+                if len(pieces) > 0:
+                    sink.write(u"".join(pieces))
+                    pieces = []
+                e._write(sink, raw, flat, tagged, eol, eos)
+                continue
+            s = e.string(tagged=tagged)
+            if e.is_special:
+                replacement = replacements.get(type(e))
+                if replacement is not None:
+                    s = replacement + s[len(e.raw):]
+            pieces.append(s)
+        if len(pieces) > 0:
+            sink.write(u"".join(pieces))
+
+
+class SpanView(Span):
+    """
+    A Span over the elements ``[start:end]`` of a parent sequence
+    (e.g., the list of the regular tokens of a sentence),
+    which refers to the parent instead of copying its elements,
+    hence it is created in constant time.
+
+    Its ``elements`` are the slice of the parent,
+    computed when accessed.
+    A SpanView cannot be extended.
+    """
+
+    def __init__(self, parent, start=0, end=None, raw=None):
+        self.raw = raw
+        self.parent = parent
+        self.start = start
+        self.end = len(parent) if end is None else end
+
+    @property
+    def elements(self):
+        return self.parent[self.start:self.end]
+
+    def _source(self):
+        return (self.raw, self.parent)
+
+    def append(self, obj):
+        raise TypeError(u"A SpanView cannot be extended")
+
+    def extend(self, lst):
+        raise TypeError(u"A SpanView cannot be extended")
 
 
 class RawTextSpan(Span):
@@ -128,3 +310,6 @@ class RawCCLineSpan(Span):
     def string(self, raw=False, flat=False, tagged=False, clean=False, eol=None, eos=None):
         # overrides with raw=True, as this element only contains the raw string
         return super(RawCCLineSpan, self).string(raw=True, flat=flat, tagged=tagged, clean=clean, eol=eol, eos=eos)
+
+    def _write(self, sink, raw, flat, tagged, eol, eos):
+        super(RawCCLineSpan, self)._write(sink, True, flat, tagged, eol, eos)
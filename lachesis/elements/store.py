@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A columnar store for the tokens of a Document.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from array import array
+
+from lachesis.elements.token import EndOfLineToken
+from lachesis.elements.token import EndOfSentenceToken
+from lachesis.elements.token import intern_tag
+from lachesis.elements.token import Token
+
+
+class TokenStore(object):
+    """
+    The tokens of a Document, stored by column:
+    the strings of the tokens in one text buffer,
+    with the offset of each token in an array,
+    the UPOS tags as small integer codes,
+    and the trailing whitespace and special flags as bytes.
+    The (rare) lemmas, chunk and PNP tags are kept in dicts
+    indexed by token.
+
+    The store is a sequence of tokens:
+    a regular token is materialized on access
+    as a ``StoredToken`` (a view reading and writing the columns),
+    a special token as the shared instance of its class.
+    Slicing the store returns a ``StoredTokens`` object,
+    a sequence of tokens of the store which does not materialize them.
+
+    The columns of a store read from a memory-mapped document file
+    (see ``Document.load()``) are decoded from the file
+    when one of them is first accessed.
+    """
+
+    FLAG_TRAILING_WHITESPACE = 1
+    """ Flag of a token with a trailing whitespace """
+
+    FLAG_SPECIAL = 2
+    """ Flag of a special token """
+
+    SPECIAL_TOKENS = {
+        EndOfLineToken.UPOS_TAG: EndOfLineToken,
+        EndOfSentenceToken.UPOS_TAG: EndOfSentenceToken,
+    }
+    """ The classes of the special tokens, by UPOS tag """
+
+    LAZY_COLUMNS = frozenset(["_text", "offsets", "tag_codes", "flags"])
+    """ The columns which can be decoded on their first access """
+
+    def __init__(self, tokens=None):
+        self._text = u""
+        self._pieces = []
+        # offsets[i] and offsets[i + 1] are the begin and end
+        # of the string of the i-th token in the text buffer
+        self.offsets = array("i", [0])
+        self.tags = []
+        self.tag_index = {}
+        self.tag_codes = array("B")
+        self.flags = array("B")
+        self.lemmas = {}
+        self.chunk_tags = {}
+        self.pnp_tags = {}
+        if tokens is not None:
+            self.extend(tokens)
+
+    @classmethod
+    def lazy(cls, loader):
+        """
+        Return a new store whose ``LAZY_COLUMNS`` are set
+        by the dict returned by calling ``loader()``
+        when one of them is first accessed.
+        The other attributes must be set by the caller.
+        """
+        store = cls()
+        for name in cls.LAZY_COLUMNS:
+            delattr(store, name)
+        store._loader = loader
+        return store
+
+    def _decode_columns(self):
+        self.__dict__.update(self._loader())
+        del self._loader
+
+    def __getattr__(self, name):
+        # called only if the attribute is not set,
+        # that is, for the columns of a lazy store not decoded yet
+        if ("_loader" not in self.__dict__) or (name not in self.LAZY_COLUMNS):
+            raise AttributeError(name)
+        self._decode_columns()
+        return getattr(self, name)
+
+    def __getstate__(self):
+        # decode the columns of a lazy store before pickling it
+        if "_loader" in self.__dict__:
+            self._decode_columns()
+        return self.__dict__
+
+    @property
+    def text(self):
+        """
+        The text buffer, that is, the concatenation
+        of the strings of all the tokens.
+        """
+        if len(self._pieces) > 0:
+            self._text = u"".join([self._text] + self._pieces)
+            self._pieces = []
+        return self._text
+
+    def _tag_code(self, tag):
+        code = self.tag_index.get(tag)
+        if code is None:
+            code = len(self.tags)
+            self.tags.append(intern_tag(tag))
+            self.tag_index[tag] = code
+            if (code > 255) and (self.tag_codes.typecode == "B"):
+                self.tag_codes = array("H", self.tag_codes)
+        return code
+
+    def append(self, token):
+        """
+        Append the given token.
+        """
+        index = len(self.flags)
+        self._pieces.append(token.raw)
+        self.offsets.append(self.offsets[-1] + len(token.raw))
+        self.tag_codes.append(self._tag_code(token.upos_tag))
+        self.flags.append(
+            (self.FLAG_TRAILING_WHITESPACE if token.trailing_whitespace else 0) |
+            (self.FLAG_SPECIAL if token.is_special else 0)
+        )
+        if token.lemma is not None:
+            self.lemmas[index] = token.lemma
+        if token.chunk_tag is not None:
+            self.chunk_tags[index] = token.chunk_tag
+        if token.pnp_tag is not None:
+            self.pnp_tags[index] = token.pnp_tag
+
+    def extend(self, tokens):
+        """
+        Append the given tokens.
+        """
+        for token in tokens:
+            self.append(token)
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __iter__(self):
+        for index in range(len(self.flags)):
+            yield self.token(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return StoredTokens(self, array("i", range(*key.indices(len(self.flags)))))
+        if key < 0:
+            key += len(self.flags)
+        if (key < 0) or (key >= len(self.flags)):
+            raise IndexError(u"Token index out of range")
+        return self.token(key)
+
+    def token(self, index):
+        """
+        Return the token with the given index.
+        """
+        if self.flags[index] & self.FLAG_SPECIAL:
+            return self.SPECIAL_TOKENS[self.tags[self.tag_codes[index]]]()
+        return StoredToken(self, index)
+
+    def raw(self, index):
+        """
+        Return the string of the token with the given index.
+        """
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def length(self, index):
+        """
+        Return the length of the string of the token with the given index.
+        """
+        return self.offsets[index + 1] - self.offsets[index]
+
+    def upos_tag(self, index):
+        """
+        Return the UPOS tag of the token with the given index.
+        """
+        return self.tags[self.tag_codes[index]]
+
+    def trailing_whitespace(self, index):
+        """
+        Return ``True`` if the token with the given index
+        has a trailing whitespace.
+        """
+        return (self.flags[index] & self.FLAG_TRAILING_WHITESPACE) > 0
+
+    def is_special(self, index):
+        """
+        Return ``True`` if the token with the given index is special.
+        """
+        return (self.flags[index] & self.FLAG_SPECIAL) > 0
+
+    def set_upos_tag(self, index, tag):
+        """
+        Set the UPOS tag of the token with the given index.
+        """
+        self.tag_codes[index] = self._tag_code(tag)
+
+    def set_trailing_whitespace(self, index, value):
+        """
+        Set the trailing whitespace flag of the token with the given index.
+        """
+        if value:
+            self.flags[index] |= self.FLAG_TRAILING_WHITESPACE
+        else:
+            self.flags[index] &= ~self.FLAG_TRAILING_WHITESPACE & 0xFF
+
+
+class StoredToken(Token):
+    """
+    A regular token of a ``TokenStore``,
+    reading and writing its attributes from the columns of the store.
+
+    NOTE: the string of a stored token cannot be changed.
+          A stored token is pickled as a ``Token``,
+          with a copy of its attributes.
+    """
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def __reduce__(self):
+        return (Token, (self.raw, self.upos_tag, self.chunk_tag, self.pnp_tag, self.lemma, self.trailing_whitespace))
+
+    @property
+    def raw(self):
+        return self.store.raw(self.index)
+
+    @property
+    def upos_tag(self):
+        return self.store.upos_tag(self.index)
+
+    @upos_tag.setter
+    def upos_tag(self, value):
+        self.store.set_upos_tag(self.index, value)
+
+    @property
+    def trailing_whitespace(self):
+        return self.store.trailing_whitespace(self.index)
+
+    @trailing_whitespace.setter
+    def trailing_whitespace(self, value):
+        self.store.set_trailing_whitespace(self.index, value)
+
+    @property
+    def lemma(self):
+        return self.store.lemmas.get(self.index)
+
+    @lemma.setter
+    def lemma(self, value):
+        _set_sparse(self.store.lemmas, self.index, value)
+
+    @property
+    def chunk_tag(self):
+        return self.store.chunk_tags.get(self.index)
+
+    @chunk_tag.setter
+    def chunk_tag(self, value):
+        _set_sparse(self.store.chunk_tags, self.index, intern_tag(value))
+
+    @property
+    def pnp_tag(self):
+        return self.store.pnp_tags.get(self.index)
+
+    @pnp_tag.setter
+    def pnp_tag(self, value):
+        _set_sparse(self.store.pnp_tags, self.index, intern_tag(value))
+
+
+def _set_sparse(values, index, value):
+    if value is None:
+        values.pop(index, None)
+    else:
+        values[index] = value
+
+
+class StoredTokens(object):
+    """
+    A sequence of tokens of a ``TokenStore``,
+    given by their indices in the store,
+    which materializes a token only when it is accessed.
+
+    Slicing it returns another ``StoredTokens`` object,
+    and its columns can be read without materializing any token
+    (see ``lengths()``, ``trailing_whitespaces()`` and ``columns()``).
+    It is pickled as a list of ``Token`` objects.
+    """
+
+    __slots__ = ("store", "indices")
+
+    def __init__(self, store, indices):
+        self.store = store
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        token = self.store.token
+        for index in self.indices:
+            yield token(index)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return StoredTokens(self.store, self.indices[key])
+        return self.store.token(self.indices[key])
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+    def take(self, positions):
+        """
+        Return the tokens at the given positions of this sequence.
+        """
+        return StoredTokens(self.store, array("i", [self.indices[p] for p in positions]))
+
+    def regular(self):
+        """
+        Return the regular tokens of this sequence.
+        """
+        flags = self.store.flags
+        special = TokenStore.FLAG_SPECIAL
+        return StoredTokens(self.store, array("i", [i for i in self.indices if not (flags[i] & special)]))
+
+    def lengths(self):
+        """
+        Return the list of the lengths of the strings of the tokens.
+        """
+        offsets = self.store.offsets
+        return [offsets[i + 1] - offsets[i] for i in self.indices]
+
+    def trailing_whitespaces(self):
+        """
+        Return the list of the trailing whitespace flags of the tokens.
+        """
+        flags = self.store.flags
+        whitespace = TokenStore.FLAG_TRAILING_WHITESPACE
+        return [(flags[i] & whitespace) > 0 for i in self.indices]
+
+    def columns(self):
+        """
+        Return the ``(words, poses, wses)`` columns of the tokens
+        (see ``lachesis.ml.features.columns_from_tokens()``).
+        """
+        store = self.store
+        text = store.text
+        offsets = store.offsets
+        tags = store.tags
+        tag_codes = store.tag_codes
+        return (
+            [text[offsets[i]:offsets[i + 1]] for i in self.indices],
+            [tags[tag_codes[i]] for i in self.indices],
+            self.trailing_whitespaces(),
+        )
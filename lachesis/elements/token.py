@@ -29,11 +29,34 @@ from lachesis.language import Language
 import lachesis.globalfunctions as gf
 
 
+# the shared instances of the tag strings
+_TAGS = {}
+
+
+def intern_tag(tag):
+    """
+    Return the shared instance of the given tag string,
+    so that all the tokens with the same tag
+    reference the same string object.
+    """
+    if tag is None:
+        return None
+    return _TAGS.setdefault(tag, tag)
+
+
 class Token(object):
     """
     A Token is a word or punctuation in a Document.
+
+    Tokens are slotted objects, as a Document holds many of them,
+    and their tags are interned (see ``intern_tag()``).
     """
 
+    __slots__ = ("raw", "upos_tag", "chunk_tag", "pnp_tag", "lemma", "trailing_whitespace")
+
+    special = False
+    """ Tokens of a subclass of ``SpecialToken`` are special """
+
     def __init__(
         self,
         raw,
@@ -44,12 +67,18 @@ class Token(object):
         trailing_whitespace=False
     ):
         self.raw = raw
-        self.upos_tag = upos_tag
-        self.chunk_tag = chunk_tag
-        self.pnp_tag = pnp_tag
+        self.upos_tag = intern_tag(upos_tag)
+        self.chunk_tag = intern_tag(chunk_tag)
+        self.pnp_tag = intern_tag(pnp_tag)
         self.lemma = lemma
         self.trailing_whitespace = trailing_whitespace
-        self.special = False
+
+    def __getstate__(self):
+        return (self.raw, self.upos_tag, self.chunk_tag, self.pnp_tag, self.lemma, self.trailing_whitespace)
+
+    def __setstate__(self, state):
+        raw, upos_tag, chunk_tag, pnp_tag, lemma, trailing_whitespace = state
+        self.__init__(raw, upos_tag, chunk_tag, pnp_tag, lemma, trailing_whitespace)
 
     def __str__(self):
         return self.augmented_string
@@ -112,37 +141,75 @@ class Token(object):
         return (u"%s|||%s|||%s" % (self._tagged_tuple)).replace(u"&", u"&amp;")
 
 
-class EndOfSentenceToken(Token):
+class SpecialToken(Token):
+    """
+    A special token, marking a position in a Document
+    (e.g., the end of a line or of a sentence).
 
-    RAW = u"lachesisendofsentencetoken"
-    UPOS_TAG = u"YYY"
+    A special token carries no information besides its class,
+    hence each subclass has a single, immutable instance,
+    returned by every call to its constructor,
+    and kept when copied or pickled.
+    """
+
+    __slots__ = ()
+
+    RAW = None
+    UPOS_TAG = None
+
+    special = True
+
+    def __new__(cls):
+        instance = cls.__dict__.get("_instance")
+        if instance is None:
+            instance = super(SpecialToken, cls).__new__(cls)
+            for name, value in [
+                ("raw", cls.RAW),
+                ("upos_tag", intern_tag(cls.UPOS_TAG)),
+                ("chunk_tag", None),
+                ("pnp_tag", None),
+                ("lemma", None),
+                ("trailing_whitespace", True),
+            ]:
+                object.__setattr__(instance, name, value)
+            cls._instance = instance
+        return instance
 
     def __init__(self):
-        super(EndOfSentenceToken, self).__init__(
-            raw=self.RAW,
-            upos_tag=self.UPOS_TAG
-        )
-        self.trailing_whitespace = True
-        self.special = True
+        # the shared instance is initialized by __new__()
+        pass
 
-    @property
-    def ml_string(self):
-        return u"%s" % (self.upos_tag)
+    def __setattr__(self, name, value):
+        raise AttributeError(u"Special tokens are shared and cannot be modified")
 
+    def __delattr__(self, name):
+        raise AttributeError(u"Special tokens are shared and cannot be modified")
 
-class EndOfLineToken(Token):
+    def __reduce__(self):
+        return (self.__class__, ())
 
-    RAW = u"lachesisendoflinetoken"
-    UPOS_TAG = u"ZZZ"
+    def __copy__(self):
+        return self
 
-    def __init__(self):
-        super(EndOfLineToken, self).__init__(
-            raw=self.RAW,
-            upos_tag=self.UPOS_TAG
-        )
-        self.trailing_whitespace = True
-        self.special = True
+    def __deepcopy__(self, memo):
+        return self
 
     @property
     def ml_string(self):
         return u"%s" % (self.upos_tag)
+
+
+class EndOfSentenceToken(SpecialToken):
+
+    __slots__ = ()
+
+    RAW = u"lachesisendofsentencetoken"
+    UPOS_TAG = u"YYY"
+
+
+class EndOfLineToken(SpecialToken):
+
+    __slots__ = ()
+
+    RAW = u"lachesisendoflinetoken"
+    UPOS_TAG = u"ZZZ"
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+An interning table for the strings (words) of a corpus.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+from array import array
+
+
+class Vocabulary(object):
+    """
+    A table of shared string instances, e.g. the words of a corpus,
+    each with an integer ID (its index in the table).
+
+    Interning the strings of the tokens of many documents
+    with the same vocabulary makes all the tokens with the same string
+    reference the same string object, instead of one object per token.
+    Encoding the strings as IDs (see ``encode()`` and ``decode()``)
+    stores them as arrays of integers.
+
+    A vocabulary is pickled as the list of its strings.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = []
+        self.ids = {}
+        if strings is not None:
+            for string in strings:
+                self.intern(string)
+
+    def __reduce__(self):
+        return (Vocabulary, (self.strings,))
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, string):
+        return string in self.ids
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def string_id(self, string):
+        """
+        Return the ID of the given string,
+        adding it to the vocabulary if needed.
+        """
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(string)
+            self.ids[string] = string_id
+        return string_id
+
+    def intern(self, string):
+        """
+        Return the shared instance of the given string,
+        adding it to the vocabulary if needed.
+        """
+        if string is None:
+            return None
+        return self.strings[self.string_id(string)]
+
+    def intern_all(self, strings):
+        """
+        Return the list of the shared instances of the given strings.
+        """
+        return [self.intern(s) for s in strings]
+
+    def encode(self, strings):
+        """
+        Return the array of the IDs of the given strings.
+        """
+        return array("i", [self.string_id(s) for s in strings])
+
+    def decode(self, string_ids):
+        """
+        Return the list of the shared instances of the strings
+        with the given IDs.
+        """
+        strings = self.strings
+        return [strings[i] for i in string_ids]
@@ -139,6 +139,8 @@ class Language(object):
     def from_code(cls, code):
         if (isinstance(code, LanguageObject)) and (code in cls.ALL_LANGUAGES):
             return code
+        if code is None:
+            return None
         code = gf.to_unicode_string(code)
         for language in cls.ALL_LANGUAGES:
             if language == code:
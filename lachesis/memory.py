@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measure the memory used by this process
+while running a stage of the pipeline
+(see ``Document.memory_report()``).
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import functools
+import os
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    # not available on Python 2
+    tracemalloc = None
+
+
+def max_rss():
+    """
+    Return the maximum resident set size of this process, in bytes,
+    or ``None`` if it cannot be measured on this platform.
+    """
+    if resource is None:
+        return None
+    value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on Mac OS X
+    return value if sys.platform == "darwin" else value * 1024
+
+
+def current_rss():
+    """
+    Return the current resident set size of this process, in bytes,
+    or ``None`` if it cannot be measured on this platform
+    (it is read from ``/proc/self/statm``, available on Linux).
+    """
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class HighWaterMark(object):
+    """
+    A context manager measuring how much the memory of this process
+    grew at most while running its block.
+
+    If ``tracemalloc`` is tracing (e.g., after ``tracemalloc.start()``,
+    on Python 3.9 or later), the peak of the memory allocated
+    by Python during the block is measured (``SOURCE_TRACEMALLOC``).
+    Otherwise, if ``sampling`` is ``True``
+    (by default, ``SAMPLING``, which is ``False``)
+    and the current resident set size of the process
+    can be read (on Linux), it is sampled every ``SAMPLING_INTERVAL``
+    seconds by a thread, and the growth of its maximum is measured
+    (``SOURCE_SAMPLED_RSS``).
+    Otherwise, the growth of the maximum resident set size
+    of the process is measured (``SOURCE_RSS``), which is unknown
+    (``None`` bytes) if it did not grow,
+    since the process might have used more memory before the block.
+    """
+
+    SOURCE_TRACEMALLOC = u"tracemalloc"
+    """ Measured by ``tracemalloc`` """
+
+    SOURCE_SAMPLED_RSS = u"sampled_rss"
+    """ Measured by sampling the current resident set size """
+
+    SOURCE_RSS = u"rss"
+    """ Measured by the maximum resident set size """
+
+    SAMPLING = False
+    """ Whether the current resident set size is sampled, if not specified """
+
+    SAMPLING_INTERVAL = 0.01
+    """ The interval between two samples of the current resident set size, in seconds """
+
+    def __init__(self, sampling=None):
+        self.sampling = self.SAMPLING if sampling is None else sampling
+        self.source = None
+        self.start = None
+        self.peak = None
+        self.sampled = None
+        self.stopped = None
+        self.sampler = None
+
+    def _sample(self):
+        """
+        Sample the current resident set size, until the block ends.
+        """
+        while not self.stopped.wait(self.SAMPLING_INTERVAL):
+            self.sampled = max(self.sampled, current_rss() or 0)
+
+    def __enter__(self):
+        if (
+            (tracemalloc is not None) and
+            (tracemalloc.is_tracing()) and
+            (hasattr(tracemalloc, "reset_peak"))
+        ):
+            self.source = self.SOURCE_TRACEMALLOC
+            tracemalloc.reset_peak()
+            self.start = tracemalloc.get_traced_memory()[0]
+            return self
+        self.start = current_rss() if self.sampling else None
+        if self.start is not None:
+            self.source = self.SOURCE_SAMPLED_RSS
+            self.sampled = self.start
+            self.stopped = threading.Event()
+            self.sampler = threading.Thread(target=self._sample)
+            self.sampler.daemon = True
+            self.sampler.start()
+            return self
+        self.start = max_rss()
+        if self.start is not None:
+            self.source = self.SOURCE_RSS
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.source == self.SOURCE_TRACEMALLOC:
+            self.peak = max(0, tracemalloc.get_traced_memory()[1] - self.start)
+        elif self.source == self.SOURCE_SAMPLED_RSS:
+            self.stopped.set()
+            self.sampler.join()
+            self.peak = max(self.sampled, current_rss() or 0) - self.start
+        elif self.source == self.SOURCE_RSS:
+            growth = max_rss() - self.start
+            self.peak = growth if growth > 0 else None
+
+    @property
+    def mark(self):
+        """
+        The measured high-water mark,
+        as a dict with the ``bytes`` and their ``source``,
+        or ``None`` if it cannot be measured on this platform.
+        The ``bytes`` are ``None`` if they are unknown (see above).
+        """
+        if self.source is None:
+            return None
+        return {u"bytes": self.peak, u"source": self.source}
+
+
+def records_high_water_mark(stage):
+    """
+    Decorate a method taking a Document as its first argument
+    (e.g., ``BaseWrapper.analyze()`` or ``BaseSplitter.split()``),
+    so that the high-water mark of each of its calls
+    (see ``HighWaterMark``) is recorded
+    in the ``high_water_marks`` of the document, with the given ``stage`` key.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, document, *args, **kwargs):
+            with HighWaterMark() as mark:
+                result = function(self, document, *args, **kwargs)
+            document.high_water_marks[stage] = mark.mark
+            return result
+        return wrapper
+    return decorator
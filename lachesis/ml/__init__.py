@@ -25,3 +25,6 @@ trainers and taggers
 
 from lachesis.ml.crf import CRFTrainer
 from lachesis.ml.crf import CRFPredictor
+from lachesis.ml.features import FeatureExtractor
+from lachesis.ml.registry import CRFModelRegistry
+from lachesis.ml.registry import DEFAULT_REGISTRY
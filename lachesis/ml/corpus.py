@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A sharded on-disk format for training corpora,
+which can be written one example at a time
+and read back as a stream or by example index.
+
+A corpus ``DUMP_FILE`` consists of the index file ``DUMP_FILE``
+and the shard files ``DUMP_FILE.00000``, ``DUMP_FILE.00001``, etc.
+Each shard is a sequence of pickled examples,
+and the index stores the shard, offset and length of each of them.
+
+Each example is a ``(columns, labels)`` tuple
+(see ``lachesis.ml.crf.CRFTrainer.load_data()``).
+The words of the examples can be stored as word IDs,
+with the vocabulary mapping them to words stored in the index.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import cPickle as pickle
+import io
+import mmap
+import os
+
+from lachesis.elements import Vocabulary
+from lachesis.ml.features import intern_columns
+import lachesis.globalfunctions as gf
+
+
+class CorpusWriter(object):
+    """
+    Write a sharded corpus, one example at a time,
+    starting a new shard every ``shard_size`` examples.
+
+    The index is written by ``close()``:
+    a corpus is readable only after it has been closed.
+    If the ``with`` block writing a corpus raises an exception,
+    the partial corpus is deleted by ``abort()`` instead.
+
+    If a ``vocabulary`` is given, the words of the examples
+    are stored as their IDs in it, and the vocabulary in the index,
+    making the shards smaller.
+    """
+
+    MAGIC = b"LACHESIS-CORPUS 1\n"
+    """ First bytes of the index file of a corpus """
+
+    SHARD_SIZE = 10000
+    """ Maximum number of examples per shard """
+
+    def __init__(self, dump_file_path, shard_size=SHARD_SIZE, vocabulary=None):
+        self.dump_file_path = dump_file_path
+        self.shard_size = shard_size
+        self.vocabulary = vocabulary
+        self.shards = []
+        self.offsets = []
+        self.shard_file = None
+        self.shard_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _shard_path(self, idx):
+        return u"%s.%05d" % (self.dump_file_path, idx)
+
+    def _open_shard(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+        path = self._shard_path(len(self.shards))
+        self.shards.append(os.path.basename(path))
+        self.shard_file = io.open(path, "wb")
+        self.shard_count = 0
+
+    def write(self, example):
+        """
+        Append the given example to the corpus.
+        """
+        if (self.shard_file is None) or (self.shard_count >= self.shard_size):
+            self._open_shard()
+        if self.vocabulary is not None:
+            (words, poses, wses), labels = example
+            # a list of small integers is pickled more compactly than an array
+            example = ((self.vocabulary.encode(words).tolist(), poses, wses), labels)
+        data = pickle.dumps(example, pickle.HIGHEST_PROTOCOL)
+        self.offsets.append((len(self.shards) - 1, self.shard_file.tell(), len(data)))
+        self.shard_file.write(data)
+        self.shard_count += 1
+
+    def extend(self, examples):
+        """
+        Append the given examples to the corpus.
+        """
+        for example in examples:
+            self.write(example)
+
+    def _close_shard(self):
+        if self.shard_file is not None:
+            self.shard_file.close()
+            self.shard_file = None
+
+    def _delete_shards(self, idx):
+        while os.path.isfile(self._shard_path(idx)):
+            gf.delete_file(None, self._shard_path(idx))
+            idx += 1
+
+    def abort(self):
+        """
+        Close the current shard and delete the partial corpus,
+        without writing the index,
+        including the index of a corpus previously written to the same path,
+        so that it cannot be read by a ``CorpusReader``.
+        """
+        self._close_shard()
+        if os.path.isfile(self.dump_file_path):
+            gf.delete_file(None, self.dump_file_path)
+        self._delete_shards(0)
+
+    def close(self):
+        """
+        Close the current shard and write the index,
+        deleting the shards left by a larger corpus
+        previously written to the same path.
+        """
+        self._close_shard()
+        self._delete_shards(len(self.shards))
+        index = {u"shards": self.shards, u"offsets": self.offsets}
+        if self.vocabulary is not None:
+            index[u"vocabulary"] = self.vocabulary.strings
+        with io.open(self.dump_file_path, "wb") as index_file:
+            index_file.write(self.MAGIC)
+            pickle.dump(index, index_file, pickle.HIGHEST_PROTOCOL)
+
+
+class CorpusReader(object):
+    """
+    Read a sharded corpus written by ``CorpusWriter``.
+
+    Iterating over the reader streams the examples
+    one shard at a time, holding a single example in memory,
+    while indexing it reads the single example
+    from the memory-mapped shard.
+
+    The words of the examples read are interned
+    with the ``vocabulary`` of the reader
+    (the one stored in the index, if any),
+    so that the examples kept in memory share them.
+    """
+
+    def __init__(self, dump_file_path):
+        self.dump_file_path = dump_file_path
+        with io.open(dump_file_path, "rb") as index_file:
+            if index_file.read(len(CorpusWriter.MAGIC)) != CorpusWriter.MAGIC:
+                raise ValueError(u"File '%s' is not a corpus index" % dump_file_path)
+            index = pickle.load(index_file)
+        directory = os.path.dirname(dump_file_path)
+        self.shards = [os.path.join(directory, name) for name in index[u"shards"]]
+        self.offsets = index[u"offsets"]
+        self.word_ids = u"vocabulary" in index
+        self.vocabulary = Vocabulary(index.get(u"vocabulary"))
+        self.maps = {}
+
+    @classmethod
+    def is_corpus(cls, dump_file_path):
+        """
+        Return ``True`` if the given file is the index of a sharded corpus.
+        """
+        with io.open(dump_file_path, "rb") as index_file:
+            return index_file.read(len(CorpusWriter.MAGIC)) == CorpusWriter.MAGIC
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        counts = [0] * len(self.shards)
+        for shard, offset, length in self.offsets:
+            counts[shard] += 1
+        for path, count in zip(self.shards, counts):
+            with io.open(path, "rb") as shard_file:
+                for i in range(count):
+                    yield self._intern(pickle.load(shard_file))
+
+    def __getitem__(self, idx):
+        shard, offset, length = self.offsets[idx]
+        if shard not in self.maps:
+            with io.open(self.shards[shard], "rb") as shard_file:
+                self.maps[shard] = mmap.mmap(shard_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._intern(pickle.loads(self.maps[shard][offset:(offset + length)]))
+
+    def _intern(self, example):
+        columns, labels = example
+        return (intern_columns(columns, self.vocabulary, word_ids=self.word_ids), labels)
+
+    def close(self):
+        """
+        Release the memory-mapped shards.
+        """
+        for m in self.maps.values():
+            m.close()
+        self.maps = {}
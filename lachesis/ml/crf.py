@@ -26,13 +26,27 @@ from __future__ import absolute_import
 from __future__ import print_function
 import cPickle as pickle
 import io
+import json
+import multiprocessing
 import os
 import pycrfsuite
 import sys
+import threading
+import time
 
 from lachesis.downloaders import Downloader
 from lachesis.elements import Span
+from lachesis.elements import StoredTokens
+from lachesis.elements import Vocabulary
 from lachesis.language import Language
+from lachesis.ml.corpus import CorpusReader
+from lachesis.ml.corpus import CorpusWriter
+from lachesis.ml.features import columns_from_features
+from lachesis.ml.features import columns_from_tokens
+from lachesis.ml.features import FeatureExtractor
+from lachesis.ml.features import intern_columns
+from lachesis.ml.lattice import CRFLattice
+from lachesis.nlpwrappers import AnalysisCache
 from lachesis.nlpwrappers import NLPEngine
 import lachesis.globalfunctions as gf
 
@@ -43,12 +57,19 @@ ANSI_WARNING = u"\033[93m"
 ANSI_END = u"\033[0m"
 
 
-def tokens_to_features(tokens, forward=5, max_chars_per_line=42, debug=False):
+def tokens_to_features(tokens, forward=5, max_chars_per_line=42, debug=False, vocabulary=None):
     """
     Convert a sequence of tokens into a sequence of features,
     that is, a list of dicts, each dict containing
     the features associated to the corresponding token
     in the input sequence.
+
+    If a ``vocabulary`` is given, the ``word`` features
+    are interned with it.
+
+    NOTE: this is the reference implementation of the features
+          computed by ``FeatureExtractor``, which is what
+          ``CRFTrainer`` and ``CRFPredictor`` actually use.
     """
     feature_sequence = []
 
@@ -63,12 +84,10 @@ def tokens_to_features(tokens, forward=5, max_chars_per_line=42, debug=False):
             })
         return feature_sequence
 
-    # raw string of the word
-    words = [t.raw for t in tokens]
-    # POS of the word
-    poses = [t.upos_tag for t in tokens]
-    # bool, True if word has trailing whitespace
-    wses = [t.trailing_whitespace for t in tokens]
+    # raw string of the word, POS of the word,
+    # and bool, True if word has trailing whitespace
+    # (read from the columns of the token store, if possible)
+    words, poses, wses = columns_from_tokens(tokens, vocabulary)
 
     n = len(tokens)
     # length of the word, including trailing space, if present
@@ -127,6 +146,9 @@ class CRFTrainer(object):
     }
     """ Parameters for the trainer from pycrfsuite """
 
+    ALGORITHM = u"lbfgs"
+    """ Training algorithm of pycrfsuite """
+
     VERBOSE = False
     """ Verbosity of the trainer """
 
@@ -142,18 +164,42 @@ class CRFTrainer(object):
         nlpwrapper=u"pattern",
         downloader=u"youtube",
         parameters=PARAMETERS,
-        verbose=VERBOSE
+        verbose=VERBOSE,
+        extractor=None,
+        algorithm=ALGORITHM,
+        analysis_cache=None
     ):
         self.language = language
         self.nlpwrapper = nlpwrapper
         self.downloader = downloader
         self.parameters = parameters
         self.verbose = verbose
-        self.nlpe = NLPEngine(preload=[(self.language, self.nlpwrapper)])
+        self.extractor = FeatureExtractor() if extractor is None else extractor
+        self.algorithm = algorithm
+        self.analysis_cache = analysis_cache
+        self._nlpe = None
         self.train_data = None
+        # interns the words of all the examples
+        self.vocabulary = Vocabulary()
         self.trainer = None
+        self.read_failures = []
+        self.read_time = 0.0
+
+    @property
+    def nlpe(self):
+        """
+        The NLP engine used to analyze the TTML files,
+        loaded only if some file needs to be parsed.
+        """
+        if self._nlpe is None:
+            self._nlpe = NLPEngine(preload=[(self.language, self.nlpwrapper)], vocabulary=self.vocabulary, analysis_cache=self.analysis_cache)
+        return self._nlpe
 
-    def _read_files(self, input_file_paths):
+    def _read_file(self, input_file_path):
+        """
+        Parse the given TTML file, run the NLP analysis on it,
+        and return the list of examples (CC lines) it contains.
+        """
         def _annotated_sentence_to_lines(tokens):
             lines = []
             cl = []
@@ -169,60 +215,176 @@ class CRFTrainer(object):
             return lines
 
         examples = []
-        for ifp in input_file_paths:
-            print(u".")
-            if os.path.isfile(ifp):
-                doc = Downloader.read_closed_captions(ifp, {u"downloader": u"youtube"})
-                self.nlpe.analyze(doc, wrapper=self.nlpwrapper)
-                for sentence in doc.sentences:
-                    # print(sentence.string(eol=u"|", eos=u"").strip())
-                    # sentence is a Span object
-                    # sentence.elements is a list of Token objects
-                    lines = _annotated_sentence_to_lines(sentence.elements)
-                    for line in lines:
-                        # all tokens get "add" label,
-                        # except the last one, which gets the "end" label
-                        labels = [self.LABEL_NOT_LAST] * len(line)
-                        labels[-1] = self.LABEL_LAST
-                        # convert the list of
-                        features = tokens_to_features(line)
-                        example = (features, labels)
-                        # print(example)
-                        examples.append(example)
+        doc = Downloader.read_closed_captions(input_file_path, {u"downloader": u"youtube"})
+        self.nlpe.analyze(doc, wrapper=self.nlpwrapper)
+        for sentence in doc.sentences:
+            # print(sentence.string(eol=u"|", eos=u"").strip())
+            # sentence is a Span object
+            # sentence.elements is a list of Token objects
+            lines = _annotated_sentence_to_lines(sentence.elements)
+            for line in lines:
+                # all tokens get "add" label,
+                # except the last one, which gets the "end" label
+                labels = [self.LABEL_NOT_LAST] * len(line)
+                labels[-1] = self.LABEL_LAST
+                # store the (words, poses, wses) columns of the line,
+                # the features are computed when training
+                example = (columns_from_tokens(line), labels)
+                # print(example)
+                examples.append(example)
         return examples
 
-    def load_data(self, obj):
+    def _read_file_timed(self, input_file_path):
+        """
+        As ``_read_file()``, but return a
+        ``(input_file_path, examples, elapsed, error)`` tuple,
+        where ``error`` is ``None`` if the file was read successfully.
+        """
+        start = time.time()
+        examples = []
+        error = None
+        try:
+            if not os.path.isfile(input_file_path):
+                raise IOError(u"File does not exist")
+            examples = self._read_file(input_file_path)
+        except Exception as exc:
+            error = u"%s: %s" % (type(exc).__name__, exc)
+        return (input_file_path, examples, time.time() - start, error)
+
+    def _iter_files(self, input_file_paths, jobs=1):
+        """
+        Parse the given TTML files, yielding the examples of each file,
+        in the order of ``input_file_paths``.
+        Files which cannot be parsed are skipped
+        and listed in ``self.read_failures``.
+        """
+        self.read_failures = []
+        self.read_time = 0.0
+        n = len(input_file_paths)
+        if (jobs > 1) and (n > 1):
+            # each worker process loads its own NLP engine,
+            # and imap() returns the results in input order
+            pool = multiprocessing.Pool(
+                processes=min(jobs, n),
+                initializer=_init_reader,
+                initargs=(self.language, self.nlpwrapper, self.downloader, self.analysis_cache)
+            )
+            results = pool.imap(_read_file_worker, input_file_paths)
+        else:
+            pool = None
+            results = (self._read_file_timed(ifp) for ifp in input_file_paths)
+        try:
+            for idx, result in enumerate(results, start=1):
+                self._report_file(idx, n, result)
+                ifp, examples, elapsed, error = result
+                self.read_time += elapsed
+                if pool is not None:
+                    # share the words with the examples of the other files
+                    examples = [(intern_columns(columns, self.vocabulary), labels) for columns, labels in examples]
+                if error is not None:
+                    self.read_failures.append((ifp, error))
+                yield examples
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def _read_files(self, input_file_paths, jobs=1):
+        examples = []
+        for file_examples in self._iter_files(input_file_paths, jobs=jobs):
+            examples.extend(file_examples)
+        return examples
+
+    def _report_file(self, idx, n, result):
+        ifp, examples, elapsed, error = result
+        if error is None:
+            print(u"[%d/%d] %s: %d examples (%.3f s)" % (idx, n, ifp, len(examples), elapsed))
+        else:
+            print(u"[%d/%d] %s: failed (%.3f s): %s" % (idx, n, ifp, elapsed, error))
+
+    def load_data(self, obj, jobs=1):
         """
         TBW
+
+        Each example is a ``(columns, labels)`` tuple,
+        where ``columns`` are the ``(words, poses, wses)``
+        columns of the tokens of a CC line.
+        The words of all the examples are interned
+        with the ``vocabulary`` of the trainer
+        (or of the corpus, if streamed from a sharded corpus).
+        If the trainer has an ``analysis_cache``
+        (see ``lachesis.nlpwrappers.AnalysisCache``),
+        the NLP analysis of the files analyzed before is read from it.
+
+        If ``obj`` is a list of TTML files and ``jobs`` is greater than one,
+        the files are parsed by a pool of ``jobs`` processes,
+        each with its own NLP engine.
+        The examples are in the same order as with a single process.
+        Files which cannot be parsed are skipped
+        and listed in ``self.read_failures``.
         """
         if isinstance(obj, list):
             # parse the given list of files
             input_file_paths = obj
-            self.train_data = self._read_files(input_file_paths)
+            self.train_data = self._read_files(input_file_paths, jobs=jobs)
+        elif CorpusReader.is_corpus(obj):
+            # stream the examples from the sharded corpus
+            self.train_data = CorpusReader(obj)
         else:
             # try loading from pickle
             input_file_path = obj
             self.train_data = pickle.load(io.open(input_file_path, "rb"))
+            # convert dumps storing the feature dicts
+            self.train_data = [
+                (columns_from_features(data), labels) if isinstance(data, list) else (data, labels)
+                for data, labels in self.train_data
+            ]
 
-    def dump_data(self, dump_file_path):
+    def dump_data(self, dump_file_path, word_ids=False):
         """
-        TBW
+        Write the loaded examples to the given sharded corpus
+        (see ``lachesis.ml.corpus``).
+
+        If ``word_ids`` is ``True``, the words are stored
+        as their IDs in the vocabulary of the trainer.
+        """
+        with CorpusWriter(dump_file_path, vocabulary=(self.vocabulary if word_ids else None)) as writer:
+            writer.extend(self.train_data)
+
+    def dump_files(self, input_file_paths, dump_file_path, jobs=1, word_ids=False):
         """
-        pickle.dump(self.train_data, io.open(dump_file_path, "wb"))
+        Parse the given TTML files (see ``load_data()``)
+        and write their examples to the given sharded corpus
+        as soon as each file is parsed,
+        without holding the whole corpus in memory.
+
+        If ``word_ids`` is ``True``, the words are stored
+        as their IDs in the vocabulary of the trainer.
+
+        Return the number of examples written.
+        """
+        with CorpusWriter(dump_file_path, vocabulary=(self.vocabulary if word_ids else None)) as writer:
+            for examples in self._iter_files(input_file_paths, jobs=jobs):
+                writer.extend(examples)
+        return len(writer)
 
     def train(self, model_file_path):
         """
         TBW
         """
         # create a trainer object
-        self.trainer = pycrfsuite.Trainer(verbose=self.verbose)
+        self.trainer = pycrfsuite.Trainer(algorithm=self.algorithm, params=self.parameters, verbose=self.verbose)
 
         # append training data
-        for feature_seq, label_seq in self.train_data:
-            self.trainer.append(feature_seq, label_seq)
+        # (train_data might be a CorpusReader streaming the examples)
+        for columns, label_seq in self.train_data:
+            self.trainer.append(self.extractor.item_sequence(columns), label_seq)
 
         # do the actual training
         self.trainer.train(model_file_path)
+        self.extractor.write_fingerprint(model_file_path)
 
         # return the path to the model file
         return model_file_path
@@ -233,15 +395,49 @@ class CRFTrainer(object):
         return self.trainer.info()
 
 
+# the trainer of the current worker process,
+# used only to parse files in parallel
+_READER = None
+
+
+def _init_reader(language, nlpwrapper, downloader, analysis_cache):
+    global _READER
+    _READER = CRFTrainer(language=language, nlpwrapper=nlpwrapper, downloader=downloader, analysis_cache=analysis_cache)
+    # load the NLP engine before the first file is timed
+    _READER.nlpe
+
+
+def _read_file_worker(input_file_path):
+    return _READER._read_file_timed(input_file_path)
+
+
 class CRFPredictor(object):
     """
     TBW
     """
 
-    def __init__(self, model_file_path):
+    def __init__(self, model_file_path, extractor=None):
         self.model_file_path = model_file_path
+        self.extractor = FeatureExtractor() if extractor is None else extractor
+        self.extractor.check_fingerprint(self.model_file_path)
         self.tagger = pycrfsuite.Tagger()
         self.tagger.open(self.model_file_path)
+        # NOTE: the tagger keeps the last tagged sequence as internal state,
+        #       hence tag() and probability() must not be interleaved
+        #       when the predictor is shared among threads
+        self.lock = threading.Lock()
+        self._lattice = None
+
+    @property
+    def lattice(self):
+        """
+        The ``CRFLattice`` with the weights of the model,
+        built on first access.
+        """
+        with self.lock:
+            if self._lattice is None:
+                self._lattice = CRFLattice(self.tagger)
+        return self._lattice
 
     @property
     def info(self):
@@ -257,30 +453,66 @@ class CRFPredictor(object):
         TBW
         """
         features = None
-        if isinstance(obj, list):
+        if isinstance(obj, (list, pycrfsuite.ItemSequence)):
             features = obj
         elif isinstance(obj, Span):
-            sentence = obj
-            tokens = [token for token in sentence.elements if token.is_regular]
-            features = tokens_to_features(tokens)
+            tokens = _regular_tokens(obj)
+            features = self.extractor.item_sequence(columns_from_tokens(tokens))
         else:
-            raise TypeError(u"The obj should be either a Span (sentence) object or a list of features (dict) objects.")
-        predicted_labels = self.tagger.tag(features)
-        probability = self.tagger.probability(predicted_labels)
+            raise TypeError(u"The obj should be either a Span (sentence) object or a list of features (dict) objects or an ItemSequence.")
+        with self.lock:
+            predicted_labels = self.tagger.tag(features)
+            probability = self.tagger.probability(predicted_labels)
         return predicted_labels, probability
 
+    def marginals(self, obj, label):
+        """
+        Return the list of the marginal probabilities
+        of the given label at each token of ``obj``,
+        which is either a Span (sentence) object
+        or a list of features (dict) objects or an ItemSequence.
+        """
+        if isinstance(obj, (list, pycrfsuite.ItemSequence)):
+            features = obj
+        elif isinstance(obj, Span):
+            tokens = _regular_tokens(obj)
+            features = self.extractor.item_sequence(columns_from_tokens(tokens))
+        else:
+            raise TypeError(u"The obj should be either a Span (sentence) object or a list of features (dict) objects or an ItemSequence.")
+        with self.lock:
+            self.tagger.set(features)
+            return [self.tagger.marginal(label, i) for i in range(len(features))]
+
+
+def _regular_tokens(span):
+    elements = span.elements
+    if isinstance(elements, StoredTokens):
+        return elements.regular()
+    return [token for token in elements if token.is_regular]
+
 
 def usage(exit_code):
     """ Print usage and exit. """
     print(u"")
     print(u"Usage:")
-    print(u"  $ python -m lachesis.ml.crf dump  LANGUAGE INPUT_DIR DUMP_FILE  [--small]")
+    print(u"  $ python -m lachesis.ml.crf dump  LANGUAGE INPUT_DIR DUMP_FILE  [--small] [--jobs N] [--word-ids] [--cache FILE]")
     print(u"  $ python -m lachesis.ml.crf train LANGUAGE DUMP_FILE MODEL_FILE")
-    print(u"  $ python -m lachesis.ml.crf test  LANGUAGE DUMP_FILE MODEL_FILE [--single]")
+    print(u"  $ python -m lachesis.ml.crf test  LANGUAGE DUMP_FILE MODEL_FILE [--single] [--jobs N] [--output FILE]")
+    print(u"  $ python -m lachesis.ml.crf sweep LANGUAGE DUMP_FILE GRID_FILE  [--folds K] [--jobs N] [--output FILE] [--min-accuracy A]")
     print(u"")
     print(u"Options:")
-    print(u"  --single : DUMP_FILE is a path to a single TTML file, not to a DUMP file created with dump")
-    print(u"  --small  : only use first 10 TTML files from INPUT_DIR instead of all")
+    print(u"  --cache FILE     : read and store the NLP analysis of the TTML files in the analysis cache FILE (dump)")
+    print(u"  --folds K        : cross-validate each configuration of GRID_FILE on K folds (default: 3)")
+    print(u"  --jobs N         : parse the TTML files (dump), evaluate the model (test) or the configurations (sweep) with N processes (default: 1)")
+    print(u"  --min-accuracy A : report the fastest configuration with mean accuracy at least A (sweep)")
+    print(u"  --output FILE    : write the prediction chosen for each CC line (test) or the results of each configuration (sweep) to FILE")
+    print(u"  --single         : DUMP_FILE is a path to a single TTML file, not to a DUMP file created with dump")
+    print(u"  --small          : only use first 10 TTML files from INPUT_DIR instead of all")
+    print(u"  --word-ids       : store the words as IDs in a vocabulary, making the DUMP file smaller (dump)")
+    print(u"")
+    print(u"GRID_FILE is a JSON file mapping parameter names to lists of values, for example:")
+    print(u"  {\"algorithm\": [\"lbfgs\"], \"c1\": [0.0, 0.1], \"c2\": [0.01, 1.0], \"max_iterations\": [50, 100], \"forward\": [3, 5]}")
+    print(u"where forward and max_chars_per_line configure the features, and the others pycrfsuite.")
     print(u"")
     sys.exit(exit_code)
 
@@ -310,9 +542,42 @@ def main():
             usage(1)
         return obj
 
-    def command_dump(language, input_directory_path, dump_file_path, small):
+    def check_jobs(obj):
+        """ Check that the given string is a positive number of processes. """
+        try:
+            jobs = int(obj)
+        except (TypeError, ValueError):
+            jobs = 0
+        if jobs < 1:
+            print(u"[ERRO] The number of jobs must be a positive integer, not '%s'" % obj)
+            usage(1)
+        return jobs
+
+    def check_folds(obj):
+        """ Check that the given string is a number of folds, at least 2. """
+        try:
+            folds = int(obj)
+        except (TypeError, ValueError):
+            folds = 0
+        if folds < 2:
+            print(u"[ERRO] The number of folds must be an integer greater than 1, not '%s'" % obj)
+            usage(1)
+        return folds
+
+    def check_accuracy(obj):
+        """ Check that the given string is an accuracy between 0 and 1. """
+        try:
+            accuracy = float(obj)
+        except (TypeError, ValueError):
+            accuracy = -1.0
+        if (accuracy < 0.0) or (accuracy > 1.0):
+            print(u"[ERRO] The accuracy must be a number between 0 and 1, not '%s'" % obj)
+            usage(1)
+        return accuracy
+
+    def command_dump(language, input_directory_path, dump_file_path, small, jobs, word_ids, cache_file_path):
         """
-        Create a cPickle dump with the features and labels
+        Create a sharded corpus with the tokens and labels
         from the TTML files contained in the given input directory.
         """
         input_files = []
@@ -323,16 +588,22 @@ def main():
         if small:
             input_files = input_files[:10]
 
-        trainer = CRFTrainer(language=language)
-
-        print(u"Parsing data...")
-        trainer.load_data(input_files)
-        print(u"Parsing data...done")
-
-        print(u"Dumping data...")
-        trainer.dump_data(dump_file_path)
-        print(u"Dumping data... done")
-        print(u"Dumped %d examples to: '%s'" % (len(trainer.train_data), dump_file_path))
+        analysis_cache = None if cache_file_path is None else AnalysisCache(cache_file_path)
+        trainer = CRFTrainer(language=language, analysis_cache=analysis_cache)
+
+        print(u"Parsing and dumping data...")
+        start = time.time()
+        count = trainer.dump_files(input_files, dump_file_path, jobs=jobs, word_ids=word_ids)
+        print(u"Parsing and dumping data... done")
+        print(u"Parsed %d files in %.3f s (%.3f s of processing, %d jobs)" % (len(input_files), time.time() - start, trainer.read_time, jobs))
+        if len(trainer.read_failures) > 0:
+            print(u"[WARN] %d files could not be parsed:" % len(trainer.read_failures))
+            for ifp, error in trainer.read_failures:
+                print(u"[WARN]   %s: %s" % (ifp, error))
+        print(u"Dumped %d examples to: '%s'" % (count, dump_file_path))
+        if analysis_cache is not None:
+            stats = analysis_cache.stats
+            print(u"Analysis cache: %d entries, %d bytes (hit rate of this process: %.3f)" % (stats["entries"], stats["size"], stats["hit_rate"]))
 
     def command_train(language, dump_file_path, model_file_path):
         """
@@ -349,7 +620,7 @@ def main():
         print(u"Training... done")
         print(u"Built model '%s'" % model_file_path)
 
-    def command_test(language, dump_file_path, model_file_path, single):
+    def command_test(language, dump_file_path, model_file_path, single, jobs, output_file_path):
         """
         Test a CRF model against the given dump file
         containing both features and labels.
@@ -357,46 +628,14 @@ def main():
         The predictions are accounted for using
         the same algorithm powering the actual splitter.
 
+        If ``output_file_path`` is not ``None``,
+        the chosen prediction for each CC line is written to it,
+        one tab-separated line per CC line, as soon as it is available.
+
         TBW
         """
-        def check_prediction(l_predictor, l_subf, l_subl):
-            """
-            Call the tagger and check the prediction
-            against the true value (i.e., the true label).
-            """
-            l_str = (u"".join([u"%s%s" % (f["word"], (u" " if f["ws"] else u"")) for f in l_subf])).strip()
-            l_subl_pred, l_probability = l_predictor.predict(l_subf)
-            l_pred_s = u"".join(l_subl_pred)
-            l_real_s = u"".join(l_subl)
-            return (l_real_s, l_pred_s, l_str, l_probability)
-
-        def evaluate_predictions(all_predictions):
-            """
-            Explore all predictions for each CC line,
-            choosing the prediction as the actual splitter does,
-            and count the number of the splits correctly chosen.
-            """
-            cc_count = 0
-            cc_count_good = 0
-            for cc_prediction in all_predictions:
-                # cc is a tuple: (idx, extension, ext_idx, real_s, pred_s, len(str_s), prob)
-                cc_prediction_sorted = sorted(cc_prediction, key=lambda x: x[6], reverse=True)
-                # for prefix_prediction in cc_prediction_sorted:
-                #     print(prefix_prediction)
-                # print(u"")
-                cc_count += 1
-                chosen = cc_prediction_sorted[0]
-                for pred in cc_prediction_sorted:
-                    if (pred[5] <= 42) and (pred[4][-1] == CRFTrainer.LABEL_LAST):
-                        chosen = pred
-                        break
-                good = (not chosen[1]) and (chosen[3] == chosen[4]) and (chosen[4][-1] == CRFTrainer.LABEL_LAST)
-                if good:
-                    print("%s%s%s" % (ANSI_OK, chosen, ANSI_END))
-                    cc_count_good += 1
-                else:
-                    print("%s%s%s" % (ANSI_ERROR, chosen, ANSI_END))
-            return (cc_count, cc_count_good)
+        # NOTE: imported here, as lachesis.ml.registry imports this module
+        from lachesis.ml.evaluation import CRFEvaluator
 
         print(u"Loading data...")
         trainer = CRFTrainer(language=language, nlpwrapper=u"pattern")
@@ -406,36 +645,80 @@ def main():
         print(u"Loading data... done")
 
         print(u"Testing...")
-        predictor = CRFPredictor(model_file_path)
-        all_predictions = []
-        n = len(examples)
-        for idx in range(n):
-            cc_predictions = []
-            # test prefixes of the current line
-            features, labels = examples[idx]
-            for l in range(len(features)):
-                subf = features[0:(l + 1)]
-                subl = labels[0:(l + 1)]
-                real_s, pred_s, str_s, prob = check_prediction(predictor, subf, subl)
-                cc_predictions.append((idx, False, l, real_s, pred_s, len(str_s), prob))
-
-            # test current line + prefixes of the next line
-            # (if there is a next line)
-            if idx + 1 < n:
-                next_features, next_labels = examples[idx + 1]
-                for l in range(len(next_features)):
-                    subf = features + next_features[0:(l + 1)]
-                    subl = labels + next_labels[0:(l + 1)]
-                    real_s, pred_s, str_s, prob = check_prediction(predictor, subf, subl)
-                    cc_predictions.append((idx, True, l, real_s, pred_s, len(str_s), prob))
-            all_predictions.append(cc_predictions)
+        evaluator = CRFEvaluator(model_file_path)
+        output_file = None
+        if output_file_path is not None:
+            output_file = io.open(output_file_path, "w", encoding="utf-8")
+        cc_count = 0
+        cc_count_good = 0
+        try:
+            for chosen, good in evaluator.evaluate(examples, jobs=jobs):
+                # chosen is a tuple: (idx, extension, ext_idx, real_s, pred_s, len(str_s), prob)
+                cc_count += 1
+                if good:
+                    print("%s%s%s" % (ANSI_OK, chosen, ANSI_END))
+                    cc_count_good += 1
+                else:
+                    print("%s%s%s" % (ANSI_ERROR, chosen, ANSI_END))
+                if output_file is not None:
+                    output_file.write(u"\t".join([u"%s" % v for v in chosen + (good,)]) + u"\n")
+        finally:
+            if output_file is not None:
+                output_file.close()
         print(u"Testing... done")
-
-        print(u"Evaluating...")
-        cc_count, cc_count_good = evaluate_predictions(all_predictions)
-        print(u"Evaluating... done")
         print(u"CC lines segmented correctly: %d/%d (%.3f)" % (cc_count_good, cc_count, float(cc_count_good) / cc_count))
 
+    def command_sweep(language, dump_file_path, grid_file_path, folds, jobs, output_file_path, min_accuracy):
+        """
+        Cross-validate the configurations of the given grid file
+        on the given dump file, and report their accuracy
+        against training time, tagging throughput and model size.
+        """
+        # NOTE: imported here, as lachesis.ml.sweep imports this module
+        from lachesis.ml.sweep import CRFSweep
+
+        with io.open(grid_file_path, "r", encoding="utf-8") as grid_file:
+            grid = json.load(grid_file)
+        sweep = CRFSweep(language, dump_file_path, grid, folds=folds)
+        print(u"Sweeping %d configurations on %d folds..." % (len(sweep.configurations), folds))
+        results = []
+        for result in sweep.run(jobs=jobs):
+            if result[u"error"] is None:
+                print(u"  configuration %d, fold %d: accuracy %.3f, training %.3f s" % (result[u"configuration"], result[u"fold"], result[u"accuracy"], result[u"train_time"]))
+            else:
+                print(u"  configuration %d, fold %d: %sfailed: %s%s" % (result[u"configuration"], result[u"fold"], ANSI_ERROR, result[u"error"], ANSI_END))
+            results.append(result)
+        print(u"Sweeping... done")
+
+        summary = sweep.summarize(results)
+        columns = [
+            (u"configuration", u"%d"),
+            (u"accuracy", u"%.3f"),
+            (u"train_time", u"%.3f"),
+            (u"throughput", u"%.0f"),
+            (u"model_size", u"%.0f"),
+            (u"folds", u"%d"),
+        ]
+        lines = [u"\t".join([k for k, f in columns] + [u"parameters"])]
+        for entry in summary:
+            values = [(f % entry[k]) if entry[k] is not None else u"-" for k, f in columns]
+            lines.append(u"\t".join(values + [json.dumps(entry[u"parameters"], sort_keys=True)]))
+        print(u"")
+        for line in lines:
+            print(line)
+        if output_file_path is not None:
+            with io.open(output_file_path, "w", encoding="utf-8") as output_file:
+                output_file.write(u"\n".join(lines) + u"\n")
+
+        if min_accuracy is not None:
+            good = [e for e in summary if (e[u"accuracy"] is not None) and (e[u"accuracy"] >= min_accuracy)]
+            print(u"")
+            if len(good) > 0:
+                fastest = max(good, key=lambda e: e[u"throughput"])
+                print(u"%sFastest configuration with accuracy >= %.3f: %d %s%s" % (ANSI_OK, min_accuracy, fastest[u"configuration"], json.dumps(fastest[u"parameters"], sort_keys=True), ANSI_END))
+            else:
+                print(u"%sNo configuration has accuracy >= %.3f%s" % (ANSI_WARNING, min_accuracy, ANSI_END))
+
     ##########################################################################
     #
     # main script stats here
@@ -447,8 +730,35 @@ def main():
     command = sys.argv[1]
     small = u"--small" in sys.argv
     single = u"--single" in sys.argv
+    word_ids = u"--word-ids" in sys.argv
+    jobs = 1
+    if u"--jobs" in sys.argv:
+        idx = sys.argv.index(u"--jobs")
+        jobs = check_jobs(sys.argv[idx + 1] if idx + 1 < len(sys.argv) else None)
+    output_file_path = None
+    if u"--output" in sys.argv:
+        idx = sys.argv.index(u"--output")
+        if idx + 1 >= len(sys.argv):
+            print(u"[ERRO] Missing output file path")
+            usage(1)
+        output_file_path = sys.argv[idx + 1]
+    folds = 3
+    if u"--folds" in sys.argv:
+        idx = sys.argv.index(u"--folds")
+        folds = check_folds(sys.argv[idx + 1] if idx + 1 < len(sys.argv) else None)
+    cache_file_path = None
+    if u"--cache" in sys.argv:
+        idx = sys.argv.index(u"--cache")
+        if idx + 1 >= len(sys.argv):
+            print(u"[ERRO] Missing analysis cache file path")
+            usage(1)
+        cache_file_path = sys.argv[idx + 1]
+    min_accuracy = None
+    if u"--min-accuracy" in sys.argv:
+        idx = sys.argv.index(u"--min-accuracy")
+        min_accuracy = check_accuracy(sys.argv[idx + 1] if idx + 1 < len(sys.argv) else None)
 
-    if command not in [u"dump", u"train", u"test"]:
+    if command not in [u"dump", u"train", u"test", u"sweep"]:
         print(u"[ERRO] Unknown command '%s'" % command)
         usage(1)
 
@@ -456,7 +766,7 @@ def main():
         language = check_language(sys.argv[2])
         input_directory_path = check_dir(sys.argv[3])
         dump_file_path = sys.argv[4]
-        command_dump(language, input_directory_path, dump_file_path, small)
+        command_dump(language, input_directory_path, dump_file_path, small, jobs, word_ids, cache_file_path)
 
     if command == u"train":
         language = check_language(sys.argv[2])
@@ -468,7 +778,13 @@ def main():
         language = check_language(sys.argv[2])
         dump_file_path = check_file(sys.argv[3])
         model_file_path = check_file(sys.argv[4])
-        command_test(language, dump_file_path, model_file_path, single)
+        command_test(language, dump_file_path, model_file_path, single, jobs, output_file_path)
+
+    if command == u"sweep":
+        language = check_language(sys.argv[2])
+        dump_file_path = check_file(sys.argv[3])
+        grid_file_path = check_file(sys.argv[4])
+        command_sweep(language, dump_file_path, grid_file_path, folds, jobs, output_file_path, min_accuracy)
 
     sys.exit(0)
 
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Evaluate a CRF model on a corpus of CC lines,
+choosing the split of each line as the splitter does.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import multiprocessing
+
+from lachesis.ml.crf import CRFPredictor
+from lachesis.ml.crf import CRFTrainer
+from lachesis.ml.registry import DEFAULT_REGISTRY
+
+
+class CRFEvaluator(object):
+    """
+    Evaluate a CRF model on the examples of a corpus.
+
+    For each example (CC line), the model is asked to label
+    every prefix of the line and every prefix of the line
+    followed by the next one, and the most probable prefix
+    ending with ``CRFTrainer.LABEL_LAST`` and fitting ``max_chars_per_line``
+    is chosen. The split is correct if the chosen prefix
+    is the line itself, labelled correctly.
+
+    All the prefixes of an example are scored in a single pass
+    over the lattice of the model, and the tagger is called
+    only for the prefixes which might be chosen.
+    The result is the same as calling the tagger on each prefix.
+    """
+
+    def __init__(self, model_file_path, registry=None, extractor=None):
+        self.model_file_path = model_file_path
+        self.registry = DEFAULT_REGISTRY if registry is None else registry
+        if extractor is None:
+            self.predictor = self.registry.get(self.model_file_path)
+        else:
+            # a model trained with non-default features,
+            # not shared through the registry
+            self.predictor = CRFPredictor(self.model_file_path, extractor=extractor)
+        self.extractor = self.predictor.extractor
+        self.lattice = self.predictor.lattice
+        # the last example analyzed, which is usually
+        # the next example to be evaluated
+        self.memo = (None, None)
+
+    def _analyze(self, example):
+        """
+        Return the features, the token strings and the state scores
+        of the tokens of the given example.
+        """
+        if self.memo[0] == example:
+            return self.memo[1]
+        (words, poses, wses), labels = example
+        features = self.extractor.extract((words, poses, wses))
+        strings = [u"%s%s" % (w, (u" " if ws else u"")) for w, ws in zip(words, wses)]
+        scores = [self.lattice.state_scores(f.items()) for f in features]
+        self.memo = (example, (features, strings, scores))
+        return self.memo[1]
+
+    def evaluate_example(self, idx, example, next_example=None):
+        """
+        Evaluate the given example, with index ``idx``,
+        followed by ``next_example`` (``None`` for the last one).
+
+        Return a ``(chosen, good)`` tuple, where ``chosen`` is
+        the ``(idx, extension, ext_idx, real_s, pred_s, length, probability)``
+        tuple of the chosen prefix and ``good`` is ``True``
+        if the line was split correctly.
+        """
+        features, strings, scores = self._analyze(example)
+        labels = example[1]
+        n = len(features)
+        if next_example is not None:
+            next_features, next_strings, next_scores = self._analyze(next_example)
+            features = features + next_features
+            strings = strings + next_strings
+            scores = scores + next_scores
+            labels = labels + next_example[1]
+
+        # NOTE: every candidate is a prefix of features,
+        #       with features computed on the whole line(s)
+        candidates = []
+        state = None
+        for k in range(len(features)):
+            state = self.lattice.extend(state, scores[k][0], scores[k][1])
+            label, log_probability, error = self.lattice.viterbi(state)
+            length = len(u"".join(strings[0:(k + 1)]).strip())
+            candidates.append((k + 1, self.lattice.best_labels(state), log_probability, error, length))
+
+        max_chars = self.extractor.max_chars_per_line
+        sure = [c for c in candidates if (c[4] <= max_chars) and (c[1] == set([CRFTrainer.LABEL_LAST]))]
+        if len(sure) > 0:
+            # the candidates which cannot beat a sure one are never chosen
+            threshold = max([c[2] - c[3] for c in sure])
+            contenders = [c for c in candidates if (c[4] <= max_chars) and (CRFTrainer.LABEL_LAST in c[1]) and (c[2] + c[3] >= threshold)]
+        else:
+            contenders = candidates
+
+        # ask the tagger for the exact labels and probability
+        predictions = []
+        for end, best_labels, log_probability, error, length in contenders:
+            predicted_labels, probability = self.predictor.predict(features[0:end])
+            extension = end > n
+            ext_idx = (end - n - 1) if extension else (end - 1)
+            predictions.append((idx, extension, ext_idx, u"".join(labels[0:end]), u"".join(predicted_labels), length, probability))
+
+        # as in sorted(..., reverse=True), ties keep the prefix order
+        chosen = None
+        for prediction in predictions:
+            if (prediction[5] <= max_chars) and (prediction[4][-1] == CRFTrainer.LABEL_LAST):
+                if (chosen is None) or (prediction[6] > chosen[6]):
+                    chosen = prediction
+        if chosen is None:
+            for prediction in predictions:
+                if (chosen is None) or (prediction[6] > chosen[6]):
+                    chosen = prediction
+        good = (not chosen[1]) and (chosen[3] == chosen[4]) and (chosen[4][-1] == CRFTrainer.LABEL_LAST)
+        return (chosen, good)
+
+    def evaluate(self, examples, jobs=1, chunk_size=16):
+        """
+        Evaluate the given examples, yielding the result
+        of ``evaluate_example()`` for each of them, in order.
+
+        ``examples`` is iterated only once, so it can be a stream.
+        If ``jobs`` is greater than one, the examples are evaluated
+        by a pool of ``jobs`` processes, each opening the model once
+        with the feature extractor of this evaluator.
+        """
+        tasks = _example_pairs(examples)
+        if jobs > 1:
+            pool = multiprocessing.Pool(
+                processes=jobs,
+                initializer=_init_evaluator,
+                initargs=(self.model_file_path, self.registry, self.extractor)
+            )
+            try:
+                for result in pool.imap(_evaluate_worker, tasks, chunk_size):
+                    yield result
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for task in tasks:
+                yield self.evaluate_example(*task)
+
+
+def _example_pairs(examples):
+    previous = None
+    idx = 0
+    for example in examples:
+        if previous is not None:
+            yield (idx, previous, example)
+            idx += 1
+        previous = example
+    if previous is not None:
+        yield (idx, previous, None)
+
+
+# the evaluator of the current worker process
+_EVALUATOR = None
+
+
+def _init_evaluator(model_file_path, registry, extractor):
+    global _EVALUATOR
+    _EVALUATOR = CRFEvaluator(model_file_path, registry=registry, extractor=extractor)
+
+
+def _evaluate_worker(task):
+    return _EVALUATOR.evaluate_example(*task)
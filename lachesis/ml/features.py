@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compile declarative feature templates into a CRF feature extractor.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import hashlib
+import io
+import os
+import pycrfsuite
+
+from lachesis.elements import StoredTokens
+from lachesis.elements.token import intern_tag
+
+
+def columns_from_tokens(tokens, vocabulary=None):
+    """
+    Return the ``(words, poses, wses)`` columns of the given tokens,
+    that is, the data the features are computed from.
+
+    If a ``vocabulary`` is given, the words are interned with it.
+    """
+    if isinstance(tokens, StoredTokens):
+        # read them from the token store
+        columns = tokens.columns()
+    else:
+        columns = (
+            [t.raw for t in tokens],
+            [t.upos_tag for t in tokens],
+            [t.trailing_whitespace for t in tokens],
+        )
+    if vocabulary is not None:
+        columns = (vocabulary.intern_all(columns[0]), columns[1], columns[2])
+    return columns
+
+
+def intern_columns(columns, vocabulary, word_ids=False):
+    """
+    Return the given ``(words, poses, wses)`` columns
+    (e.g., unpickled from a corpus or received from another process)
+    with the words interned with the given vocabulary,
+    or decoded with it if ``word_ids`` is ``True``,
+    and with the POS tags interned.
+    """
+    words, poses, wses = columns
+    if word_ids:
+        words = vocabulary.decode(words)
+    else:
+        words = vocabulary.intern_all(words)
+    return (words, [intern_tag(p) for p in poses], wses)
+
+
+def columns_from_features(features):
+    """
+    Return the ``(words, poses, wses)`` columns of the tokens
+    the given list of feature dicts
+    (as returned by ``tokens_to_features()``) was computed from.
+    """
+    return (
+        [f["word"] for f in features],
+        [f["pos"] for f in features],
+        [f["ws"] for f in features],
+    )
+
+
+class FeatureExtractor(object):
+    """
+    A feature extractor compiled from a list of templates.
+
+    Each template is a ``(name, kind, offset)`` tuple,
+    where ``kind`` is one of ``KINDS``, and ``offset``
+    is the distance of the token the value is read from,
+    or ``FORWARD`` to use the ``forward`` parameter of the extractor.
+    The name of a template with ``FORWARD`` offset
+    is formatted with the actual offset,
+    and a ``posgram`` template expands to the n-grams
+    of length ``1, 2, ..., forward``.
+    Templates reading beyond the end of the sequence
+    get the padding values ``PAD_POS`` and ``PAD_LENGTH``.
+
+    The features of a token are returned as a dict
+    mapping CRFsuite attributes to their values,
+    with string features already flattened
+    (e.g. ``{u"word:Hello": 1}`` for ``{u"word": u"Hello"}``)
+    by ``extract()``, or left to ``pycrfsuite`` to flatten
+    by ``items()`` and ``item_sequence()``.
+    """
+
+    FORWARD = -1
+    """ Placeholder offset for the look-ahead window """
+
+    PAD_POS = u"EOSP"
+    """ POS tag of the (virtual) tokens after the end of the sequence """
+
+    PAD_LENGTH = 1000
+    """ Cumulative length of the (virtual) tokens after the end of the sequence """
+
+    KINDS = {
+        # features of the token alone
+        u"bias": u"token",      # constant 0
+        u"word": u"token",      # string of the token
+        u"ws": u"token",        # True if the token has a trailing whitespace
+        u"len": u"token",       # length of the token, including the trailing whitespace
+        # features of the POS tags on the right of the token
+        u"pos": u"context",     # POS tag of the token at offset
+        u"posgram": u"context", # POS tags from the token to offset, joined by "-"
+        # features of the position of the token in the sequence
+        u"idx": u"line",        # index of the token
+        u"bos": u"line",        # True if the token is the first one
+        u"clen": u"line",       # True if the cumulative length up to offset, w/o the first token, exceeds max_chars_per_line
+        u"alen": u"line",       # True if the cumulative length up to offset exceeds max_chars_per_line
+    }
+
+    TEMPLATES = [
+        (u"bias", u"bias", 0),
+        (u"idx", u"idx", 0),
+        (u"bos", u"bos", 0),
+        (u"word", u"word", 0),
+        (u"pos", u"pos", 0),
+        (u"ws", u"ws", 0),
+        (u"len", u"len", 0),
+        (u"clen", u"clen", 0),
+        (u"alen", u"alen", 0),
+        (u"pos-0+%d", u"posgram", FORWARD),
+        # NOTE: tokens_to_features() only emits the farthest token
+        #       of the look-ahead window, keep it for model compatibility
+        (u"pos+%d", u"pos", FORWARD),
+        (u"clen+%d", u"clen", FORWARD),
+        (u"alen+%d", u"alen", FORWARD),
+    ]
+    """ The templates equivalent to ``tokens_to_features()`` """
+
+    FINGERPRINT_EXTENSION = u".features"
+    """ Extension of the file storing the fingerprint of the extractor a model was trained with """
+
+    def __init__(self, forward=5, max_chars_per_line=42, templates=TEMPLATES):
+        self.forward = forward
+        self.max_chars_per_line = max_chars_per_line
+        self.templates = self._compile(templates)
+        self.groups = {}
+        for template in self.templates:
+            self.groups.setdefault(self.KINDS[template[1]], []).append(template)
+        # number of tokens on the right of a token its features depend on
+        self.reach = 0
+        for name, kind, offset in self.templates:
+            self.reach = max(self.reach, (offset - 1) if kind == u"posgram" else offset)
+        # number of POS tags the context features of a token depend on
+        self.window = self.reach + 1
+
+    def _compile(self, templates):
+        compiled = []
+        for name, kind, offset in templates:
+            if kind not in self.KINDS:
+                raise ValueError(u"Unknown feature kind '%s'" % kind)
+            if offset == self.FORWARD:
+                if kind == u"posgram":
+                    compiled.extend([(name % f, kind, f) for f in range(1, self.forward + 1)])
+                elif self.forward > 0:
+                    compiled.append((name % self.forward, kind, self.forward))
+            else:
+                compiled.append((name, kind, offset))
+        return compiled
+
+    @property
+    def fingerprint(self):
+        """
+        A string identifying the features computed by this extractor:
+        a model can be used only with an extractor
+        with the same fingerprint of the one used to train it.
+        """
+        spec = u"|".join(
+            [u"%s,%s,%d" % t for t in self.templates] +
+            [u"max=%d" % self.max_chars_per_line, u"pad=%s,%d" % (self.PAD_POS, self.PAD_LENGTH)]
+        )
+        return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+    def write_fingerprint(self, model_file_path):
+        """
+        Store the fingerprint of this extractor
+        alongside the given model file.
+        """
+        with io.open(model_file_path + self.FINGERPRINT_EXTENSION, "w", encoding="utf-8") as output_file:
+            output_file.write(u"%s\n" % self.fingerprint)
+
+    def check_fingerprint(self, model_file_path):
+        """
+        Raise ``ValueError`` if the given model file
+        has been trained with an incompatible extractor.
+        Models without a stored fingerprint are assumed compatible.
+        """
+        path = model_file_path + self.FINGERPRINT_EXTENSION
+        if not os.path.isfile(path):
+            return
+        with io.open(path, "r", encoding="utf-8") as input_file:
+            fingerprint = input_file.read().strip()
+        if fingerprint != self.fingerprint:
+            raise ValueError(u"The CRF model '%s' has been trained with different features (fingerprint '%s' instead of '%s')." % (model_file_path, fingerprint, self.fingerprint))
+
+    def _lengths(self, words, wses):
+        lengths = [len(w) + (1 if ws else 0) for w, ws in zip(words, wses)]
+        # cumulative length, including the i-th token
+        alens = []
+        total = 0
+        for l in lengths:
+            total += l
+            alens.append(total)
+        # cumulative length, including the i-th token but excluding the first one
+        clens = [a - lengths[0] for a in alens]
+        return lengths, clens, alens
+
+    def token_attributes(self, word, pos, ws):
+        """
+        Return the list of ``(attribute, value)`` pairs
+        of the features depending on the given token only.
+        """
+        attributes = []
+        for name, kind, offset in self.groups.get(u"token", []):
+            if kind == u"bias":
+                attributes.append((name, 0))
+            elif kind == u"word":
+                attributes.append((name + u":" + word, 1))
+            elif kind == u"ws":
+                attributes.append((name, ws))
+            elif kind == u"len":
+                attributes.append((name, len(word) + (1 if ws else 0)))
+        return attributes
+
+    def context_attributes(self, window):
+        """
+        Return the list of ``(attribute, value)`` pairs
+        of the features depending on the given window
+        of ``self.window`` POS tags, starting with the one of the token.
+        """
+        attributes = []
+        for name, kind, offset in self.groups.get(u"context", []):
+            if kind == u"pos":
+                attributes.append((name + u":" + window[offset], 1))
+            else:
+                attributes.append((name + u":" + u"-".join(window[0:offset]), 1))
+        return attributes
+
+    def line_values(self, idx, clens, alens):
+        """
+        Return the list of the values of the features
+        depending on the position of the token in the sequence,
+        in the order of ``self.groups[u"line"]``,
+        given its index ``idx`` and the (padded) cumulative lengths
+        ``clens`` and ``alens`` of the ``self.window`` tokens starting with it.
+        """
+        max_chars = self.max_chars_per_line
+        values = []
+        for name, kind, offset in self.groups.get(u"line", []):
+            if kind == u"idx":
+                values.append(idx)
+            elif kind == u"bos":
+                values.append(idx == 0)
+            elif kind == u"clen":
+                values.append(clens[offset] > max_chars)
+            else:
+                values.append(alens[offset] > max_chars)
+        return values
+
+    def line_attributes(self, idx, clens, alens):
+        """
+        Return the list of ``(attribute, value)`` pairs
+        of the features depending on the position of the token
+        in the sequence (see ``line_values()``).
+        """
+        names = [name for name, kind, offset in self.groups.get(u"line", [])]
+        return list(zip(names, self.line_values(idx, clens, alens)))
+
+    def _values(self, columns):
+        """
+        Return the ``(names, values, flags)`` of the features
+        of the tokens with the given ``(words, poses, wses)`` columns,
+        where ``values`` holds the list of the values of each template
+        (one per token), and ``flags`` tells whether
+        each template is a string feature.
+        """
+        words, poses, wses = columns
+        n = len(words)
+        max_chars = self.max_chars_per_line
+        lengths, clens, alens = self._lengths(words, wses)
+        pad = self.reach
+        padded_poses = list(poses) + [self.PAD_POS] * pad
+        padded_clens = clens + [self.PAD_LENGTH] * pad
+        padded_alens = alens + [self.PAD_LENGTH] * pad
+
+        names = []
+        values = []
+        flags = []
+        posgrams = [None]
+        for name, kind, offset in self.templates:
+            names.append(name)
+            flags.append(kind in (u"word", u"pos", u"posgram"))
+            if kind == u"bias":
+                values.append([0] * n)
+            elif kind == u"word":
+                values.append(words)
+            elif kind == u"ws":
+                values.append(wses)
+            elif kind == u"len":
+                values.append(lengths)
+            elif kind == u"pos":
+                values.append(padded_poses[offset:(offset + n)])
+            elif kind == u"posgram":
+                # grow the n-grams one tag at a time
+                while len(posgrams) <= offset:
+                    f = len(posgrams)
+                    if f == 1:
+                        posgrams.append(padded_poses[0:n])
+                    else:
+                        posgrams.append([g + u"-" + p for g, p in zip(posgrams[f - 1], padded_poses[(f - 1):(f - 1 + n)])])
+                values.append(posgrams[offset])
+            elif kind == u"idx":
+                values.append(list(range(n)))
+            elif kind == u"bos":
+                values.append([True] + [False] * (n - 1))
+            elif kind == u"clen":
+                values.append([c > max_chars for c in padded_clens[offset:(offset + n)]])
+            elif kind == u"alen":
+                values.append([a > max_chars for a in padded_alens[offset:(offset + n)]])
+        return names, values, flags
+
+    def extract(self, columns):
+        """
+        Return the list of the features of the tokens
+        with the given ``(words, poses, wses)`` columns,
+        each item being a dict mapping CRFsuite attributes to values.
+        """
+        if len(columns[0]) == 0:
+            return []
+        names, values, flags = self._values(columns)
+        # the string features, flattened into attributes
+        names = [(name + u":") if flag else name for name, flag in zip(names, flags)]
+        features = []
+        for row in zip(*values):
+            item = {}
+            for name, flag, value in zip(names, flags, row):
+                if flag:
+                    item[name + value] = 1
+                else:
+                    item[name] = value
+            features.append(item)
+        return features
+
+    def items(self, columns):
+        """
+        Return the list of the features of the tokens
+        with the given ``(words, poses, wses)`` columns,
+        as items for ``pycrfsuite``: each item is a dict
+        mapping the template names to their values,
+        where the string values are flattened into attributes
+        (e.g. ``{u"word": u"Hello"}`` into ``u"word:Hello"``)
+        by ``pycrfsuite`` itself.
+        """
+        if len(columns[0]) == 0:
+            return []
+        names, values, flags = self._values(columns)
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def item_sequence(self, columns):
+        """
+        Return a ``pycrfsuite.ItemSequence`` with the features
+        of the tokens with the given ``(words, poses, wses)`` columns.
+        """
+        return pycrfsuite.ItemSequence(self.items(columns))
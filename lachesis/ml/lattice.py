@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Score many related token sequences with a linear-chain CRF
+by sharing the forward (Viterbi and normalization) computation
+over their common prefix.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import math
+
+from lachesis.ml.features import columns_from_tokens
+
+
+def _logsumexp(values):
+    m = max(values)
+    return m + math.log(sum([math.exp(v - m) for v in values]))
+
+
+class CRFLattice(object):
+    """
+    The weights of a CRFsuite model, arranged to compute
+    the probability of the Viterbi path of a sequence
+    one token at a time.
+
+    A forward state is a ``(delta, alpha, magnitude)`` tuple,
+    where ``delta`` and ``alpha`` are the max-product
+    and (log) sum-product scores of each label
+    at the last token, and ``magnitude`` bounds the
+    total weight of the attributes seen so far.
+
+    NOTE: the weights are read from the text dump of the model,
+          where CRFsuite rounds them to six decimal digits,
+          hence every log probability comes with an error bound:
+          callers needing the exact value of close scores
+          must ask the tagger.
+    """
+
+    WEIGHT_ERROR = 5e-7
+    """ Maximum rounding error of a weight in the model dump """
+
+    CACHE_SIZE = 200000
+    """ Maximum number of memoized state scores """
+
+    def __init__(self, tagger, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+        info = tagger.info()
+        self.labels = sorted(info.labels.keys(), key=lambda l: int(info.labels[l]))
+        index = dict([(l, i) for i, l in enumerate(self.labels)])
+        k = len(self.labels)
+        self.state_weights = {}
+        for (attribute, label), weight in info.state_features.items():
+            if attribute not in self.state_weights:
+                self.state_weights[attribute] = [0.0] * k
+            self.state_weights[attribute][index[label]] = weight
+        self.transitions = [[0.0] * k for i in range(k)]
+        for (source, target), weight in info.transitions.items():
+            self.transitions[index[source]][index[target]] = weight
+        # transitions into each label
+        self.columns = [[row[j] for row in self.transitions] for j in range(k)]
+
+    def weights(self, attribute):
+        """
+        Return the list of the weights of the given attribute
+        for each label, or ``None`` if the attribute is unknown.
+        """
+        return self.state_weights.get(attribute)
+
+    def state_scores(self, attributes):
+        """
+        Return a ``(scores, magnitude)`` tuple for the given
+        list of ``(attribute, value)`` pairs of a token,
+        where ``scores`` holds the state score of each label
+        and ``magnitude`` the total absolute value
+        of the attributes known to the model.
+        """
+        k = len(self.labels)
+        scores = [0.0] * k
+        magnitude = 0.0
+        state_weights = self.state_weights
+        for attribute, value in attributes:
+            if value != 0:
+                weights = state_weights.get(attribute)
+                if weights is not None:
+                    magnitude += abs(value)
+                    for j in range(k):
+                        scores[j] += weights[j] * value
+        return scores, magnitude
+
+    def cached_state_scores(self, key, attributes):
+        """
+        As ``state_scores()``, but memoized under the given key,
+        where ``attributes`` is a function returning the attributes
+        and it is called only if the key is not memoized yet.
+        """
+        cached = self.cache.get(key)
+        if cached is None:
+            if len(self.cache) >= self.cache_size:
+                self.cache = {}
+            cached = self.state_scores(attributes())
+            self.cache[key] = cached
+        return cached
+
+    def extend(self, state, scores, magnitude):
+        """
+        Return the forward state obtained by appending a token
+        with the given state scores to the sequence of ``state``,
+        which is ``None`` for the empty sequence.
+        """
+        if state is None:
+            return (scores, list(scores), magnitude)
+        delta, alpha, previous_magnitude = state
+        new_delta = []
+        new_alpha = []
+        for j, column in enumerate(self.columns):
+            paths = [d + t for d, t in zip(delta, column)]
+            new_delta.append(max(paths) + scores[j])
+            paths = [a + t for a, t in zip(alpha, column)]
+            m = max(paths)
+            new_alpha.append(m + math.log(sum([math.exp(p - m) for p in paths])) + scores[j])
+        # one transition weight per token after the first one
+        return (new_delta, new_alpha, previous_magnitude + magnitude + 1)
+
+    def viterbi(self, state):
+        """
+        Return a ``(label, log_probability, error)`` tuple for the sequence
+        of the given forward state, where ``label`` is the last label
+        of the Viterbi path, ``log_probability`` its log probability,
+        and ``error`` a bound on the error of the latter.
+        """
+        delta, alpha, magnitude = state
+        # ties broken by label id, as CRFsuite does
+        best = 0
+        for j in range(1, len(delta)):
+            if delta[best] < delta[j]:
+                best = j
+        # both the path score and the normalization might be off by the bound
+        error = 2 * self.WEIGHT_ERROR * magnitude + 1e-9
+        return (self.labels[best], delta[best] - _logsumexp(alpha), error)
+
+    def best_labels(self, state):
+        """
+        Return the set of the labels which might be the last label
+        of the Viterbi path of the sequence of the given forward state,
+        given the error bound of the scores.
+        """
+        delta, alpha, magnitude = state
+        error = 2 * self.WEIGHT_ERROR * magnitude + 1e-9
+        threshold = max(delta) - error
+        return set([l for l, d in zip(self.labels, delta) if d >= threshold])
+
+
+class CRFLineScorer(object):
+    """
+    Score the candidate lines starting at a given token of a sentence,
+    that is, compute the Viterbi path probability the CRF model
+    assigns to each prefix ``tokens[begin:end]``,
+    with the features computed on the prefix alone.
+
+    The features of a token depend on the end of the prefix
+    only through the look-ahead window of the extractor,
+    so the tokens farther than that from the end
+    are scored once and shared by all the longer prefixes.
+    The state scores are split by what they depend on
+    (the token alone, its right context, the begin of the line),
+    and the first two parts are memoized by content.
+    """
+
+    def __init__(self, lattice, extractor, tokens):
+        self.lattice = lattice
+        self.extractor = extractor
+        self.reach = extractor.reach
+        self.words, self.poses, self.wses = columns_from_tokens(tokens)
+        self.cumulative = [0]
+        for w, ws in zip(self.words, self.wses):
+            self.cumulative.append(self.cumulative[-1] + len(w) + (1 if ws else 0))
+        self.n = len(tokens)
+        self.token_scores = [self._token_scores(idx) for idx in range(self.n)]
+        # the names of the line features are fixed, only their values change
+        self.line_weights = [lattice.weights(name) for name, kind, offset in extractor.groups.get(u"line", [])]
+        self.line_offsets = sorted(set([offset for name, kind, offset in extractor.groups.get(u"line", [])]))
+
+    def _token_scores(self, idx):
+        word, pos, ws = self.words[idx], self.poses[idx], self.wses[idx]
+        return self.lattice.cached_state_scores(
+            (u"token", word, pos, ws),
+            lambda: self.extractor.token_attributes(word, pos, ws)
+        )
+
+    def _context_scores(self, idx, available):
+        window = tuple(self.poses[idx:(idx + available)]) + (self.extractor.PAD_POS,) * (self.extractor.window - available)
+        return self.lattice.cached_state_scores(
+            (u"context",) + window,
+            lambda: self.extractor.context_attributes(window)
+        )
+
+    def _scores(self, idx, begin, end):
+        """
+        Return the state scores and magnitude of token ``idx``
+        as a token of the sequence ``tokens[begin:end]``.
+        """
+        cumulative = self.cumulative
+        available = min(end - idx, self.extractor.window)
+        # cumulative lengths, only at the offsets read by the line features
+        alens = [None] * self.extractor.window
+        clens = [None] * self.extractor.window
+        first = cumulative[begin + 1] - cumulative[begin]
+        for offset in self.line_offsets:
+            if offset < available:
+                alens[offset] = cumulative[idx + offset + 1] - cumulative[begin]
+                clens[offset] = alens[offset] - first
+            else:
+                alens[offset] = clens[offset] = self.extractor.PAD_LENGTH
+        token_scores, token_magnitude = self.token_scores[idx]
+        context_scores, context_magnitude = self._context_scores(idx, available)
+        scores = [a + b for a, b in zip(token_scores, context_scores)]
+        magnitude = token_magnitude + context_magnitude
+        for weights, value in zip(self.line_weights, self.extractor.line_values(idx - begin, clens, alens)):
+            if (value != 0) and (weights is not None):
+                magnitude += abs(value)
+                for j, weight in enumerate(weights):
+                    scores[j] += weight * value
+        return scores, magnitude
+
+    def score(self, begin, ends):
+        """
+        Score the prefixes ``tokens[begin:end]``
+        for each ``end`` in the given increasing list ``ends``,
+        returning a list of ``(end, label, log_probability, error)`` tuples
+        (see ``CRFLattice.viterbi()``).
+        """
+        lattice = self.lattice
+        results = []
+        state = None
+        shared = begin
+        for end in ends:
+            # absorb the tokens whose features do not depend on the end anymore
+            while shared + self.reach < end:
+                scores, magnitude = self._scores(shared, begin, self.n)
+                state = lattice.extend(state, scores, magnitude)
+                shared += 1
+            tail = state
+            for idx in range(shared, end):
+                scores, magnitude = self._scores(idx, begin, end)
+                tail = lattice.extend(tail, scores, magnitude)
+            label, log_probability, error = lattice.viterbi(tail)
+            results.append((end, label, log_probability, error))
+        return results
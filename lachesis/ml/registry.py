@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A process-wide registry of opened CRF models,
+shared by all the splitter instances and threads.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import collections
+import os
+import threading
+import time
+
+from lachesis.ml.crf import CRFPredictor
+
+
+class CRFModelRegistry(object):
+    """
+    A registry holding opened ``CRFPredictor`` objects,
+    keyed by the absolute path and the modification time
+    of the model file, so that each model is loaded
+    only once per process.
+
+    Models are evicted in least-recently-used order
+    when the total size of the loaded model files
+    exceeds ``memory_budget`` bytes.
+    The most recently loaded model is never evicted,
+    even if it alone exceeds the budget.
+    """
+
+    MEMORY_BUDGET = 512 * 1024 * 1024
+    """ Maximum total size (in bytes) of the loaded models. Set to -1 to ignore. """
+
+    def __init__(self, memory_budget=MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.lock = threading.RLock()
+        self.entries = collections.OrderedDict()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getstate__(self):
+        # NOTE: a registry is pickled (e.g., to be sent to another process)
+        #       as an empty registry with the same budget
+        return {"memory_budget": self.memory_budget}
+
+    def __setstate__(self, state):
+        self.__init__(memory_budget=state["memory_budget"])
+
+    def _key(self, model_file_path):
+        path = os.path.abspath(model_file_path)
+        return (path, os.path.getmtime(path))
+
+    def get(self, model_file_path):
+        """
+        Return the ``CRFPredictor`` for the given model file,
+        loading it if it is not already in the registry.
+
+        If the model file has been modified since it was loaded,
+        the stale predictor is dropped and the file is loaded again.
+        """
+        key = self._key(model_file_path)
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                # move it to the most recently used position
+                self.entries[key] = entry
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            # drop older versions of the same model file
+            for stale in [k for k in self.entries if k[0] == key[0]]:
+                self._remove(stale)
+            start = time.time()
+            predictor = CRFPredictor(key[0])
+            self.load_time += time.time() - start
+            size = os.path.getsize(key[0])
+            self.entries[key] = (predictor, size)
+            self.memory_used += size
+            self._evict()
+            return predictor
+
+    def _remove(self, key):
+        predictor, size = self.entries.pop(key)
+        self.memory_used -= size
+
+    def _evict(self):
+        if self.memory_budget < 0:
+            return
+        while (self.memory_used > self.memory_budget) and (len(self.entries) > 1):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all the models from the registry,
+        without resetting the counters.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.memory_used = 0
+
+    @property
+    def stats(self):
+        """
+        Return a dictionary with the registry counters.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "models": len(self.entries),
+                "memory_used": self.memory_used,
+                "memory_budget": self.memory_budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (float(self.hits) / lookups) if lookups > 0 else 0.0,
+                "evictions": self.evictions,
+                "load_time": self.load_time,
+            }
+
+
+DEFAULT_REGISTRY = CRFModelRegistry()
+""" The registry shared by default by all the CRF splitters of this process """
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Cross-validate a grid of CRF training configurations on a dump.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import itertools
+import multiprocessing
+import os
+import time
+
+from lachesis.ml.crf import CRFTrainer
+from lachesis.ml.evaluation import CRFEvaluator
+from lachesis.ml.features import FeatureExtractor
+import lachesis.globalfunctions as gf
+
+
+class CRFSweep(object):
+    """
+    Train and evaluate each configuration of a parameter grid
+    with k-fold cross-validation over the examples of a dump.
+
+    The grid maps parameter names to lists of values.
+    ``algorithm`` selects the pycrfsuite training algorithm,
+    the keys in ``EXTRACTOR_PARAMETERS`` are passed to the ``FeatureExtractor``,
+    and all the other keys are pycrfsuite training parameters,
+    overriding ``CRFTrainer.PARAMETERS``.
+
+    The folds are contiguous blocks of examples,
+    so that consecutive CC lines are evaluated together.
+    """
+
+    FOLDS = 3
+    """ Default number of folds """
+
+    EXTRACTOR_PARAMETERS = [u"forward", u"max_chars_per_line"]
+    """ Grid keys configuring the feature extractor """
+
+    def __init__(self, language, dump_file_path, grid, folds=FOLDS):
+        if folds < 2:
+            raise ValueError(u"The number of folds must be at least 2")
+        self.language = language
+        self.dump_file_path = dump_file_path
+        self.configurations = self.expand_grid(grid)
+        self.folds = folds
+
+    @classmethod
+    def expand_grid(cls, grid):
+        """
+        Return the list of the configurations (dicts)
+        in the cartesian product of the given grid.
+        """
+        keys = sorted(grid.keys())
+        values = [(grid[k] if isinstance(grid[k], list) else [grid[k]]) for k in keys]
+        return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+    def run(self, jobs=1):
+        """
+        Train and evaluate every configuration on every fold,
+        yielding the result of each ``(configuration, fold)`` pair
+        (see ``run_fold()``), in order.
+
+        If ``jobs`` is greater than one,
+        the pairs are run by a pool of ``jobs`` processes.
+        """
+        tasks = [
+            (self.language, self.dump_file_path, self.folds, idx, configuration, fold)
+            for idx, configuration in enumerate(self.configurations)
+            for fold in range(self.folds)
+        ]
+        if jobs > 1:
+            pool = multiprocessing.Pool(processes=jobs)
+            try:
+                for result in pool.imap(_run_fold_worker, tasks):
+                    yield result
+                pool.close()
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for task in tasks:
+                yield run_fold(*task)
+
+    def summarize(self, results):
+        """
+        Return a list with the mean measures of each configuration
+        over the folds of the given results, as dicts.
+        """
+        measures = [u"accuracy", u"train_time", u"throughput", u"model_size"]
+        summary = []
+        for idx, configuration in enumerate(self.configurations):
+            done = [r for r in results if (r[u"configuration"] == idx) and (r[u"error"] is None)]
+            entry = {
+                u"configuration": idx,
+                u"parameters": configuration,
+                u"folds": len(done),
+                u"errors": [r[u"error"] for r in results if (r[u"configuration"] == idx) and (r[u"error"] is not None)],
+            }
+            for measure in measures:
+                entry[measure] = (sum([r[measure] for r in done]) / float(len(done))) if len(done) > 0 else None
+            summary.append(entry)
+        return summary
+
+
+# the examples of the dumps loaded by the current process
+_EXAMPLES = {}
+
+
+def _load_examples(language, dump_file_path):
+    if dump_file_path not in _EXAMPLES:
+        trainer = CRFTrainer(language=language)
+        trainer.load_data(dump_file_path)
+        _EXAMPLES[dump_file_path] = trainer.train_data
+    return _EXAMPLES[dump_file_path]
+
+
+def run_fold(language, dump_file_path, folds, idx, configuration, fold):
+    """
+    Train a model with the given configuration
+    on all the folds of the dump except ``fold``,
+    and evaluate it on ``fold``.
+
+    Return a dict with the accuracy on the held-out fold,
+    the training time (seconds), the tagging throughput (tokens per second),
+    the size of the model file (bytes), and the error message,
+    which is ``None`` if the fold was run successfully.
+    """
+    result = {
+        u"configuration": idx,
+        u"fold": fold,
+        u"accuracy": None,
+        u"lines": 0,
+        u"train_time": None,
+        u"throughput": None,
+        u"model_size": None,
+        u"error": None,
+    }
+    handler, model_file_path = gf.tmp_file(suffix=u".crfsuite")
+    try:
+        examples = _load_examples(language, dump_file_path)
+        n = len(examples)
+        begin = n * fold // folds
+        end = n * (fold + 1) // folds
+
+        extractor = FeatureExtractor(**dict([(k, v) for k, v in configuration.items() if k in CRFSweep.EXTRACTOR_PARAMETERS]))
+        algorithm = configuration.get(u"algorithm", CRFTrainer.ALGORITHM)
+        parameters = dict(CRFTrainer.PARAMETERS)
+        parameters.update([(k, v) for k, v in configuration.items() if (k not in CRFSweep.EXTRACTOR_PARAMETERS) and (k != u"algorithm")])
+
+        # train on the other folds, streaming the examples
+        trainer = CRFTrainer(language=language, extractor=extractor, algorithm=algorithm, parameters=parameters)
+        trainer.train_data = (e for i, e in enumerate(examples) if (i < begin) or (i >= end))
+        start = time.time()
+        trainer.train(model_file_path)
+        result[u"train_time"] = time.time() - start
+        result[u"model_size"] = os.path.getsize(model_file_path)
+
+        held_out = [examples[i] for i in range(begin, end)]
+        evaluator = CRFEvaluator(model_file_path, extractor=extractor)
+
+        # tagging throughput, as the splitter would tag whole lines
+        tokens = 0
+        start = time.time()
+        for columns, labels in held_out:
+            evaluator.predictor.predict(extractor.item_sequence(columns))
+            tokens += len(labels)
+        elapsed = time.time() - start
+        result[u"throughput"] = (tokens / elapsed) if elapsed > 0 else 0.0
+
+        good = 0
+        for chosen, is_good in evaluator.evaluate(held_out):
+            good += 1 if is_good else 0
+        result[u"lines"] = len(held_out)
+        result[u"accuracy"] = (float(good) / len(held_out)) if len(held_out) > 0 else 0.0
+    except Exception as exc:
+        result[u"error"] = u"%s: %s" % (type(exc).__name__, exc)
+    finally:
+        gf.delete_file(handler, model_file_path)
+        gf.delete_file(None, model_file_path + FeatureExtractor.FINGERPRINT_EXTENSION)
+    return result
+
+
+def _run_fold_worker(task):
+    return run_fold(*task)
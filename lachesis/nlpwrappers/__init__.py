@@ -24,6 +24,7 @@ around different NLP packages.
 """
 
 from lachesis.nlpwrappers.base import BaseWrapper
+from lachesis.nlpwrappers.cache import AnalysisCache
 from lachesis.nlpwrappers.nlpengine import NLPEngine
 from lachesis.nlpwrappers.nltk import NLTKWrapper
 from lachesis.nlpwrappers.spacy import SpacyWrapper
@@ -24,6 +24,8 @@ TBW
 
 from __future__ import absolute_import
 from __future__ import print_function
+import itertools
+import multiprocessing
 
 from lachesis.elements import Document
 from lachesis.elements import EndOfSentenceToken
@@ -31,6 +33,8 @@ from lachesis.elements import EndOfLineToken
 from lachesis.elements import Span
 from lachesis.elements import Token
 from lachesis.language import Language
+from lachesis.memory import HighWaterMark
+from lachesis.memory import records_high_water_mark
 from lachesis.nlpwrappers.upostags import UniversalPOSTags
 import lachesis.globalfunctions as gf
 
@@ -50,6 +54,18 @@ class BaseWrapper(object):
     UPOSTAG_MAP = UniversalPOSTags.UPOSTAG_MAP_V1_TO_V2
     """ Maps the POS tags returned by this NLP library to Universal POS Tags (v2) """
 
+    vocabulary = None
+    """ The ``Vocabulary`` interning the strings and lemmas of the created tokens, if any """
+
+    analysis_cache = None
+    """ The ``AnalysisCache`` storing the analyses of this wrapper, if any """
+
+    BATCH_SIZE = 64
+    """ Default number of documents analyzed at a time by ``analyze_many()`` """
+
+    PARALLEL_BATCHING = False
+    """ ``True`` if ``_analyze_stream()`` runs the NLP library on several workers itself """
+
     def __init__(self, language):
         lfc = Language.from_code(language)
         if (lfc is not None) and (lfc in self.LANGUAGES):
@@ -60,7 +76,18 @@ class BaseWrapper(object):
             return self
         raise ValueError(u"This NLP library does not support the '%s' language" % language)
 
-    def analyze(self, document):
+    @property
+    def version(self):
+        """
+        A string identifying the version of the NLP library
+        and of the model used by this wrapper,
+        so that the analyses of different versions
+        are cached separately (see ``lachesis.nlpwrappers.cache``).
+        """
+        return u""
+
+    @records_high_water_mark(u"analyze")
+    def analyze(self, document, chunk_size=None):
         """
         Analyze the given document, splitting it into sentences
         and tagging the tokens (words) with Universal POS tags.
@@ -69,6 +96,186 @@ class BaseWrapper(object):
 
         The information output (sentences, token tags, etc.)
         will be stored inside the given ``document`` object.
+
+        If ``chunk_size`` is not ``None``, the raw text is analyzed
+        in chunks of about ``chunk_size`` characters
+        (see ``Document.iter_raw_chunks()``), one at a time,
+        instead of as a whole, bounding the memory used by the analysis.
+        A sentence cannot span two chunks.
+
+        The high-water mark of the analysis is recorded
+        in the document (see ``Document.memory_report()``).
+
+        If this wrapper has an ``analysis_cache``, the analysis
+        is read from it, if present, without running the NLP library,
+        and stored in it otherwise.
+        """
+        doc_string = self._check_document(document, chunk_size)
+
+        cache_key, hit = self._read_cache(document, chunk_size)
+        if hit:
+            return
+
+        # remove any information from the document
+        document.clear()
+        document.text_view = Span()
+
+        if chunk_size is None:
+            chunks = [(document.raw.string(flat=True), doc_string)]
+        else:
+            chunks = document.iter_raw_chunks(chunk_size)
+        has_text = False
+        for doc_string_with_eol, doc_string in chunks:
+            if (chunk_size is not None) and (len(doc_string.strip()) < 1):
+                # nothing to analyze in this chunk
+                continue
+            has_text = True
+            # do the actual analysis
+            sentences = self._analyze(doc_string_with_eol)
+            self._append_sentences(document, self._fix_sentences(sentences, doc_string))
+        if not has_text:
+            raise ValueError(u"The document has no text set.")
+        self._write_cache(cache_key, document)
+
+    def analyze_many(self, documents, batch_size=BATCH_SIZE, n_process=1):
+        """
+        Analyze the given documents, as ``analyze()`` does,
+        ``batch_size`` documents at a time,
+        letting the NLP libraries which support it (e.g., spaCy)
+        process each batch at once (see ``_analyze_stream()``).
+
+        If ``n_process`` is greater than one, the NLP library
+        analyzes the documents on ``n_process`` workers, if it can,
+        otherwise the batches are analyzed by a pool
+        of ``n_process`` processes, each with its own copy of this wrapper.
+
+        The high-water mark of the whole analysis
+        is recorded in each document (see ``Document.memory_report()``).
+        """
+        documents = list(documents)
+        with HighWaterMark() as mark:
+            # the documents to analyze, with their flat, clean string
+            # and their key in the analysis cache
+            pending = []
+            for document in documents:
+                doc_string = self._check_document(document)
+                cache_key, hit = self._read_cache(document)
+                if not hit:
+                    pending.append((document, doc_string, cache_key))
+            strings = [document.raw.string(flat=True) for document, doc_string, cache_key in pending]
+            pool = None
+            if (n_process > 1) and (len(strings) > batch_size) and (not self.PARALLEL_BATCHING):
+                batches = [strings[i:(i + batch_size)] for i in range(0, len(strings), batch_size)]
+                pool = multiprocessing.Pool(
+                    processes=min(n_process, len(batches)),
+                    initializer=_init_analyze_worker,
+                    initargs=(self.__class__, self.language, self._worker_arguments())
+                )
+                results = itertools.chain.from_iterable(pool.imap(_analyze_batch_worker, batches))
+            else:
+                results = self._analyze_stream(strings, batch_size, n_process=n_process)
+            try:
+                for document, doc_string, cache_key in pending:
+                    sentences = next(results)
+                    if pool is not None:
+                        # the tokens have been created by another process
+                        self._intern_tokens(sentences)
+                    document.clear()
+                    document.text_view = Span()
+                    self._append_sentences(document, self._fix_sentences(sentences, doc_string))
+                    self._write_cache(cache_key, document)
+                if pool is not None:
+                    pool.close()
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+        for document in documents:
+            document.high_water_marks[u"analyze"] = mark.mark
+
+    def _worker_arguments(self):
+        """
+        Return the keyword arguments (besides the language)
+        to create a copy of this wrapper in a worker process.
+        """
+        return {}
+
+    def _intern_tokens(self, sentences):
+        """
+        Intern the strings and lemmas of the tokens of the given sentences
+        with the ``vocabulary`` of this wrapper, if any.
+        """
+        if self.vocabulary is None:
+            return
+        for sentence in sentences:
+            for token in sentence:
+                if token.is_regular:
+                    token.raw = self.vocabulary.intern(token.raw)
+                    token.lemma = self.vocabulary.intern(token.lemma)
+
+    def _check_document(self, document, chunk_size=None):
+        """
+        Check that the given document can be analyzed
+        (with the given ``chunk_size``) by this wrapper,
+        and return its flat, clean string,
+        or ``None`` if it is analyzed in chunks.
+
+        :raises: ValueError: if the document has no text,
+                             or its language is not the one of this wrapper
+        """
+        doc_string = None
+        if chunk_size is None:
+            doc_string = document.raw_flat_clean_string
+            if (doc_string is None) or (len(doc_string) < 1):
+                raise ValueError(u"The document has no text set.")
+        elif not document.has_raw:
+            raise ValueError(u"The document has no text set.")
+        if (document.language is not None) and (document.language != self.language):
+            # TODO warning instead?
+            raise ValueError(u"The document has been created with the '%s' language set while this NLP library has loaded the '%s' language." % (document.language, self.language))
+        return doc_string
+
+    def _read_cache(self, document, chunk_size=None):
+        """
+        Return a ``(key, hit)`` tuple with the key
+        of the analysis of the given document in the ``analysis_cache``
+        (``None`` if this wrapper has no ``analysis_cache``),
+        and ``True`` if the analysis has been found in the cache,
+        in which case it is set in the document,
+        replacing its tokens and views.
+        """
+        if self.analysis_cache is None:
+            return (None, False)
+        if chunk_size is None:
+            strings = [document.raw.string(flat=True)]
+        else:
+            strings = (flat for flat, flat_clean in document.iter_raw_chunks(chunk_size))
+        cache_key = self.analysis_cache.key(strings, self.language, self.CODE, self.version, chunk_size)
+        sentences = self.analysis_cache.get(cache_key, vocabulary=self.vocabulary)
+        if sentences is None:
+            return (cache_key, False)
+        document.clear()
+        document.text_view = Span()
+        self._append_sentences(document, sentences)
+        return (cache_key, True)
+
+    def _write_cache(self, cache_key, document):
+        """
+        Store the analysis of the given document
+        in the ``analysis_cache`` with the given key,
+        unless the key is ``None``.
+        """
+        if cache_key is not None:
+            # store the sentences without the end of sentence tokens
+            self.analysis_cache.put(cache_key, [sentence.elements[:-1] for sentence in document.sentences])
+
+    def _fix_sentences(self, sentences, doc_string):
+        """
+        Return the given sentences (lists of tokens),
+        output by ``_analyze()`` for the given flat, clean string,
+        with the unnecessary end of line tokens and the empty sentences removed,
+        the trailing whitespace of each token set,
+        and the punctuation split across sentences moved back.
         """
         def _remove_unnecessary_eols(sentences):
             new_sentences = []
@@ -93,13 +300,6 @@ class BaseWrapper(object):
                     i = doc_string.find(t.raw, i) + len(t.raw)
                     t.trailing_whitespace = (i < n) and (doc_string[i] == u" ")
 
-        doc_string = document.raw_flat_clean_string
-        if (doc_string is None) or (len(doc_string) < 1):
-            raise ValueError(u"The document has no text set.")
-        if (document.language is not None) and (document.language != self.language):
-            # TODO warning instead?
-            raise ValueError(u"The document has been created with the '%s' language set while this NLP library has loaded the '%s' language." % (document.language, self.language))
-
         def _fix_across_sentence_splits(sentences):
             # move characters with no trailing whitespace
             # located at the begin of current sentence
@@ -122,13 +322,6 @@ class BaseWrapper(object):
                 sentences[i] = curr_sent
             return sentences
 
-        # remove any information from the document
-        document.clear()
-
-        # do the actual analysis
-        doc_string_with_eol = document.raw.string(flat=True)
-        sentences = self._analyze(doc_string_with_eol)
-
         # remove unnecessary EndOfLineToken objects
         # and keep only non-empty sentences
         sentences, tokens = _remove_unnecessary_eols(sentences)
@@ -145,17 +338,26 @@ class BaseWrapper(object):
         # NOTE: yes, running this twice is mandatory
         #
         sentences, tokens = _remove_unnecessary_eols(sentences)
+        return sentences
 
-        # append resulting non-empty sentences to document
-        document.text_view = Span()
+    def _append_sentences(self, document, sentences):
+        """
+        Append the given sentences (lists of tokens)
+        to the tokens and to the text view of the given document.
+        """
         for sent in sentences:
-            # add end of sentence token
+            # add the (shared) end of sentence token
             token = EndOfSentenceToken()
             sent.append(token)
             # add all surviving tokens
-            sentence = Span()
+            begin = len(document.tokens)
             document.tokens.extend(sent)
-            sentence.extend(sent)
+            if document.columnar:
+                # the sentence is a view over the token store
+                sentence = Span(elements=document.tokens[begin:])
+            else:
+                sentence = Span()
+                sentence.extend(sent)
             document.text_view.append(sentence)
 
     def _analyze(self, doc_string):
@@ -165,10 +367,52 @@ class BaseWrapper(object):
         """
         raise NotImplementedError(u"This method should be implemented in a subclass.")
 
+    def _analyze_batch(self, doc_strings, n_process=1):
+        """
+        Return the list of the outputs of ``_analyze()``
+        for the given list of strings.
+
+        A subclass can override it to use the batching
+        of its NLP library, on ``n_process`` workers
+        if ``PARALLEL_BATCHING`` is ``True``.
+        """
+        return [self._analyze(doc_string) for doc_string in doc_strings]
+
+    def _analyze_stream(self, doc_strings, batch_size, n_process=1):
+        """
+        Yield the outputs of ``_analyze()``
+        for the given list of strings, in order,
+        analyzing ``batch_size`` strings at a time
+        with ``_analyze_batch()``.
+
+        A subclass can override it to stream all the strings
+        through the batching of its NLP library at once,
+        so that its workers are started only once.
+        """
+        for i in range(0, len(doc_strings), batch_size):
+            for sentences in self._analyze_batch(doc_strings[i:(i + batch_size)], n_process=n_process):
+                yield sentences
+
     def _create_token(self, raw, upos_tag, lemma=None):
         """
         Return a new token, either a EndOfLineToken or a regular token.
         """
         if raw == EndOfLineToken.RAW:
             return EndOfLineToken()
+        if self.vocabulary is not None:
+            raw = self.vocabulary.intern(raw)
+            lemma = self.vocabulary.intern(lemma)
         return Token(raw=raw, upos_tag=self.UPOSTAG_MAP[upos_tag], lemma=lemma)
+
+
+# the NLP wrapper of the current worker process
+_WRAPPER = None
+
+
+def _init_analyze_worker(wrapper_class, language, arguments):
+    global _WRAPPER
+    _WRAPPER = wrapper_class(language, **arguments)
+
+
+def _analyze_batch_worker(doc_strings):
+    return _WRAPPER._analyze_batch(doc_strings)
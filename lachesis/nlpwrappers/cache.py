@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+A persistent cache of the NLP analyses of documents,
+so that analyzing the same text again
+(e.g., when re-segmenting it, or dumping a CRF corpus again)
+does not run the NLP library.
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from lachesis.elements import EndOfLineToken
+from lachesis.elements import Token
+import lachesis
+
+
+class AnalysisCache(object):
+    """
+    A persistent cache of the NLP analyses of documents,
+    stored in a SQLite database file,
+    which can be shared by several processes.
+
+    Each analysis, that is, the list of the sentences of a document,
+    each a list of tokens, is stored compressed,
+    keyed by a hash of the text of the document, its language,
+    the code and version of the NLP wrapper (see ``key()``).
+    When the total size of the stored analyses exceeds ``max_size`` bytes,
+    the least recently used ones are evicted.
+
+    The cache counts its hits, misses and evictions
+    (see ``stats``).
+
+    To use it, pass it to the ``NLPEngine``
+    (or set the ``analysis_cache`` of an NLP wrapper):
+    the analysis of a document found in the cache
+    skips the NLP library entirely.
+    """
+
+    MAX_SIZE = 256 * 1024 * 1024
+    """ Default maximum total size of the stored analyses, in bytes """
+
+    FORMAT = 1
+    """ Version of the format of the stored analyses """
+
+    def __init__(self, file_path, max_size=MAX_SIZE):
+        self.file_path = file_path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        """
+        The connection to the database of this process,
+        creating the database if it does not exist.
+        """
+        if (self._connection is None) or (self._pid != os.getpid()):
+            # a connection cannot be shared with a forked process
+            self._connection = sqlite3.connect(self.file_path, timeout=60, isolation_level=None)
+            self._pid = os.getpid()
+            self._connection.execute(u"CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute(u"CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed)")
+        return self._connection
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        # do not pickle the connection
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pid"] = None
+        return state
+
+    def __len__(self):
+        return self.connection.execute(u"SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    @classmethod
+    def key(cls, strings, language, wrapper_code, wrapper_version, chunk_size=None):
+        """
+        Return the key of the analysis of the text given as ``strings``
+        (e.g., ``[document.raw.string(flat=True)]``, or the chunks of it),
+        with the given language, NLP wrapper and ``chunk_size``
+        (see ``BaseWrapper.analyze()``).
+        """
+        digest = hashlib.sha1()
+        for string in strings:
+            digest.update(string.encode("utf-8"))
+        spec = u"|".join([
+            u"%s" % value for value in (
+                cls.FORMAT,
+                lachesis.__version__,
+                language,
+                wrapper_code,
+                wrapper_version,
+                chunk_size,
+                digest.hexdigest(),
+            )
+        ])
+        return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+    def get(self, key, vocabulary=None):
+        """
+        Return the analysis with the given key, as a list of sentences,
+        each a list of new ``Token`` objects,
+        or ``None`` if it is not in the cache.
+
+        If a ``vocabulary`` is given, the strings and lemmas
+        of the tokens are interned with it.
+        """
+        row = self.connection.execute(u"SELECT value FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute(u"UPDATE analyses SET accessed = ? WHERE key = ?", (time.time(), key))
+        intern = (lambda s: s) if vocabulary is None else vocabulary.intern
+        sentences = []
+        for rows in json.loads(zlib.decompress(row[0]).decode("utf-8")):
+            sentence = []
+            for raw, upos_tag, chunk_tag, pnp_tag, lemma, trailing_whitespace in rows:
+                if raw == EndOfLineToken.RAW:
+                    sentence.append(EndOfLineToken())
+                else:
+                    sentence.append(Token(intern(raw), upos_tag, chunk_tag, pnp_tag, intern(lemma), trailing_whitespace))
+            sentences.append(sentence)
+        return sentences
+
+    def put(self, key, sentences):
+        """
+        Store the given analysis, a list of sentences,
+        each a list of tokens, with the given key,
+        evicting the least recently used analyses if needed.
+
+        An analysis larger than ``max_size`` is not stored.
+        """
+        rows = [
+            [(t.raw, t.upos_tag, t.chunk_tag, t.pnp_tag, t.lemma, t.trailing_whitespace) for t in sentence]
+            for sentence in sentences
+        ]
+        value = zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(u",", u":")).encode("utf-8"))
+        if len(value) > self.max_size:
+            return
+        connection = self.connection
+        connection.execute(u"BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                u"INSERT OR REPLACE INTO analyses (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), len(value), time.time())
+            )
+            self._evict()
+            connection.execute(u"COMMIT")
+        except:
+            connection.execute(u"ROLLBACK")
+            raise
+
+    def _evict(self):
+        connection = self.connection
+        total = connection.execute(u"SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for key, size in connection.execute(u"SELECT key, size FROM analyses ORDER BY accessed").fetchall():
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany(u"DELETE FROM analyses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        """
+        Remove all the analyses from the cache.
+        """
+        self.connection.execute(u"DELETE FROM analyses")
+
+    @property
+    def stats(self):
+        """
+        Return a dictionary with the cache counters
+        (of this cache object) and the number of ``entries``
+        and the total ``size`` of the analyses in the cache (file).
+        """
+        entries, size = self.connection.execute(u"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "size": size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (float(self.hits) / lookups) if lookups > 0 else 0.0,
+            "evictions": self.evictions,
+        }
@@ -25,6 +25,7 @@ TBW
 from __future__ import absolute_import
 from __future__ import print_function
 
+from lachesis.nlpwrappers.base import BaseWrapper
 from lachesis.nlpwrappers.nltk import NLTKWrapper
 from lachesis.nlpwrappers.pattern import PatternWrapper
 from lachesis.nlpwrappers.spacy import SpacyWrapper
@@ -52,8 +53,10 @@ class NLPEngine(object):
         UDPipeWrapper.CODE: UDPipeWrapper,
     }
 
-    def __init__(self, preload=[]):
+    def __init__(self, preload=[], vocabulary=None, analysis_cache=None):
         self.cache = {}
+        self.vocabulary = vocabulary
+        self.analysis_cache = analysis_cache
         for (l, w) in preload:
             self.load_wrapper(l, w, cache=True)
 
@@ -63,17 +66,26 @@ class NLPEngine(object):
         for the given language ``language``.
         If ``cache`` is ``True``, the instance will be cached
         for subsequent use.
+
+        If this engine has a ``vocabulary``, the wrapper interns
+        the strings of the tokens it creates with it
+        (see ``lachesis.elements.Vocabulary``).
+        If this engine has an ``analysis_cache``, the wrapper
+        reads and stores its analyses in it
+        (see ``lachesis.nlpwrappers.cache.AnalysisCache``).
         """
         if (language, wrapper) in self.cache:
             return self.cache[(language, wrapper)]
         if wrapper not in self.CODE_TO_CLASS:
             raise ValueError(u"Unknown NLP wrapper code '%s'" % wrapper)
         wrapper_instance = self.CODE_TO_CLASS[wrapper](language)
+        wrapper_instance.vocabulary = self.vocabulary
+        wrapper_instance.analysis_cache = self.analysis_cache
         if cache:
             self.cache[(language, wrapper)] = wrapper_instance
         return wrapper_instance
 
-    def analyze(self, text, wrapper=None, cache=False):
+    def analyze(self, text, wrapper=None, cache=False, chunk_size=None):
         """
         Analyze the given text object ``text``.
 
@@ -82,9 +94,46 @@ class NLPEngine(object):
 
         If ``cache`` is ``True``, the NLP wrapper will be cached
         for subsequent use.
+
+        If ``chunk_size`` is not ``None``, the text is analyzed
+        in chunks of about ``chunk_size`` characters
+        (see ``BaseWrapper.analyze()``).
+        """
+        wrapper_instance = self._find_wrapper(text.language, wrapper, cache)
+        # print(u"Using " + wrapper_instance.CODE)
+        wrapper_instance.analyze(text, chunk_size=chunk_size)
+
+    def analyze_many(self, texts, wrapper=None, cache=False, batch_size=BaseWrapper.BATCH_SIZE, n_process=1):
+        """
+        Analyze the given text objects ``texts``,
+        with the NLP wrapper for their language
+        (see ``analyze()`` for the ``wrapper`` and ``cache`` parameters),
+        ``batch_size`` texts at a time,
+        on ``n_process`` workers (see ``BaseWrapper.analyze_many()``).
+        """
+        texts = list(texts)
+        languages = []
+        for text in texts:
+            if text.language not in languages:
+                languages.append(text.language)
+        for lang in languages:
+            wrapper_instance = self._find_wrapper(lang, wrapper, cache)
+            wrapper_instance.analyze_many(
+                [text for text in texts if text.language == lang],
+                batch_size=batch_size,
+                n_process=n_process
+            )
+
+    def _find_wrapper(self, lang, wrapper, cache):
+        """
+        Return the NLP wrapper with code ``wrapper``
+        for the given language, or, if ``wrapper`` is ``None``,
+        the first cached one for the given language,
+        or the first of ``KNOWN_WRAPPERS`` which can be loaded.
+
+        :raises: ValueError: if no NLP wrapper can be loaded
         """
         wrapper_instance = None
-        lang = text.language
         if wrapper is None:
             for (l, w) in self.cache.keys():
                 if l == lang:
@@ -101,5 +150,4 @@ class NLPEngine(object):
             wrapper_instance = self.load_wrapper(lang, wrapper, cache=cache)
         if wrapper_instance is None:
             raise ValueError(u"Unable to locate a suitable NLP wrapper for language '%s'" % lang)
-        # print(u"Using " + wrapper_instance.CODE)
-        wrapper_instance.analyze(text)
+        return wrapper_instance
@@ -76,20 +76,37 @@ class NLTKWrapper(BaseWrapper):
         from nltk.tokenize import sent_tokenize
         from nltk.tokenize import word_tokenize
         from nltk import pos_tag
+        from nltk import pos_tag_sents
         self.sent_tokenize = sent_tokenize
         self.word_tokenize = word_tokenize
         self.pos_tag = pos_tag
+        self.pos_tag_sents = pos_tag_sents
+
+    @property
+    def version(self):
+        import nltk
+        return u"nltk %s %s" % (nltk.__version__, self.nltk_language)
 
     def _analyze(self, doc_string):
-        sentences = []
-        lib_sentences = self.sent_tokenize(doc_string, language=self.nltk_language)
-        for lib_sentence in lib_sentences:
-            sentence_tokens = []
-            lib_tokens = self.word_tokenize(lib_sentence, language=self.nltk_language)
-            tagged_tokens = self.pos_tag(lib_tokens, tagset="universal")
-            for lib_token in tagged_tokens:
-                raw, upos_tag = lib_token
-                token = self._create_token(raw, upos_tag)
-                sentence_tokens.append(token)
-            sentences.append(sentence_tokens)
-        return sentences
+        return self._analyze_batch([doc_string])[0]
+
+    def _analyze_batch(self, doc_strings, n_process=1):
+        # tokenize each document, then tag the sentences
+        # of all the documents with a single tagger
+        lib_documents = []
+        for doc_string in doc_strings:
+            lib_sentences = self.sent_tokenize(doc_string, language=self.nltk_language)
+            lib_documents.append([self.word_tokenize(lib_sentence, language=self.nltk_language) for lib_sentence in lib_sentences])
+        tagged_sentences = iter(self.pos_tag_sents([s for d in lib_documents for s in d], tagset="universal"))
+        outputs = []
+        for lib_sentences in lib_documents:
+            sentences = []
+            for i in range(len(lib_sentences)):
+                sentence_tokens = []
+                for lib_token in next(tagged_sentences):
+                    raw, upos_tag = lib_token
+                    token = self._create_token(raw, upos_tag)
+                    sentence_tokens.append(token)
+                sentences.append(sentence_tokens)
+            outputs.append(sentences)
+        return outputs
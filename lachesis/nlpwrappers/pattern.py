@@ -149,3 +149,8 @@ class PatternWrapper(BaseWrapper):
                 sentence_tokens.append(token)
             sentences.append(sentence_tokens)
         return sentences
+
+    @property
+    def version(self):
+        import pattern
+        return u"pattern %s" % getattr(pattern, "__version__", u"")
@@ -52,6 +52,8 @@ class SpacyWrapper(BaseWrapper):
 
     LANGUAGES = LANGUAGE_TO_SPACY_CODE.keys()
 
+    PARALLEL_BATCHING = True
+
     def __init__(self, language, model_file_path=None):
         super(SpacyWrapper, self).__init__(language)
         import spacy
@@ -61,10 +63,41 @@ class SpacyWrapper(BaseWrapper):
             self.nlp = spacy.load(self.LANGUAGE_TO_SPACY_CODE[self.language], path=model_file_path)
         except RuntimeError:
             raise ValueError(u"Unable to load model from file path '%s'. Please specify a valid path with the 'model_file_path' parameter." % model_file_path)
+        self.model_file_path = model_file_path
+
+    @property
+    def version(self):
+        import spacy
+        # the model version, if the model has metadata (spaCy 2+)
+        meta = getattr(self.nlp, "meta", None) or {}
+        model = u"%s %s" % (meta.get("name", u""), meta.get("version", u""))
+        return u"spacy %s %s %s" % (getattr(spacy, "__version__", u""), model, self.model_file_path)
+
+    def _worker_arguments(self):
+        return {"model_file_path": self.model_file_path}
 
     def _analyze(self, doc_string):
+        return self._lib_doc_sentences(self.nlp(doc_string))
+
+    def _analyze_batch(self, doc_strings, n_process=1):
+        return list(self._analyze_stream(doc_strings, len(doc_strings), n_process=n_process))
+
+    def _analyze_stream(self, doc_strings, batch_size, n_process=1):
+        # spaCy processes all the strings with a single pipe(),
+        # on n_process processes (spaCy 2.2+) or threads (older versions)
+        arguments = {"batch_size": batch_size}
+        if n_process > 1:
+            try:
+                lib_docs = self.nlp.pipe(doc_strings, n_process=n_process, **arguments)
+            except TypeError:
+                lib_docs = self.nlp.pipe(doc_strings, n_threads=n_process, **arguments)
+        else:
+            lib_docs = self.nlp.pipe(doc_strings, **arguments)
+        for lib_doc in lib_docs:
+            yield self._lib_doc_sentences(lib_doc)
+
+    def _lib_doc_sentences(self, lib_doc):
         sentences = []
-        lib_doc = self.nlp(doc_string)
         for lib_sentence in lib_doc.sents:
             sentence_tokens = []
             for lib_word in lib_sentence:
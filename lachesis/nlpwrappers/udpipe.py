@@ -35,6 +35,11 @@ from lachesis.nlpwrappers.base import BaseWrapper
 class UDPipeWrapper(BaseWrapper):
     """
     TBW
+
+    Each document is tokenized and tagged;
+    the dependency parsing, whose output lachesis does not use,
+    runs only if ``STAGE_PARSE`` is in the given ``stages``.
+    The tokenizer is created once per wrapper.
     """
 
     CODE = u"udpipe"
@@ -86,9 +91,32 @@ class UDPipeWrapper(BaseWrapper):
 
     LANGUAGES = LANGUAGE_TO_MODEL_FILE.keys()
 
-    def __init__(self, language, model_file_path=None):
+    STAGE_TOKENIZE = u"tokenize"
+    """ Split the text into sentences and tokens """
+
+    STAGE_TAG = u"tag"
+    """ Assign POS tags and lemmas to the tokens """
+
+    STAGE_PARSE = u"parse"
+    """ Parse the dependencies of the tokens (not used by lachesis) """
+
+    ALL_STAGES = [STAGE_TOKENIZE, STAGE_TAG, STAGE_PARSE]
+    """ The stages of the UDPipe pipeline, in order """
+
+    REQUIRED_STAGES = [STAGE_TOKENIZE, STAGE_TAG]
+    """ The stages producing the tokens, their POS tags and lemmas """
+
+    STAGES = REQUIRED_STAGES
+    """ Default stages: lachesis does not use the dependencies """
+
+    def __init__(self, language, model_file_path=None, stages=STAGES):
         super(UDPipeWrapper, self).__init__(language)
         import ufal.udpipe
+        if (
+            (not set(stages) <= set(self.ALL_STAGES)) or
+            (not set(self.REQUIRED_STAGES) <= set(stages))
+        ):
+            raise ValueError(u"The stages must include %s, and be among %s." % (self.REQUIRED_STAGES, self.ALL_STAGES))
         if model_file_path is None:
             model_file_path = os.path.join(
                 self.MODEL_FILES_DIRECTORY_PATH,
@@ -97,28 +125,42 @@ class UDPipeWrapper(BaseWrapper):
         self.model = ufal.udpipe.Model.load(model_file_path)
         if not self.model:
             raise ValueError(u"Unable to load model from file path '%s'. Please specify a valid path with the 'model_file_path' parameter." % model_file_path)
+        self.model_file_path = model_file_path
+        self.stages = [s for s in self.ALL_STAGES if s in stages]
+        # reused by each analysis
+        self.tokenizer = self.model.newTokenizer(self.model.DEFAULT)
+        if not self.tokenizer:
+            raise ValueError(u"The model in file path '%s' does not have a tokenizer." % model_file_path)
+        self.error = ufal.udpipe.ProcessingError()
+
+    @property
+    def version(self):
+        # the dependencies do not change the tokens
+        return u"udpipe %s" % os.path.basename(self.model_file_path)
+
+    def _worker_arguments(self):
+        return {"model_file_path": self.model_file_path, "stages": self.stages}
 
     def _analyze(self, doc_string):
-        sentences = []
         import ufal.udpipe
-        tokenizer = self.model.newTokenizer(self.model.DEFAULT)
-        if not tokenizer:
-            raise Exception("The model does not have a tokenizer.")
-        tokenizer.setText(doc_string)
-        error = ufal.udpipe.ProcessingError()
+        self.tokenizer.setText(doc_string)
         lib_sentences = []
         lib_sentence = ufal.udpipe.Sentence()
-        while tokenizer.nextSentence(lib_sentence, error):
+        while self.tokenizer.nextSentence(lib_sentence, self.error):
             lib_sentences.append(lib_sentence)
             lib_sentence = ufal.udpipe.Sentence()
-        if error.occurred():
-            raise Exception(error.message)
+        if self.error.occurred():
+            message = self.error.message
+            self.error = ufal.udpipe.ProcessingError()
+            raise Exception(message)
+        parse = self.STAGE_PARSE in self.stages
+        sentences = []
         for lib_sentence in lib_sentences:
-            sentence_tokens = []
             self.model.tag(lib_sentence, self.model.DEFAULT)
-            self.model.parse(lib_sentence, self.model.DEFAULT)
-            lib_useful_tokens = [w for w in lib_sentence.words if w.form != u"<root>"]
-            for lib_token in lib_useful_tokens:
+            if parse:
+                self.model.parse(lib_sentence, self.model.DEFAULT)
+            sentence_tokens = []
+            for lib_token in lib_sentence.words:
                 if lib_token.form != u"<root>":
                     token = self._create_token(lib_token.form, lib_token.upostag, lemma=lib_token.lemma)
                     sentence_tokens.append(token)
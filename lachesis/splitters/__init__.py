@@ -22,5 +22,7 @@
 TBW
 """
 
+from lachesis.splitters.base import split_many
 from lachesis.splitters.greedy import GreedySplitter
 from lachesis.splitters.crf import CRFSplitter
+from lachesis.splitters.optimal import OptimalSplitter
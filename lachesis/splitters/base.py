@@ -24,9 +24,15 @@ TBW
 
 from __future__ import absolute_import
 from __future__ import print_function
+import multiprocessing
+import multiprocessing.pool
 
+from lachesis.elements import Document
 from lachesis.elements import Span
+from lachesis.elements import SpanView
+from lachesis.elements import StoredTokens
 from lachesis.language import Language
+from lachesis.memory import records_high_water_mark
 
 
 class BaseSplitter(object):
@@ -51,6 +57,15 @@ class BaseSplitter(object):
     MAX_NUM_LINES = 2
     """ Maximum number of CC lines. Set to -1 to ignore. """
 
+    POOL_PROCESS = u"process"
+    """ Split the sentences in parallel with a pool of processes """
+
+    POOL_THREAD = u"thread"
+    """ Split the sentences in parallel with a pool of threads """
+
+    CHUNK_SIZE = 8
+    """ Number of sentences sent to a worker at once """
+
     def __init__(self, language, max_chars_per_line=MAX_CHARS_PER_LINE, max_num_lines=MAX_NUM_LINES):
         self.max_chars_per_line = max_chars_per_line
         self.max_num_lines = max_num_lines
@@ -111,6 +126,79 @@ class BaseSplitter(object):
             grouped_tokens.append(current_group)
         return [(l, sum([len(ll.raw) for ll in l])) for l in grouped_tokens]
 
+    def _regular_tokens(self, sentence_span):
+        """
+        Return the regular tokens of the given sentence,
+        as a list or, if the sentence is a view over a token store,
+        as a ``StoredTokens`` object.
+        """
+        elements = sentence_span.elements
+        if isinstance(elements, StoredTokens):
+            return elements.regular()
+        return [t for t in elements if t.is_regular]
+
+    def _token_lengths(self, tokens):
+        """
+        Return the lists of the lengths of the strings
+        and of the trailing whitespace flags of the given tokens,
+        read from the columns of the store, if possible.
+        """
+        if isinstance(tokens, StoredTokens):
+            return tokens.lengths(), tokens.trailing_whitespaces()
+        return [len(t.raw) for t in tokens], [t.trailing_whitespace for t in tokens]
+
+    def _group_arrays(self, tokens):
+        """
+        Given a list of regular Token objects ``tokens``,
+        grouped as in ``_group_tokens()``,
+        return a ``(begins, lengths, widths)`` tuple of lists,
+        holding for each group the index of its first token,
+        the length of its tokens without the trailing whitespace,
+        and with the trailing whitespace.
+        """
+        begins = []
+        lengths = []
+        widths = []
+        new_group = True
+        token_lengths, wses = self._token_lengths(tokens)
+        for i, (length, ws) in enumerate(zip(token_lengths, wses)):
+            if new_group:
+                begins.append(i)
+                lengths.append(length)
+                widths.append(length)
+            else:
+                lengths[-1] += length
+                widths[-1] += length
+            if ws:
+                widths[-1] += 1
+            new_group = ws
+        return begins, lengths, widths
+
+    def _cumulative_lengths(self, tokens):
+        """
+        Return the list of the cumulative lengths
+        of the augmented strings of the given tokens,
+        starting with 0.
+        """
+        cumulative = [0]
+        token_lengths, wses = self._token_lengths(tokens)
+        for length, ws in zip(token_lengths, wses):
+            cumulative.append(cumulative[-1] + length + (1 if ws else 0))
+        return cumulative
+
+    def _line_length(self, tokens, begin, end, cumulative):
+        """
+        Return the length of the stripped string of ``tokens[begin:end]``,
+        given the cumulative lengths of the augmented token strings.
+        """
+        first = tokens[begin].augmented_string
+        last = tokens[end - 1].augmented_string
+        if (len(first.strip()) > 0) and (len(last.strip()) > 0):
+            leading = len(first) - len(first.lstrip())
+            trailing = len(last) - len(last.rstrip())
+            return cumulative[end] - cumulative[begin] - leading - trailing
+        return len(SpanView(tokens, begin, end).string().strip())
+
     def _split_sentence(self, sentence_span):
         """
         TBW
@@ -120,12 +208,187 @@ class BaseSplitter(object):
         """
         raise NotImplementedError(u"This method should be implemented in a subclass.")
 
-    def split(self, document):
+    def _split_sentence_positions(self, sentence_span):
+        """
+        Split the given sentence, returning the positions
+        in the sentence of the tokens of each line of each CC,
+        which a worker process sends back instead of the tokens.
+        """
+        return _positions_from_ccs(_token_positions(sentence_span), self._split_sentence(sentence_span))
+
+    def _ccs_from_positions(self, sentence_span, positions):
+        """
+        Return the CCs of the given sentence
+        from the positions returned by ``_split_sentence_positions()``.
+        """
+        return _ccs_from_positions(sentence_span, positions)
+
+    def _iter_sentence_ccs(self, sentences, jobs=1, pool=POOL_PROCESS, chunk_size=CHUNK_SIZE):
+        """
+        Split the given iterable of sentence Span objects,
+        yielding the list of the CCs of each sentence
+        (see ``iter_ccs()``).
+        """
+        if jobs <= 1:
+            for sentence_span in sentences:
+                yield self._split_sentence(sentence_span)
+            return
+        if pool == self.POOL_THREAD:
+            workers = multiprocessing.pool.ThreadPool(processes=jobs)
+        elif pool == self.POOL_PROCESS:
+            workers = multiprocessing.Pool(processes=jobs, initializer=_init_split_worker, initargs=(self,))
+        else:
+            raise ValueError(u"Unknown pool type '%s'" % pool)
+        try:
+            # NOTE: the pool consumes its input eagerly,
+            #       so feed it a batch of sentences at a time
+            for batch in _batches(sentences, jobs * chunk_size * 4):
+                if pool == self.POOL_THREAD:
+                    results = workers.imap(self._split_sentence, batch, chunk_size)
+                else:
+                    # the workers return the positions of the tokens in the sentence,
+                    # so that the CCs are rebuilt with the original tokens
+                    results = workers.imap(_split_sentence_worker, batch, chunk_size)
+                    results = (self._ccs_from_positions(batch[i], positions) for i, positions in enumerate(results))
+                for ccs in results:
+                    yield ccs
+            workers.close()
+        finally:
+            workers.terminate()
+            workers.join()
+
+    def iter_ccs(self, sentences, jobs=1, pool=POOL_PROCESS, chunk_size=CHUNK_SIZE):
+        """
+        Split the given sentences, yielding each CC (Span object)
+        as soon as the sentence containing it has been split.
+
+        ``sentences`` is either a Document object,
+        whose sentences are split, or an iterable of sentence Span objects,
+        which is consumed lazily (e.g., a generator).
+        Unlike ``split()``, the CCs are not stored anywhere.
+
+        If ``jobs`` is greater than one, the sentences are split
+        by a pool of ``jobs`` workers, either processes (``POOL_PROCESS``)
+        or threads (``POOL_THREAD``), and the CCs are yielded
+        in the same order and with the same tokens as with a single worker.
+        Each worker process gets a copy of this splitter,
+        and keeps its models loaded until the end of the iteration.
+        """
+        if isinstance(sentences, Document):
+            sentences = sentences.sentences
+        for ccs in self._iter_sentence_ccs(sentences, jobs=jobs, pool=pool, chunk_size=chunk_size):
+            for cc in ccs:
+                yield cc
+
+    @records_high_water_mark(u"split")
+    def split(self, document, jobs=1, pool=POOL_PROCESS):
         """
         TBW
+
+        See ``iter_ccs()`` for the ``jobs`` and ``pool`` parameters.
+
+        The high-water mark of the splitting is recorded
+        in the document (see ``Document.memory_report()``).
         """
         ccs_view = Span()
-        for sentence_span in document.sentences:
-            ccs = self._split_sentence(sentence_span)
-            ccs_view.extend(ccs)
+        ccs_view.extend(self.iter_ccs(document, jobs=jobs, pool=pool))
         document.ccs_view = ccs_view
+
+    def split_documents(self, documents, jobs=1, pool=POOL_PROCESS):
+        """
+        Split each of the given documents, as ``split()`` does,
+        feeding the sentences of all the documents
+        to a single stream (and pool of workers, if ``jobs`` is greater than one).
+        """
+        documents = list(documents)
+        views = [Span() for d in documents]
+        owners = [i for i, d in enumerate(documents) for s in d.sentences]
+        sentences = (s for d in documents for s in d.sentences)
+        for i, ccs in zip(owners, self._iter_sentence_ccs(sentences, jobs=jobs, pool=pool)):
+            views[i].extend(ccs)
+        for document, ccs_view in zip(documents, views):
+            document.ccs_view = ccs_view
+
+
+# the splitter of the current worker process
+_SPLITTER = None
+
+
+def _init_split_worker(splitter):
+    global _SPLITTER
+    _SPLITTER = splitter
+
+
+def _batches(iterable, size):
+    batch = []
+    for obj in iterable:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def _split_sentence_worker(sentence_span):
+    return _SPLITTER._split_sentence_positions(sentence_span)
+
+
+def _token_positions(sentence_span):
+    return dict([(id(e), i) for i, e in enumerate(sentence_span.elements)])
+
+
+def _positions_from_ccs(position, ccs):
+    return [[[position[id(t)] for t in line.elements] for line in cc.elements] for cc in ccs]
+
+
+def _ccs_from_positions(sentence_span, positions):
+    elements = sentence_span.elements
+    if isinstance(elements, StoredTokens):
+        return [Span(elements=[Span(elements=elements.take(line)) for line in cc]) for cc in positions]
+    return [Span(elements=[Span(elements=[elements[i] for i in line]) for line in cc]) for cc in positions]
+
+
+class _SplitterGroup(BaseSplitter):
+    """
+    Split each sentence with several splitters,
+    returning the list of the CCs of each splitter.
+    """
+
+    def __init__(self, splitters):
+        self.splitters = splitters
+
+    def _split_sentence(self, sentence_span):
+        return [splitter._split_sentence(sentence_span) for splitter in self.splitters]
+
+    def _split_sentence_positions(self, sentence_span):
+        position = _token_positions(sentence_span)
+        return [_positions_from_ccs(position, ccs) for ccs in self._split_sentence(sentence_span)]
+
+    def _ccs_from_positions(self, sentence_span, positions):
+        return [_ccs_from_positions(sentence_span, p) for p in positions]
+
+
+def split_many(document, splitters, jobs=1, pool=BaseSplitter.POOL_PROCESS):
+    """
+    Split the given (analyzed) document with each of the given splitters
+    (e.g., with different ``max_chars_per_line`` and ``max_num_lines``),
+    in a single pass over its sentences,
+    and return the list of the forks of the document
+    (see ``Document.fork()``), one for each splitter,
+    with the CCs created by that splitter.
+
+    See ``BaseSplitter.iter_ccs()`` for the ``jobs`` and ``pool`` parameters.
+    """
+    splitters = list(splitters)
+    views = [Span() for splitter in splitters]
+    group = _SplitterGroup(splitters)
+    for results in group._iter_sentence_ccs(document.sentences, jobs=jobs, pool=pool):
+        for ccs_view, ccs in zip(views, results):
+            ccs_view.extend(ccs)
+    forks = []
+    for ccs_view in views:
+        fork = document.fork()
+        fork.ccs_view = ccs_view
+        forks.append(fork)
+    return forks
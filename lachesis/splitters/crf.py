@@ -27,10 +27,11 @@ from __future__ import print_function
 import os
 
 from lachesis.elements import Span
-from lachesis.elements import Token
+from lachesis.elements import SpanView
 from lachesis.language import Language
-from lachesis.ml import CRFPredictor
 from lachesis.ml import CRFTrainer
+from lachesis.ml import DEFAULT_REGISTRY
+from lachesis.ml.lattice import CRFLineScorer
 from lachesis.splitters.base import BaseSplitter
 
 
@@ -56,9 +57,12 @@ class CRFSplitter(BaseSplitter):
 
     LANGUAGES = LANGUAGE_TO_MODEL_FILE.keys()
 
-    def __init__(self, language, max_chars_per_line=BaseSplitter.MAX_CHARS_PER_LINE, max_num_lines=BaseSplitter.MAX_NUM_LINES, model_file_path=None):
+    def __init__(self, language, max_chars_per_line=BaseSplitter.MAX_CHARS_PER_LINE, max_num_lines=BaseSplitter.MAX_NUM_LINES, model_file_path=None, registry=None):
         super(CRFSplitter, self).__init__(language, max_chars_per_line, max_num_lines)
         self.model_file_path = model_file_path
+        # the registry holding the opened CRF models,
+        # shared by default among all the splitters of this process
+        self.registry = DEFAULT_REGISTRY if registry is None else registry
         if self.model_file_path is None:
             # first, check the language
             self._check_language()
@@ -74,17 +78,35 @@ class CRFSplitter(BaseSplitter):
 
         def _select_best_split(candidates):
             #
-            # each candidate tuple is: (begin_idx, end_idx, labels, probability)
+            # each candidate tuple is: (begin_idx, end_idx, last_label, probability)
             #
             # first, sort by the label of the last token
             # to put the candidates with LABEL_LAST first
-            candidates = sorted(candidates, key=lambda x: (1 if x[2][-1] == CRFTrainer.LABEL_LAST else 0), reverse=True)
+            candidates = sorted(candidates, key=lambda x: (1 if x[2] == CRFTrainer.LABEL_LAST else 0), reverse=True)
             # then, sort by probability and end index
             # to put most probable and most long candidates first
             candidates = sorted(candidates, key=lambda x: (x[3], x[1]), reverse=True)
             # print(u"Sorted: %s" % str(candidates))
             return candidates[0]
 
+        def _best_end(predictor, scorer, begin, ends):
+            #
+            # score all the candidate lines in one pass,
+            # then ask the tagger for the exact probability
+            # of the candidates too close to the best one
+            # to be told apart by the lattice
+            #
+            scores = scorer.score(begin, ends)
+            threshold = max([lp - err for end, label, lp, err in scores])
+            contenders = [x for x in scores if x[2] + x[3] >= threshold]
+            if len(contenders) == 1:
+                return contenders[0][0]
+            candidates = []
+            for end, label, lp, err in contenders:
+                p_labels, p_probability = predictor.predict(SpanView(tokens, begin, end))
+                candidates.append((begin, end, p_labels[-1], p_probability))
+            return _select_best_split(candidates)[1]
+
         # check for e.g. "(applause)" or similar OTHER fragments
         if self._is_cc_other(sentence_span):
             line = Span(elements=sentence_span.elements)
@@ -92,7 +114,7 @@ class CRFSplitter(BaseSplitter):
             return [cc]
 
         # otherwise, process it
-        tokens = [t for t in sentence_span.elements if t.is_regular]
+        tokens = self._regular_tokens(sentence_span)
         clean_sentence_span = Span(elements=tokens)
 
         # if the tokens fit into a single line,
@@ -101,46 +123,39 @@ class CRFSplitter(BaseSplitter):
             return [Span(elements=[clean_sentence_span])]
 
         # we actually need to create more than one line
-        # load the CRF model
-        predictor = CRFPredictor(self.model_file_path)
+        # get the CRF model, loading it only if not already in the registry
+        predictor = self.registry.get(self.model_file_path)
+        scorer = CRFLineScorer(predictor.lattice, predictor.extractor, tokens)
         n = len(tokens)
+        cumulative = self._cumulative_lengths(tokens)
         ccs = []
         line_spans = []
-        current_line_span = Span()
-        candidates = []
-        current_line_start_idx = 0
-        idx = 0
-        while idx < n:
-            # checking if the current sublist of tokens fits in one line
-            current_line_span = Span(elements=tokens[current_line_start_idx:idx+1])
-            aug_s = current_line_span.string().strip()
-            if len(aug_s) <= self.max_chars_per_line:
-                # yes, label the current sublist of tokens
-                p_labels, p_probability = predictor.predict(current_line_span)
-                candidate = (current_line_start_idx, idx + 1, p_labels, p_probability)
-                # print(u"  New candidate: %s" % str(candidate))
-                candidates.append(candidate)
+        begin = 0
+        while begin < n:
+            # NOTE: a one-token line is a candidate only at the begin of the sentence
+            end = begin + 1 if begin == 0 else begin + 2
+            ends = []
+            while (end <= n) and (self._line_length(tokens, begin, end, cumulative) <= self.max_chars_per_line):
+                ends.append(end)
+                end += 1
+            if end > n:
+                # the rest of the sentence fits in one line
+                break
+            if len(ends) == 0:
+                # not even the shortest candidate fits, make it a line anyway
+                chosen = begin + 1
             else:
-                # no, the current sublist would be too long
-                # select best split among the candidates seen so far
-                chosen = _select_best_split(candidates)
-                # print(u"Chosen candidate: %s" % str(chosen))
-                chosen_line = Span(elements=tokens[chosen[0]:chosen[1]])
-                line_spans.append(chosen_line)
-                if len(line_spans) >= self.max_num_lines:
-                    # we fill the cc, add it
-                    ccs.append(Span(elements=line_spans))
-                    line_spans = []
-                # reset
-                candidates = []
-                current_line_span = Span()
-                current_line_start_idx = chosen[1]
-                idx = chosen[1]
-            idx += 1
-
-        if current_line_start_idx < n:
+                chosen = _best_end(predictor, scorer, begin, ends)
+            line_spans.append(SpanView(tokens, begin, chosen))
+            if len(line_spans) >= self.max_num_lines:
+                # we fill the cc, add it
+                ccs.append(Span(elements=line_spans))
+                line_spans = []
+            begin = chosen
+
+        if begin < n:
             # we need to add the end of the sentence
-            line_spans.append(Span(elements=tokens[current_line_start_idx:]))
+            line_spans.append(SpanView(tokens, begin))
             ccs.append(Span(elements=line_spans))
 
         return ccs
@@ -26,7 +26,7 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 from lachesis.elements import Span
-from lachesis.elements import Token
+from lachesis.elements import SpanView
 from lachesis.language import Language
 from lachesis.splitters.base import BaseSplitter
 
@@ -47,24 +47,30 @@ class GreedySplitter(BaseSplitter):
             cc = Span(elements=[line])
             return [cc]
 
-        # otherwise, process it
+        # otherwise, process it,
+        # working on the lengths of the groups of tokens
+        # and building the Span objects of the final lines only
+        tokens = self._regular_tokens(sentence_span)
+        begins, lengths, widths = self._group_arrays(tokens)
+        max_chars_per_line = self.max_chars_per_line
         ccs = []
         line_spans = []
-        current_line_span = Span()
-        for g_tokens, g_len in self._group_tokens(sentence_span.elements):
-            c_len = len(current_line_span.string(raw=True))
-            if c_len + g_len > self.max_chars_per_line:
+        line_begin = 0
+        c_len = 0
+        for g_begin, g_len, g_width in zip(begins, lengths, widths):
+            if c_len + g_len > max_chars_per_line:
                 # close current line and open a new one
-                line_spans.append(current_line_span)
+                line_spans.append(SpanView(tokens, line_begin, g_begin))
                 if len(line_spans) == self.max_num_lines:
                     # close current cc and open a new one
                     ccs.append(Span(elements=line_spans))
                     line_spans = []
                 # create a new line
-                current_line_span = Span()
+                line_begin = g_begin
+                c_len = 0
             # append to current line
-            current_line_span.extend(g_tokens)
+            c_len += g_width
         # append last line and close cc
-        line_spans.append(current_line_span)
+        line_spans.append(SpanView(tokens, line_begin))
         ccs.append(Span(elements=line_spans))
         return ccs
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+TBW
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import math
+
+from lachesis.elements import Span
+from lachesis.elements import SpanView
+from lachesis.language import Language
+from lachesis.nlpwrappers.upostags import UniversalPOSTags
+from lachesis.splitters.base import BaseSplitter
+
+
+class BreakCosts(object):
+    """
+    Compute the cost of breaking a line after each token of a sentence.
+    """
+
+    def break_costs(self, tokens):
+        """
+        Return the list of the costs of breaking a line
+        after each of the given tokens.
+        """
+        raise NotImplementedError(u"This method must be implemented in a subclass")
+
+    def line_break_costs(self, tokens):
+        """
+        Return a function ``cost(begin, end)`` returning the cost
+        of breaking the line ``tokens[begin:end]`` after its last token.
+
+        By default the cost does not depend on the begin of the line,
+        and it is given by ``break_costs()``.
+        """
+        costs = self.break_costs(tokens)
+        return lambda begin, end: costs[end - 1]
+
+
+class POSBreakCosts(BreakCosts):
+    """
+    Compute the cost of breaking a line after each token
+    with simple rules on the POS tags:
+    break after punctuation, or before a conjunction or an adposition,
+    but never before punctuation or inside a word
+    (i.e., after a token without trailing whitespace).
+    """
+
+    NO_BREAK_COST = 1000.0
+    """ Cost of a break which should never happen """
+
+    DEFAULT_COST = 1.0
+    """ Cost of a break after a token not covered by the rules """
+
+    AFTER_COSTS = {
+        UniversalPOSTags.PUNCT: 0.0,
+        UniversalPOSTags.PUNCT_1: 0.0,
+        UniversalPOSTags.ADP: 3.0,
+        UniversalPOSTags.CCONJ: 3.0,
+        UniversalPOSTags.CONJ: 3.0,
+        UniversalPOSTags.DET: 3.0,
+        UniversalPOSTags.PART: 2.0,
+        UniversalPOSTags.PART_1: 2.0,
+        UniversalPOSTags.SCONJ: 3.0,
+        UniversalPOSTags.AUX: 2.0,
+        UniversalPOSTags.PRON: 2.0,
+    }
+    """ Cost of a break after a token, by its POS tag """
+
+    BEFORE_COSTS = {
+        UniversalPOSTags.ADP: -0.5,
+        UniversalPOSTags.CCONJ: -0.5,
+        UniversalPOSTags.CONJ: -0.5,
+        UniversalPOSTags.SCONJ: -0.5,
+    }
+    """ Correction of the cost of a break before a token, by its POS tag """
+
+    def break_costs(self, tokens):
+        """
+        Return the list of the costs of breaking a line
+        after each of the given tokens.
+        """
+        costs = []
+        for i, token in enumerate(tokens):
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if following is None:
+                costs.append(0.0)
+            elif (not token.trailing_whitespace) or (following.upos_tag in [UniversalPOSTags.PUNCT, UniversalPOSTags.PUNCT_1]):
+                costs.append(self.NO_BREAK_COST)
+            else:
+                cost = self.AFTER_COSTS.get(token.upos_tag, self.DEFAULT_COST) + self.BEFORE_COSTS.get(following.upos_tag, 0.0)
+                costs.append(max(cost, 0.0))
+        return costs
+
+
+class CRFBreakCosts(BreakCosts):
+    """
+    Compute the cost of breaking a line after each token
+    as the negative log of the marginal probability
+    of the token being the last of a line,
+    according to a CRF model tagging the tokens from the begin of the line
+    to the end of the sentence, since the features of a token
+    (e.g., its index and the cumulative lengths) are relative
+    to the begin of its line.
+    """
+
+    MIN_PROBABILITY = 1e-6
+    """ Floor of the marginal probabilities, to keep the costs finite """
+
+    def __init__(self, model_file_path, registry=None):
+        # NOTE: imported here, as pycrfsuite is an optional dependency
+        from lachesis.ml import CRFTrainer
+        from lachesis.ml import DEFAULT_REGISTRY
+        self.model_file_path = model_file_path
+        self.registry = DEFAULT_REGISTRY if registry is None else registry
+        self.label = CRFTrainer.LABEL_LAST
+
+    def break_costs(self, tokens):
+        """
+        Return the list of the costs of breaking a line
+        after each of the given tokens.
+        """
+        predictor = self.registry.get(self.model_file_path)
+        marginals = predictor.marginals(Span(elements=tokens), self.label)
+        return [-math.log(max(p, self.MIN_PROBABILITY)) for p in marginals]
+
+    def line_break_costs(self, tokens):
+        """
+        Return a function ``cost(begin, end)`` returning the cost
+        of breaking the line ``tokens[begin:end]`` after its last token,
+        tagging the tokens from ``begin`` once for each ``begin``.
+        """
+        costs = {}
+
+        def cost(begin, end):
+            if begin not in costs:
+                costs[begin] = self.break_costs(tokens[begin:])
+            return costs[begin][end - 1 - begin]
+        return cost
+
+
+class OptimalSplitter(BaseSplitter):
+    """
+    A splitter choosing all the line breaks of a sentence at once,
+    minimizing the total cost of the breaks
+    under the ``max_chars_per_line`` and ``max_num_lines`` constraints.
+
+    The cost of breaking each candidate line after its last token
+    is computed by ``costs`` (a ``BreakCosts`` object),
+    by default ``CRFBreakCosts`` if ``model_file_path`` is given,
+    or ``POSBreakCosts`` otherwise.
+    Each line adds ``LINE_COST``, and a break closing a CC
+    counts ``CC_BREAK_WEIGHT`` times the cost of a break between lines,
+    so a CC might have fewer than ``max_num_lines`` lines
+    if this allows better breaks.
+
+    The dynamic programming takes ``O(n * w * m)`` time
+    for a sentence of ``n`` tokens, with at most ``w`` tokens per line
+    and ``m = max_num_lines``,
+    plus the tagging of the rest of the sentence
+    from each line begin with ``CRFBreakCosts``.
+    """
+
+    CODE = u"optimal"
+
+    LANGUAGES = Language.ALL_LANGUAGES
+
+    LINE_COST = 1.0
+    """ Cost of each line, favoring fewer lines """
+
+    CC_BREAK_WEIGHT = 2.0
+    """ Weight of the cost of a break closing a CC """
+
+    def __init__(self, language, max_chars_per_line=BaseSplitter.MAX_CHARS_PER_LINE, max_num_lines=BaseSplitter.MAX_NUM_LINES, costs=None, model_file_path=None, registry=None):
+        super(OptimalSplitter, self).__init__(language, max_chars_per_line, max_num_lines)
+        if costs is None:
+            if model_file_path is not None:
+                costs = CRFBreakCosts(model_file_path, registry=registry)
+            else:
+                costs = POSBreakCosts()
+        self.costs = costs
+
+    def _split_sentence(self, sentence_span):
+        # check for e.g. "(applause)" or similar OTHER fragments
+        if self._is_cc_other(sentence_span):
+            line = Span(elements=sentence_span.elements)
+            cc = Span(elements=[line])
+            return [cc]
+
+        # otherwise, process it
+        tokens = self._regular_tokens(sentence_span)
+        clean_sentence_span = Span(elements=tokens)
+
+        # if the tokens fit into a single line,
+        # create a CC with one line and return it
+        if (self.max_chars_per_line < 0) or (len(clean_sentence_span.string()) <= self.max_chars_per_line):
+            return [Span(elements=[clean_sentence_span])]
+
+        n = len(tokens)
+        cumulative = self._cumulative_lengths(tokens)
+        break_cost = self.costs.line_break_costs(tokens)
+        # number of lines per CC, or a single state if unbounded
+        m = self.max_num_lines if self.max_num_lines > 0 else 1
+        closing_weight = self.CC_BREAK_WEIGHT if self.max_num_lines > 0 else 1.0
+
+        # opened[end][k] is the minimum cost of splitting tokens[0:end]
+        # with a line ending at end being the (k+1)-th line of its CC
+        # and not closing it, closed[end] the minimum cost
+        # with a line ending at end closing its CC,
+        # both including the cost of the break after that line,
+        # and back_opened[end][k] and back_closed[end] the line
+        # they end with, as a (begin, k, previous) tuple,
+        # where previous is the k of the line before it if not closing its CC
+        infinity = float("inf")
+        opened = [[infinity] * m for i in range(n + 1)]
+        closed = [infinity] * (n + 1)
+        back_opened = [[None] * m for i in range(n + 1)]
+        back_closed = [None] * (n + 1)
+        closed[0] = 0.0
+        for begin in range(n):
+            # the (k, cost, previous) of the lines which can start at begin
+            sources = [(0, closed[begin], None)] if closed[begin] < infinity else []
+            sources.extend([(k + 1, opened[begin][k], k) for k in range(m - 1) if opened[begin][k] < infinity])
+            if len(sources) == 0:
+                continue
+            # the candidate lines starting at begin,
+            # with at least one token even if it is too long
+            end = begin + 1
+            while end <= n:
+                if (end > begin + 1) and (self._line_length(tokens, begin, end, cumulative) > self.max_chars_per_line):
+                    break
+                # no break after the last line
+                cost = break_cost(begin, end) if end < n else 0.0
+                for k, source_cost, previous in sources:
+                    # close the CC after this line
+                    total = source_cost + self.LINE_COST + closing_weight * cost
+                    if total < closed[end]:
+                        closed[end] = total
+                        back_closed[end] = (begin, k, previous)
+                    # or continue it with the next line
+                    if k + 1 < m:
+                        total = source_cost + self.LINE_COST + cost
+                        if total < opened[end][k]:
+                            opened[end][k] = total
+                            back_opened[end][k] = (begin, k, previous)
+                end += 1
+
+        # backtrack from the last line, closing the last CC
+        lines = []
+        end = n
+        state = None
+        while end > 0:
+            begin, k, previous = back_closed[end] if state is None else back_opened[end][state]
+            lines.append((begin, end, k))
+            end, state = begin, previous
+        lines.reverse()
+
+        # group the lines into CCs
+        ccs = []
+        line_spans = []
+        for begin, end, k in lines:
+            if (k == 0) and (self.max_num_lines > 0) and (len(line_spans) > 0):
+                ccs.append(Span(elements=line_spans))
+                line_spans = []
+            line_spans.append(SpanView(tokens, begin, end))
+        ccs.append(Span(elements=line_spans))
+        return ccs
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from lachesis.benchmarks.synthetic import SyntheticCorpus
+from lachesis.elements import Span
+from lachesis.language import Language
+from lachesis.ml import CRFModelRegistry
+from lachesis.ml import CRFPredictor
+from lachesis.ml import CRFTrainer
+from lachesis.ml.features import columns_from_tokens
+from lachesis.splitters import CRFSplitter
+from lachesis.splitters import GreedySplitter
+from lachesis.splitters import OptimalSplitter
+from lachesis.splitters.optimal import CRFBreakCosts
+
+
+def exact_split(predictor, sentence_span, max_chars_per_line, max_num_lines):
+    """
+    Split the given sentence as the CRF splitter did
+    before scoring the candidate lines with the lattice:
+    each candidate line is tagged by the tagger,
+    and the best one is selected by the label of its last token,
+    by its probability and by its length.
+    """
+    def select_best_split(candidates):
+        candidates = sorted(candidates, key=lambda x: (1 if x[2][-1] == CRFTrainer.LABEL_LAST else 0), reverse=True)
+        candidates = sorted(candidates, key=lambda x: (x[3], x[1]), reverse=True)
+        return candidates[0]
+
+    tokens = [t for t in sentence_span.elements if t.is_regular]
+    if len(Span(elements=tokens).string()) <= max_chars_per_line:
+        return [[Span(elements=tokens).string()]]
+    n = len(tokens)
+    ccs = []
+    lines = []
+    candidates = []
+    start = 0
+    idx = 0
+    while idx < n:
+        line = Span(elements=tokens[start:idx + 1])
+        if len(line.string().strip()) <= max_chars_per_line:
+            labels, probability = predictor.predict(line)
+            candidates.append((start, idx + 1, labels, probability))
+        else:
+            chosen = select_best_split(candidates)
+            lines.append(Span(elements=tokens[chosen[0]:chosen[1]]).string())
+            if len(lines) >= max_num_lines:
+                ccs.append(lines)
+                lines = []
+            candidates = []
+            start = chosen[1]
+            idx = chosen[1]
+        idx += 1
+    if start < n:
+        lines.append(Span(elements=tokens[start:]).string())
+        ccs.append(lines)
+    return ccs
+
+
+class TestCRFSplitter(unittest.TestCase):
+
+    PARAMETERS = [(42, 2), (30, 3), (20, 1)]
+
+    @classmethod
+    def setUpClass(cls):
+        # train a small model on synthetic lines,
+        # broken by the greedy splitter
+        cls.directory = tempfile.mkdtemp()
+        cls.model_file_path = os.path.join(cls.directory, u"model.crfsuite")
+        examples = []
+        document = SyntheticCorpus(seed=1).document(300)
+        GreedySplitter(Language.ENGLISH, 30, 2).split(document)
+        for cc in document.ccs:
+            for line in cc.elements:
+                tokens = [t for t in line.elements if t.is_regular]
+                labels = [CRFTrainer.LABEL_NOT_LAST] * (len(tokens) - 1) + [CRFTrainer.LABEL_LAST]
+                examples.append((columns_from_tokens(tokens), labels))
+        trainer = CRFTrainer(language=Language.ENGLISH)
+        trainer.train_data = examples
+        trainer.train(cls.model_file_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_same_split_as_exact_tagger(self):
+        predictor = CRFPredictor(self.model_file_path)
+        for seed in range(3):
+            document = SyntheticCorpus(seed=seed + 10).document(40, 25)
+            for max_chars_per_line, max_num_lines in self.PARAMETERS:
+                splitter = CRFSplitter(
+                    Language.ENGLISH,
+                    max_chars_per_line,
+                    max_num_lines,
+                    model_file_path=self.model_file_path,
+                    registry=CRFModelRegistry()
+                )
+                for sentence in document.sentences:
+                    expected = exact_split(predictor, sentence, max_chars_per_line, max_num_lines)
+                    actual = [[line.string() for line in cc.elements] for cc in splitter._split_sentence(sentence)]
+                    self.assertEqual(actual, expected)
+
+    def test_optimal_costs_relative_to_line_begin(self):
+        # the features of the tokens of a line are relative to its begin,
+        # so the costs of the breaks after a line must be too
+        predictor = CRFPredictor(self.model_file_path)
+        costs = CRFBreakCosts(self.model_file_path, registry=CRFModelRegistry())
+        splitter = OptimalSplitter(Language.ENGLISH, 30, 2, costs=costs)
+        document = SyntheticCorpus(seed=20).document(10, 25)
+        differ = False
+        for sentence in document.sentences:
+            tokens = [t for t in sentence.elements if t.is_regular]
+            cost = costs.line_break_costs(tokens)
+            whole = costs.break_costs(tokens)
+            for begin in (0, len(tokens) // 3, len(tokens) // 2):
+                marginals = predictor.marginals(Span(elements=tokens[begin:]), CRFTrainer.LABEL_LAST)
+                for end in range(begin + 1, len(tokens)):
+                    expected = -math.log(max(marginals[end - 1 - begin], CRFBreakCosts.MIN_PROBABILITY))
+                    self.assertAlmostEqual(cost(begin, end), expected)
+                    differ = differ or (abs(expected - whole[end - 1]) > 1e-6)
+            ccs = splitter._split_sentence(sentence)
+            self.assertEqual([t for cc in ccs for line in cc.elements for t in line.elements], tokens)
+        self.assertTrue(differ)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# lachesis automates the segmentation of a transcript into closed captions
+#
+# Copyright (C) 2016-2017, Alberto Pettarin (www.albertopettarin.it)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+import itertools
+import unittest
+
+from lachesis.benchmarks.synthetic import SyntheticCorpus
+from lachesis.elements import Span
+from lachesis.language import Language
+from lachesis.splitters import OptimalSplitter
+from lachesis.splitters.optimal import BreakCosts
+from lachesis.splitters.optimal import POSBreakCosts
+
+# the choices at each boundary between two tokens
+NO_BREAK = 0
+LINE_BREAK = 1
+CC_BREAK = 2
+
+
+class LineBreakCosts(BreakCosts):
+    """
+    Costs depending on the begin of the line:
+    breaking a line is cheap if it has about ``LENGTH`` tokens.
+    """
+
+    LENGTH = 3
+
+    def line_break_costs(self, tokens):
+        return lambda begin, end: abs(end - begin - self.LENGTH) * 0.7 + (end % 2) * 0.3
+
+
+def split_cost(splitter, tokens, cost, lines):
+    """
+    Return the cost of the given split of the tokens,
+    as a list of CCs, each a list of ``(begin, end)`` lines,
+    given the function returning the cost of breaking each line,
+    or ``None`` if the split is not allowed.
+    """
+    closing_weight = splitter.CC_BREAK_WEIGHT if splitter.max_num_lines > 0 else 1.0
+    total = 0.0
+    for c, cc in enumerate(lines):
+        if (splitter.max_num_lines > 0) and (len(cc) > splitter.max_num_lines):
+            return None
+        for l, (begin, end) in enumerate(cc):
+            length = len(Span(elements=tokens[begin:end]).string().strip())
+            if (end - begin > 1) and (length > splitter.max_chars_per_line):
+                return None
+            total += splitter.LINE_COST
+            if end == len(tokens):
+                continue
+            if l + 1 < len(cc):
+                total += cost(begin, end)
+            else:
+                total += closing_weight * cost(begin, end)
+    return total
+
+
+def brute_force_cost(splitter, tokens, cost):
+    """
+    Return the minimum cost of all the splits of the tokens.
+    """
+    choices = [NO_BREAK, LINE_BREAK, CC_BREAK] if splitter.max_num_lines > 0 else [NO_BREAK, LINE_BREAK]
+    best = None
+    for boundaries in itertools.product(choices, repeat=len(tokens) - 1):
+        lines = [[]]
+        begin = 0
+        for idx, choice in enumerate(boundaries):
+            if choice != NO_BREAK:
+                lines[-1].append((begin, idx + 1))
+                begin = idx + 1
+                if choice == CC_BREAK:
+                    lines.append([])
+        lines[-1].append((begin, len(tokens)))
+        total = split_cost(splitter, tokens, cost, lines)
+        if (total is not None) and ((best is None) or (total < best)):
+            best = total
+    return best
+
+
+class TestOptimalSplitter(unittest.TestCase):
+
+    PARAMETERS = [(16, 2), (20, 1), (12, 3), (18, 0)]
+
+    def test_same_cost_as_brute_force(self):
+        self._check_brute_force(POSBreakCosts())
+
+    def test_same_cost_as_brute_force_with_line_costs(self):
+        self._check_brute_force(LineBreakCosts())
+
+    def _check_brute_force(self, costs):
+        document = SyntheticCorpus(seed=0).document(40, 7)
+        for max_chars_per_line, max_num_lines in self.PARAMETERS:
+            splitter = OptimalSplitter(Language.ENGLISH, max_chars_per_line, max_num_lines, costs=costs)
+            for sentence in document.sentences:
+                tokens = [t for t in sentence.elements if t.is_regular]
+                ccs = splitter._split_sentence(sentence)
+                self.assertEqual([t for cc in ccs for line in cc.elements for t in line.elements], tokens)
+                if len(Span(elements=tokens).string()) <= max_chars_per_line:
+                    self.assertEqual(len(ccs), 1)
+                    continue
+                lines = []
+                begin = 0
+                for cc in ccs:
+                    lines.append([])
+                    for line in cc.elements:
+                        end = begin + len(line.elements)
+                        lines[-1].append((begin, end))
+                        begin = end
+                cost = splitter.costs.line_break_costs(tokens)
+                total = split_cost(splitter, tokens, cost, lines)
+                self.assertIsNotNone(total)
+                self.assertAlmostEqual(total, brute_force_cost(splitter, tokens, cost))
+
+
+if __name__ == "__main__":
+    unittest.main()
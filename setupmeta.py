@@ -74,6 +74,7 @@ PKG_EXTRAS_REQUIRE = {
 # NOTE: not including the lachesis.test package to keep the size small
 PKG_PACKAGES = [
     "lachesis",
+    "lachesis.benchmarks",
     "lachesis.downloaders",
     "lachesis.elements",
     "lachesis.ml",